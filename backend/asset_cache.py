@@ -0,0 +1,208 @@
+"""导出资源内联模块
+
+把导出的 HTML 中引用的工作区图片（/api/images/... 和相对路径）替换为 data URI，
+生成可离线查看的单文件 HTML，PDF 渲染时也不再需要按 URL 获取图片。
+编码后的 data URI 按内容哈希缓存；文件的 (路径, 修改时间, 大小) 记录对应的哈希，
+文件未变化时重复导出不再读取和编码图片。
+"""
+import base64
+import hashlib
+import html as html_lib
+import posixpath
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+from config import MARKDOWN_ROOT_PATH
+from logger_config import logger
+
+# 可以内联的图片类型
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".svg": "image/svg+xml",
+    ".bmp": "image/bmp",
+}
+
+# 超过该大小的图片不内联（与上传图片的大小限制一致）
+MAX_INLINE_SIZE = 5 * 1024 * 1024
+
+# data URI 缓存的容量（字节）和文件签名缓存的条目数
+ASSET_CACHE_BYTES = 64 * 1024 * 1024
+SIGNATURE_CACHE_SIZE = 4096
+
+_IMAGE_API_PREFIX = "/api/images/"
+_IMG_SRC = re.compile(r'(<img\s[^>]*?src=")([^"]*)(")')
+# Markdown 源码中可能引用图片的地址：![alt](src)、<img src="...">、引用式链接定义 [id]: src
+_MARKDOWN_IMAGE_REFS = re.compile(
+    r'!\[[^\]]*\]\(\s*<?([^)\s>]+)'
+    r'|<img\s[^>]*?src=["\']([^"\']+)'
+    r'|^ {0,3}\[[^\]]+\]:\s*<?([^\s>]+)',
+    re.MULTILINE,
+)
+
+_lock = threading.Lock()
+_signatures: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_data_uris: "OrderedDict[str, str]" = OrderedDict()
+_data_uri_bytes = 0
+_stats = {"hits": 0, "misses": 0}
+
+
+def resolve_image(src: str, document_path: Optional[str] = None) -> Optional[Path]:
+    """
+    把图片地址解析为工作区中的文件
+
+    Args:
+        src: img 标签的 src（已反转义）
+        document_path: 文档在工作区中的路径，用于解析相对路径；为空时只解析 /api/images/ 地址
+
+    Returns:
+        图片文件路径；不是工作区内可内联的图片时返回 None
+    """
+    target = src.split("#", 1)[0].split("?", 1)[0]
+    if target.startswith(_IMAGE_API_PREFIX):
+        relative = unquote(target[len(_IMAGE_API_PREFIX):])
+    elif document_path and target and not target.startswith("/") and ":" not in target.split("/", 1)[0]:
+        relative = posixpath.join(posixpath.dirname(document_path.lstrip("/")), unquote(target))
+    else:
+        return None
+
+    relative = posixpath.normpath(relative)
+    # 不内联工作区之外和隐藏目录（版本、缓存）中的文件
+    if any(part == ".." or part.startswith(".") for part in relative.split("/")):
+        return None
+    if posixpath.splitext(relative)[1].lower() not in IMAGE_MIME_TYPES:
+        return None
+
+    root = MARKDOWN_ROOT_PATH.resolve()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        return None
+    return path
+
+
+def asset_signatures(content: str, document_path: Optional[str] = None) -> List[Tuple[str, int, int]]:
+    """
+    Markdown 中引用的工作区图片的 (路径, 修改时间, 大小)，用于内联图片的导出结果的缓存键
+
+    按源码粗略匹配，多匹配到的地址只会让缓存键多包含几个文件，不影响正确性。
+    """
+    signatures = set()
+    for match in _MARKDOWN_IMAGE_REFS.finditer(content):
+        src = html_lib.unescape(next(group for group in match.groups() if group))
+        path = resolve_image(src, document_path)
+        if path is None:
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        signatures.add((str(path), stat.st_mtime_ns, stat.st_size))
+    return sorted(signatures)
+
+
+def _remember(content_hash: str, uri: str) -> None:
+    """放入 data URI 缓存（调用方持有锁）"""
+    global _data_uri_bytes
+
+    if content_hash in _data_uris:
+        _data_uris.move_to_end(content_hash)
+        return
+    _data_uris[content_hash] = uri
+    _data_uri_bytes += len(uri)
+    while _data_uri_bytes > ASSET_CACHE_BYTES and len(_data_uris) > 1:
+        _, evicted = _data_uris.popitem(last=False)
+        _data_uri_bytes -= len(evicted)
+
+
+def data_uri(path: Path) -> Optional[str]:
+    """
+    读取图片并编码为 data URI（按内容哈希缓存）
+
+    Returns:
+        data URI；文件过大或无法读取时返回 None
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    if stat.st_size > MAX_INLINE_SIZE:
+        return None
+
+    signature = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        content_hash = _signatures.get(signature)
+        if content_hash is not None:
+            _signatures.move_to_end(signature)
+            uri = _data_uris.get(content_hash)
+            if uri is not None:
+                _data_uris.move_to_end(content_hash)
+                _stats["hits"] += 1
+                return uri
+
+    try:
+        raw = path.read_bytes()
+    except OSError as e:
+        logger.warning(f"Inline image failed: {path} - {str(e)}")
+        return None
+    content_hash = hashlib.sha256(raw).hexdigest()
+
+    with _lock:
+        _stats["misses"] += 1
+        _signatures[signature] = content_hash
+        if len(_signatures) > SIGNATURE_CACHE_SIZE:
+            _signatures.popitem(last=False)
+        # 不同路径下的相同图片共用一份编码结果
+        uri = _data_uris.get(content_hash)
+        if uri is None:
+            mime_type = IMAGE_MIME_TYPES[path.suffix.lower()]
+            uri = f"data:{mime_type};base64,{base64.b64encode(raw).decode('ascii')}"
+        _remember(content_hash, uri)
+    return uri
+
+
+def inline_images(html: str, document_path: Optional[str] = None) -> str:
+    """把 HTML 中引用工作区图片的 img 标签改为 data URI，无法内联的保持原样"""
+    if "<img" not in html:
+        return html
+
+    def replace(match: "re.Match") -> str:
+        src = html_lib.unescape(match.group(2))
+        path = resolve_image(src, document_path)
+        uri = data_uri(path) if path is not None else None
+        if uri is None:
+            return match.group(0)
+        return match.group(1) + uri + match.group(3)
+
+    return _IMG_SRC.sub(replace, html)
+
+
+def iter_inline_images(chunks: Iterable[str], document_path: Optional[str] = None) -> Iterator[str]:
+    """
+    对分段输出的 HTML 内联图片
+
+    片段末尾未闭合的标签留到与下一段合并后再处理，片段可以在任意位置切分。
+    """
+    pending = ""
+    for chunk in chunks:
+        text = pending + chunk
+        tag_start = text.rfind("<")
+        if tag_start >= 0 and text.find(">", tag_start) < 0:
+            text, pending = text[:tag_start], text[tag_start:]
+        else:
+            pending = ""
+        if text:
+            yield inline_images(text, document_path)
+    if pending:
+        yield inline_images(pending, document_path)
+
+
+def stats() -> Dict[str, int]:
+    """缓存命中统计"""
+    with _lock:
+        return {**_stats, "entries": len(_data_uris), "bytes": _data_uri_bytes}
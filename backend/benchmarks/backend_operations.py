@@ -0,0 +1,227 @@
+"""后端操作基准测试
+
+在不同规模的合成工作区上测量文件树、读取、搜索、版本管理和 HTML 导出的耗时，
+结果写入 JSON，可以与之前的结果对比。每种规模在独立的子进程中运行
+（后端模块在导入时读取 MARKDOWN_ROOT_PATH），工作区在运行结束后删除。
+
+用法（在 backend 目录下运行）:
+    python benchmarks/backend_operations.py --scales 100,1000,5000 --json results.json
+    python benchmarks/backend_operations.py --scales 1000 --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+
+sys.path.insert(0, str(BENCH_DIR))
+from workspace_generator import DEFAULT_SIZES, generate_workspace, populate_versions  # noqa: E402
+
+# 结果格式版本，结构变化时递增，对比时只比较相同格式的结果
+RESULT_FORMAT = 1
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="后端操作基准测试")
+    parser.add_argument("--scales", default="100,1000", help="工作区文件数，逗号分隔，每种规模单独测量")
+    parser.add_argument("--depth", type=int, default=3, help="目录深度")
+    parser.add_argument("--fanout", type=int, default=4, help="每个目录最多的子目录数")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="文件大小分布，权重:大小，逗号分隔")
+    parser.add_argument("--gbk-share", type=float, default=0.1, help="GBK 编码文件的比例")
+    parser.add_argument("--version-depth", type=int, default=20, help="每个有版本的文件的版本数")
+    parser.add_argument("--versioned-share", type=float, default=0.05, help="有版本历史的文件比例")
+    parser.add_argument("--sample", type=int, default=20, help="读取、导出等按文件测量的操作抽样的文件数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个操作重复的次数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--json", dest="json_path", help="将结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前的 JSON 结果对比")
+    parser.add_argument("--run-scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def _summarize(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+async def _measure(call: Callable[[], Awaitable[Any]], repeat: int, samples: List[float]) -> Any:
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+async def _run_scale(args, root: Path) -> Dict[str, Any]:
+    """在当前进程中测量一种规模（MARKDOWN_ROOT_PATH 已指向 root）"""
+    from file_operations import get_directory_tree, read_file, search_files
+    from exporters import _markdown_to_html
+    import version_store
+    import versions
+
+    generate_start = time.perf_counter()
+    manifest = generate_workspace(root, args.run_scale, args.depth, args.fanout, args.sizes, args.gbk_share, args.seed)
+    history = await populate_versions(manifest, root, args.version_depth, args.versioned_share, args.seed)
+    generate_seconds = time.perf_counter() - generate_start
+
+    rng = random.Random(args.seed + 2)
+    sample = rng.sample(manifest["entries"], min(args.sample, len(manifest["entries"])))
+    timings: Dict[str, List[float]] = {}
+
+    def samples(name: str) -> List[float]:
+        return timings.setdefault(name, [])
+
+    await _measure(lambda: get_directory_tree(""), args.repeat, samples("get_directory_tree"))
+
+    contents = {}
+    for entry in sample:
+        name = "read_file_gbk" if entry["encoding"] == "gbk" else "read_file"
+        contents[entry["path"]] = await _measure(lambda: read_file(entry["path"]), args.repeat, samples(name))
+
+    # 常见词（大量命中）、只在 GBK 文件中出现的词、不存在的词（扫描全部文件）
+    for query in ("markdown", "中文", "no-such-term-xyz"):
+        await _measure(lambda: search_files(query), args.repeat, samples(f"search_files[{query}]"))
+
+    for path, content in contents.items():
+        await _measure(lambda: asyncio.to_thread(_markdown_to_html, content, True), args.repeat, samples("markdown_to_html"))
+
+    for path, content in list(contents.items())[:max(1, len(contents) // 4)]:
+        for index in range(args.repeat):
+            edited = content + f"\n\nbench edit {index}\n"
+            await _measure(lambda: versions.create_version(path, edited, "bench"), 1, samples("create_version"))
+
+    for path, ids in history.items():
+        await _measure(lambda: versions.get_versions(path), args.repeat, samples("get_versions"))
+        for version_id in (ids[0], ids[len(ids) // 2], ids[-1]):
+            # 清空 blob 缓存，测量从磁盘还原（包括回放增量链）的耗时
+            version_store.get_blob.cache_clear()
+            await _measure(lambda: versions.get_version(version_id), 1, samples("get_version_cold"))
+        await _measure(lambda: versions.get_version(ids[-1]), args.repeat, samples("get_version_warm"))
+        if len(ids) > 1:
+            await _measure(lambda: versions.compare_versions(ids[0], ids[-1]), 1, samples("compare_versions_cold"))
+            await _measure(lambda: versions.compare_versions(ids[0], ids[-1]), args.repeat, samples("compare_versions_warm"))
+
+    return {
+        "files": manifest["files"],
+        "directories": manifest["directories"],
+        "total_bytes": manifest["total_bytes"],
+        "versioned_files": len(history),
+        "generate_seconds": round(generate_seconds, 3),
+        "operations": {name: _summarize(values) for name, values in timings.items() if values},
+    }
+
+
+def _run_child(args) -> None:
+    """子进程：生成工作区并测量一种规模，结果写入 --output"""
+    root = Path(os.environ["MARKDOWN_ROOT_PATH"])
+    sys.path.insert(0, str(BACKEND_DIR))
+    result = asyncio.run(_run_scale(args, root))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _print_comparison(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    if baseline.get("format") != RESULT_FORMAT:
+        print("baseline format differs, skipping comparison")
+        return
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at')}), p50 ratio (new / old):")
+    for scale, scale_result in result["scales"].items():
+        old_scale = baseline["scales"].get(scale)
+        if not old_scale:
+            continue
+        for name, stats in scale_result["operations"].items():
+            old = old_scale["operations"].get(name)
+            if old and old["p50_ms"]:
+                print(f"  {scale:>6} {name:<32} {old['p50_ms']:>10.3f} -> {stats['p50_ms']:>10.3f}  x{stats['p50_ms'] / old['p50_ms']:.2f}")
+
+
+def main():
+    args = _parse_args()
+    if args.run_scale is not None:
+        _run_child(args)
+        return
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    parameters = {
+        "depth": args.depth,
+        "fanout": args.fanout,
+        "sizes": args.sizes,
+        "gbk_share": args.gbk_share,
+        "version_depth": args.version_depth,
+        "versioned_share": args.versioned_share,
+        "sample": args.sample,
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+    result = {
+        "format": RESULT_FORMAT,
+        "created_at": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "scales": {},
+    }
+
+    for scale in scales:
+        run_dir = Path(tempfile.mkdtemp(prefix="mv-bench-"))
+        output = run_dir / "result.json"
+        env = {**os.environ, "MARKDOWN_ROOT_PATH": str(run_dir / "workspace")}
+        command = [sys.executable, str(Path(__file__).resolve()), "--run-scale", str(scale), "--output", str(output)]
+        for key, value in parameters.items():
+            command += [f"--{key.replace('_', '-')}", str(value)]
+        try:
+            # 在临时目录中运行，日志目录建在工作区之外，不影响文件树和搜索
+            subprocess.run(command, env=env, cwd=run_dir, check=True, stdout=subprocess.DEVNULL)
+            with open(output, encoding="utf-8") as f:
+                result["scales"][str(scale)] = json.load(f)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+        scale_result = result["scales"][str(scale)]
+        print(f"\nscale {scale}: {scale_result['directories']} directories, {scale_result['total_bytes']} bytes, "
+              f"{scale_result['versioned_files']} versioned files")
+        for name, stats in scale_result["operations"].items():
+            print(f"  {name:<32} p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms  (n={stats['count']})")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            _print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""并发负载测试
+
+模拟多个编辑者同时自动保存、浏览文件树、搜索、打开文件、查看版本和导出，
+统计每个接口的吞吐量、延迟分位数（p50/p95/p99）和错误率。
+
+默认在进程内通过 ASGI 直接调用 main.py 中的 app（自动生成临时的合成工作区），
+也可以用 --url 压测本地运行的 uvicorn（使用服务器自己的工作区，保存的文件写入 loadtest/ 目录）。
+
+用法（在 backend 目录下运行）:
+    python benchmarks/load_test.py --editors 20 --duration 30 --mix save:30,file:25,tree:10,search:10,versions:15,export:10,render:10
+    python benchmarks/load_test.py --url http://127.0.0.1:8001 --editors 50 --duration 60 --json load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+
+sys.path.insert(0, str(BENCH_DIR))
+from workspace_generator import DEFAULT_SIZES, edit_document, generate_workspace, make_document  # noqa: E402
+
+# 默认请求比例：自动保存和打开文件占多数，versions 为版本列表，snapshot 为手动创建版本
+DEFAULT_MIX = "save:30,file:25,tree:10,search:10,versions:10,snapshot:5,export:10"
+
+SEARCH_TERMS = ["markdown", "版本", "export", "中文", "no-such-term"]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="并发负载测试")
+    parser.add_argument("--url", help="压测已运行的服务（如 http://127.0.0.1:8001），不指定时在进程内调用 app")
+    parser.add_argument("--editors", type=int, default=20, help="并发编辑者数")
+    parser.add_argument("--duration", type=float, default=30, help="测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒），期间的请求不计入结果")
+    parser.add_argument("--think", type=float, default=0.0, help="每个编辑者两次请求之间的平均间隔（秒），0 表示不间断")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="请求比例，操作:权重，逗号分隔")
+    parser.add_argument("--files", type=int, default=500, help="进程内模式生成的工作区文件数")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="进程内模式的文件大小分布")
+    parser.add_argument("--document-size", type=int, default=20000, help="编辑者各自保存的文档大小（字节）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--json", dest="json_path", help="将结果写入 JSON 文件")
+    return parser.parse_args()
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """
+    解析请求比例，如 "save:30,file:25"
+
+    Raises:
+        ValueError: 未知的操作或格式错误
+    """
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition(":")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"未知的操作: {name}，可选: {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Editor:
+    """一个编辑者：拥有自己的文档，按比例随机发起请求"""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, files: List[str], document_size: int, seed: int):
+        self.rng = random.Random(seed + index)
+        self.client = client
+        self.files = files
+        self.path = f"loadtest/editor_{index:03d}.md"
+        self.content = make_document(self.rng, document_size)
+
+    async def save(self) -> httpx.Response:
+        self.content = edit_document(self.rng, self.content)
+        return await self.client.post("/api/save", json={"path": self.path, "content": self.content})
+
+    async def file(self) -> httpx.Response:
+        return await self.client.get("/api/file", params={"path": self.rng.choice(self.files)})
+
+    async def tree(self) -> httpx.Response:
+        return await self.client.get("/api/tree")
+
+    async def search(self) -> httpx.Response:
+        return await self.client.get("/api/search", params={"q": self.rng.choice(SEARCH_TERMS)})
+
+    async def versions(self) -> httpx.Response:
+        return await self.client.get("/api/versions", params={"path": self.path})
+
+    async def snapshot(self) -> httpx.Response:
+        return await self.client.post("/api/versions", json={"path": self.path, "content": self.content, "note": "loadtest"})
+
+    async def export(self) -> httpx.Response:
+        # 读完整个流式响应，耗时包含渲染
+        return await self.client.post("/api/export", json={"content": self.content, "format": "html"})
+
+    async def render(self) -> httpx.Response:
+        self.content = edit_document(self.rng, self.content, edits=1)
+        return await self.client.post("/api/render", json={"content": self.content, "session": self.path})
+
+    async def outline(self) -> httpx.Response:
+        return await self.client.get("/api/outline", params={"path": self.rng.choice(self.files)})
+
+
+OPERATIONS = {
+    "save": Editor.save,
+    "file": Editor.file,
+    "tree": Editor.tree,
+    "search": Editor.search,
+    "versions": Editor.versions,
+    "snapshot": Editor.snapshot,
+    "export": Editor.export,
+    "render": Editor.render,
+    "outline": Editor.outline,
+}
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples: Dict[str, List[Tuple[float, bool]]], elapsed: float) -> Dict[str, Any]:
+    """按操作汇总：请求数、错误数、吞吐量和延迟分位数（毫秒）"""
+    operations = {}
+    total = errors = 0
+    for name, records in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in records)
+        failed = sum(1 for _, ok in records if not ok)
+        total += len(records)
+        errors += failed
+        operations[name] = {
+            "requests": len(records),
+            "errors": failed,
+            "error_rate": round(failed / len(records), 4),
+            "throughput_rps": round(len(records) / elapsed, 2),
+            "p50_ms": round(_percentile(latencies, 0.50), 3),
+            "p95_ms": round(_percentile(latencies, 0.95), 3),
+            "p99_ms": round(_percentile(latencies, 0.99), 3),
+            "max_ms": round(latencies[-1], 3),
+        }
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0,
+        "throughput_rps": round(total / elapsed, 2),
+        "operations": operations,
+    }
+
+
+async def run_load(client: httpx.AsyncClient, files: List[str], args) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    editors = [Editor(index, client, files, args.document_size, args.seed) for index in range(args.editors)]
+    # 先保存一次，让每个编辑者的文档存在，版本和读取请求不会因为文件不存在而失败
+    await asyncio.gather(*(editor.save() for editor in editors))
+
+    samples: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    stop_at = measure_from + args.duration
+
+    async def drive(editor: Editor) -> None:
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                return
+            name = editor.rng.choices(names, weights)[0]
+            request_start = time.perf_counter()
+            try:
+                response = await OPERATIONS[name](editor)
+                ok = response.status_code < 400
+                if not ok:
+                    errors[f"{name} {response.status_code}"] += 1
+            except httpx.HTTPError as e:
+                ok = False
+                errors[f"{name} {type(e).__name__}"] += 1
+            if request_start >= measure_from:
+                samples[name].append(((time.perf_counter() - request_start) * 1000, ok))
+            if args.think:
+                await asyncio.sleep(editor.rng.expovariate(1 / args.think))
+
+    await asyncio.gather(*(drive(editor) for editor in editors))
+    elapsed = time.perf_counter() - measure_from
+
+    result = summarize(samples, elapsed)
+    result["error_kinds"] = dict(errors)
+    return result
+
+
+async def _run_in_process(args) -> Dict[str, Any]:
+    """生成临时工作区，在进程内运行 app（包括生命周期中的后台任务）"""
+    run_dir = Path(tempfile.mkdtemp(prefix="mv-load-"))
+    workspace = run_dir / "workspace"
+    workspace.mkdir()
+    manifest = generate_workspace(workspace, args.files, sizes=args.sizes, seed=args.seed)
+
+    # 在导入后端模块之前指向临时工作区；日志写入临时目录
+    os.environ["MARKDOWN_ROOT_PATH"] = str(workspace)
+    os.chdir(run_dir)
+    sys.path.insert(0, str(BACKEND_DIR))
+    try:
+        from main import app
+
+        files = [entry["path"] for entry in manifest["entries"]]
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=120) as client:
+                return await run_load(client, files, args)
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+async def _run_against_server(args) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        files = []
+
+        def collect(nodes):
+            for node in nodes:
+                if node["children"] is not None:
+                    collect(node["children"])
+                elif node["name"].endswith(".md"):
+                    files.append(node["path"])
+
+        response = await client.get("/api/tree")
+        response.raise_for_status()
+        collect(response.json()["data"])
+        if not files:
+            raise SystemExit("服务器工作区中没有 Markdown 文件")
+        return await run_load(client, files, args)
+
+
+def main():
+    args = _parse_args()
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    if args.url:
+        result = asyncio.run(_run_against_server(args))
+    else:
+        result = asyncio.run(_run_in_process(args))
+
+    result = {
+        "created_at": datetime.now().isoformat(),
+        "target": args.url or "in-process",
+        "editors": args.editors,
+        "mix": args.mix,
+        **result,
+    }
+
+    print(f"\n{result['requests']} requests in {result['elapsed_seconds']}s, "
+          f"{result['throughput_rps']} req/s, error rate {result['error_rate']:.2%}")
+    print(f"  {'operation':<10} {'requests':>8} {'rps':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10} {'errors':>7}")
+    for name, stats in result["operations"].items():
+        print(f"  {name:<10} {stats['requests']:>8} {stats['throughput_rps']:>8} {stats['p50_ms']:>10.2f} "
+              f"{stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f} {stats['max_ms']:>10.2f} {stats['errors']:>7}")
+    for kind, count in sorted(result["error_kinds"].items()):
+        print(f"  error: {kind} x{count}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Markdown 渲染基准测试
+
+生成不同大小的 Markdown 文档，对比单遍渲染器与替换前的正则实现的耗时和内存峰值。
+
+用法（在 backend 目录下运行）:
+    python benchmarks/markdown_rendering.py --sizes 100000,1000000,5000000 --repeat 3
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Markdown 渲染基准测试")
+    parser.add_argument("--sizes", default="100000,1000000,5000000", help="文档大小（字符数），逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每种大小重复渲染的次数")
+    parser.add_argument("--memory", action="store_true", help="统计内存峰值（会显著拖慢渲染）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--json", dest="json_path", help="将结果写入 JSON 文件")
+    return parser.parse_args()
+
+
+# ==================== 替换前的正则实现（对照组） ====================
+
+def _legacy_escape_html(text: str) -> str:
+    return (
+        text.replace('&', '&amp;')
+            .replace('<', '&lt;')
+            .replace('>', '&gt;')
+            .replace('"', '&quot;')
+            .replace("'", '&#39;')
+    )
+
+
+def _legacy_slugify(text: str) -> str:
+    text = text.lower()
+    text = re.sub(r'[^\w\u4e00-\u9fff\s-]', '', text)
+    text = re.sub(r'[\s_]+', '-', text)
+    return text.strip('-')
+
+
+def _legacy_markdown_to_html(content: str, include_toc: bool = False) -> str:
+    content = _legacy_escape_html(content)
+
+    toc = ""
+    if include_toc:
+        headings = re.findall(r'^(#{1,6})\s+(.+)$', content, re.MULTILINE)
+        if headings:
+            toc_items = []
+            for level, text in headings:
+                indent = (len(level)) * 20
+                slug = _legacy_slugify(text)
+                toc_items.append(
+                    f'<li style="margin-left: {indent}px">'
+                    f'<a href="#{slug}">{text}</a></li>'
+                )
+            toc = f'<div class="toc"><h2>目录</h2><ul>{"".join(toc_items)}</ul></div>'
+
+    content = re.sub(
+        r'^(#{1,6})\s+(.+)$',
+        lambda m: f'<h{len(m.group(1))} id="{_legacy_slugify(m.group(2))}">{m.group(2)}</h{len(m.group(1))}>',
+        content,
+        flags=re.MULTILINE
+    )
+    content = re.sub(
+        r'```(\w*)\n(.*?)```',
+        lambda m: f'<pre><code class="language-{m.group(1)}">{m.group(2)}</code></pre>',
+        content,
+        flags=re.DOTALL
+    )
+    content = re.sub(r'`([^`]+)`', r'<code>\1</code>', content)
+    content = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', content)
+    content = re.sub(r'__(.+?)__', r'<strong>\1</strong>', content)
+    content = re.sub(r'\*(.+?)\*', r'<em>\1</em>', content)
+    content = re.sub(r'_(.+?)_', r'<em>\1</em>', content)
+    content = re.sub(r'~~(.+?)~~', r'<del>\1</del>', content)
+    content = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'<a href="\2">\1</a>', content)
+    content = re.sub(r'!\[([^\]]*)\]\(([^\)]+)\)', r'<img src="\2" alt="\1">', content)
+    content = re.sub(r'^[\*\-]\s+(.+)$', r'<li>\1</li>', content, flags=re.MULTILINE)
+    content = re.sub(r'^\d+\.\s+(.+)$', r'<li>\1</li>', content, flags=re.MULTILINE)
+    content = re.sub(r'(<li>.*?</li>\n)+', r'<ul>\1</ul>', content, flags=re.DOTALL)
+    content = re.sub(r'^>\s+(.+)$', r'<blockquote>\1</blockquote>', content, flags=re.MULTILINE)
+    content = re.sub(r'</blockquote>\n<blockquote>', '\n', content)
+    content = re.sub(r'^-{3,}$', r'<hr>', content, flags=re.MULTILINE)
+    content = re.sub(r'^\*{3,}$', r'<hr>', content, flags=re.MULTILINE)
+
+    lines = content.split('\n')
+    result = []
+    in_paragraph = False
+    for line in lines:
+        if line.strip() == '':
+            if in_paragraph:
+                result.append('</p>')
+                in_paragraph = False
+        elif line.startswith('<h') or line.startswith('<ul') or line.startswith('<ol') or \
+             line.startswith('<blockquote>') or line.startswith('<pre>') or \
+             line.startswith('<hr>') or line.startswith('<li>') or line.startswith('</li>'):
+            if in_paragraph:
+                result.append('</p>')
+                in_paragraph = False
+            result.append(line)
+        else:
+            if not in_paragraph:
+                result.append('<p>')
+                in_paragraph = True
+            result.append(line)
+    if in_paragraph:
+        result.append('</p>')
+
+    return toc + '\n'.join(result)
+
+
+# ==================== 测试文档 ====================
+
+_WORDS = ["markdown", "viewer", "渲染", "文档", "性能", "parser", "token", "段落", "snake_case", "a<b"]
+
+
+def _sentence(rng: random.Random) -> str:
+    words = []
+    for _ in range(rng.randint(6, 16)):
+        word = rng.choice(_WORDS)
+        roll = rng.random()
+        if roll < 0.05:
+            word = f"**{word}**"
+        elif roll < 0.1:
+            word = f"*{word}*"
+        elif roll < 0.13:
+            word = f"`{word}`"
+        elif roll < 0.15:
+            word = f"[{word}](https://example.com/{word})"
+        words.append(word)
+    return " ".join(words) + "."
+
+
+def _section(rng: random.Random, index: int) -> str:
+    parts = [f"{'#' * rng.randint(1, 3)} 第 {index} 节 {rng.choice(_WORDS)}", ""]
+    for _ in range(rng.randint(1, 3)):
+        parts.append(" ".join(_sentence(rng) for _ in range(rng.randint(2, 5))))
+        parts.append("")
+    roll = rng.random()
+    if roll < 0.3:
+        parts.extend(f"- {_sentence(rng)}" for _ in range(rng.randint(2, 6)))
+    elif roll < 0.5:
+        parts.append("```python")
+        parts.extend(f"value_{i} = compute(**kwargs) * 2  # __{i}__" for i in range(rng.randint(3, 12)))
+        parts.append("```")
+    elif roll < 0.6:
+        parts.extend(f"> {_sentence(rng)}" for _ in range(rng.randint(1, 3)))
+    parts.append("")
+    return "\n".join(parts)
+
+
+def _generate(size: int, rng: random.Random) -> str:
+    sections = []
+    length = 0
+    while length < size:
+        section = _section(rng, len(sections) + 1)
+        sections.append(section)
+        length += len(section) + 1
+    return "\n".join(sections)
+
+
+def _backtick_runs(size: int) -> str:
+    """长度依次为 1, 2, 3... 的反引号串，每种长度只出现一次，所有代码片段都不闭合"""
+    parts = []
+    length = 0
+    run = 1
+    while length < size:
+        parts.append("`" * run + " x ")
+        length += run + 3
+        run += 1
+    return "".join(parts) + "\n"
+
+
+def _time_once(render, content: str, memory: bool):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    render(content, True)
+    elapsed = (time.perf_counter() - start) * 1000
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def _measure(content: str, repeat: int, memory: bool, current_render):
+    """交替运行两种实现，减少机器负载波动对对比结果的影响"""
+    timings = {"legacy": [], "current": []}
+    peaks = {"legacy": 0, "current": 0}
+    for _ in range(repeat):
+        for name, render in (("legacy", _legacy_markdown_to_html), ("current", current_render)):
+            elapsed, peak = _time_once(render, content, memory)
+            timings[name].append(elapsed)
+            peaks[name] = max(peaks[name], peak or 0)
+    return {name: statistics.median(values) for name, values in timings.items()}, peaks
+
+
+def main():
+    args = _parse_args()
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from markdown_render import markdown_to_html
+
+    rng = random.Random(args.seed)
+    documents = [("generated", _generate(int(size), rng)) for size in args.sizes.split(",")]
+    # 大量未闭合的方括号会使旧实现的链接正则退化为平方复杂度
+    documents.append(("unclosed-brackets", "[" * 20000 + "\n"))
+    # 长度逐个增加、互不闭合的反引号串：每个开始标记都要查找同样长度的结束标记
+    documents.append(("growing-backtick-runs", _backtick_runs(320000)))
+
+    results = []
+    for name, content in documents:
+        timings, peaks = _measure(content, args.repeat, args.memory, markdown_to_html)
+        result = {
+            "document": name,
+            "chars": len(content),
+            "legacy_ms": round(timings["legacy"], 2),
+            "current_ms": round(timings["current"], 2),
+            "speedup": round(timings["legacy"] / timings["current"], 2) if timings["current"] else None,
+        }
+        if args.memory:
+            result["legacy_peak_bytes"] = peaks["legacy"]
+            result["current_peak_bytes"] = peaks["current"]
+        results.append(result)
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""版本存储基准测试
+
+模拟一个文档被反复自动保存，统计版本存储的压缩比和还原任意版本的耗时。
+
+用法（在 backend 目录下运行）:
+    python benchmarks/version_storage.py --saves 300 --lines 2000 --keyframe-interval 20 --storage pack
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="版本存储基准测试")
+    parser.add_argument("--saves", type=int, default=300, help="自动保存次数")
+    parser.add_argument("--lines", type=int, default=2000, help="文档初始行数")
+    parser.add_argument("--edits", type=int, default=3, help="每次保存之间的编辑次数")
+    parser.add_argument("--keyframe-interval", type=int, default=20, help="关键帧间隔")
+    parser.add_argument("--storage", default="loose", help="存储方式: loose / pack")
+    parser.add_argument("--compression", default="auto", help="压缩方式: auto / zstd / zlib / none")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--json", dest="json_path", help="将结果写入 JSON 文件")
+    return parser.parse_args()
+
+
+def _random_line(rng: random.Random) -> str:
+    words = ["markdown", "viewer", "版本", "存储", "delta", "keyframe", "文档", "编辑", "# 标题", "- 列表"]
+    return " ".join(rng.choice(words) for _ in range(rng.randint(3, 12))) + "\n"
+
+
+def _mutate(lines, rng: random.Random, edits: int):
+    for _ in range(edits):
+        op = rng.random()
+        pos = rng.randrange(len(lines) + 1)
+        if op < 0.5 or not lines:
+            lines.insert(pos, _random_line(rng))
+        elif op < 0.8:
+            lines[min(pos, len(lines) - 1)] = _random_line(rng)
+        else:
+            del lines[min(pos, len(lines) - 1)]
+
+
+async def _run(args):
+    import versions
+    import version_store
+
+    rng = random.Random(args.seed)
+    lines = [_random_line(rng) for _ in range(args.lines)]
+
+    raw_bytes = 0
+    version_ids = []
+    start = time.perf_counter()
+    for i in range(args.saves):
+        _mutate(lines, rng, args.edits)
+        content = "".join(lines)
+        raw_bytes += len(content.encode("utf-8"))
+        version = await versions.create_version("bench/document.md", content, f"save {i}")
+        version_ids.append(version["id"])
+    create_seconds = time.perf_counter() - start
+
+    stored_files = [p for p in version_store.VERSIONS_DIR.rglob("*")
+                    if p.is_file() and not p.name.startswith("index.sqlite3")]
+    stored_bytes = sum(p.stat().st_size for p in stored_files)
+
+    restore_ms = []
+    for version_id in version_ids:
+        version_store.get_blob.cache_clear()
+        t0 = time.perf_counter()
+        await versions.get_version(version_id)
+        restore_ms.append((time.perf_counter() - t0) * 1000)
+    restore_ms.sort()
+
+    return {
+        "saves": args.saves,
+        "lines": args.lines,
+        "keyframe_interval": args.keyframe_interval,
+        "storage": args.storage,
+        "compression": version_store._default_codec(),
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "stored_files": len(stored_files),
+        "storage_ratio": round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+        "create_avg_ms": round(create_seconds * 1000 / args.saves, 3),
+        "restore_avg_ms": round(statistics.mean(restore_ms), 3),
+        "restore_p95_ms": round(restore_ms[int(len(restore_ms) * 0.95) - 1], 3),
+        "restore_max_ms": round(restore_ms[-1], 3),
+    }
+
+
+def main():
+    args = _parse_args()
+
+    # 在导入后端模块之前指向临时工作区
+    workspace = tempfile.mkdtemp(prefix="mv-bench-")
+    os.environ["MARKDOWN_ROOT_PATH"] = workspace
+    os.environ["VERSION_KEYFRAME_INTERVAL"] = str(args.keyframe_interval)
+    os.environ["VERSION_COMPRESSION"] = args.compression
+    os.environ["VERSION_STORAGE"] = args.storage
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    try:
+        result = asyncio.run(_run(args))
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    for key, value in result.items():
+        print(f"{key:>18}: {value}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
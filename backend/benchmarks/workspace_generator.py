@@ -0,0 +1,233 @@
+"""合成工作区生成器
+
+按给定的文件数、目录深度、文件大小分布、GBK 编码文件比例和版本历史深度生成一个工作区，
+供后端基准测试和压力测试使用。相同的参数和随机种子生成完全相同的文件内容。
+
+用法（在 backend 目录下运行）:
+    python benchmarks/workspace_generator.py --out /tmp/mv-workspace --files 1000 --depth 3 \\
+        --sizes 70:2k,25:20k,5:200k --gbk-share 0.1 --version-depth 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# 文件大小分布的默认值：权重:大小（字节，支持 k/m 后缀），每个文件在所选大小的 0.5~1.5 倍之间
+DEFAULT_SIZES = "70:2k,25:20k,5:200k"
+
+_WORDS = [
+    "markdown", "viewer", "export", "search", "version", "render", "cache", "editor",
+    "文档", "版本", "搜索", "导出", "标题", "编辑", "工作区", "目录",
+]
+
+# GBK 文件只使用 GBK 能编码的字符
+_GBK_WORDS = ["文档", "版本", "搜索", "导出", "标题", "编辑", "中文", "内容", "gbk", "text"]
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    multiplier = 1
+    if text.endswith("k"):
+        multiplier, text = 1024, text[:-1]
+    elif text.endswith("m"):
+        multiplier, text = 1024 * 1024, text[:-1]
+    return int(float(text) * multiplier)
+
+
+def parse_size_distribution(spec: str) -> List[Tuple[float, int]]:
+    """
+    解析文件大小分布，如 "70:2k,25:20k,5:200k"
+
+    Raises:
+        ValueError: 格式错误
+    """
+    buckets = []
+    for item in spec.split(","):
+        weight, _, size = item.partition(":")
+        if not size:
+            raise ValueError(f"文件大小分布格式错误: {item}（应为 权重:大小）")
+        buckets.append((float(weight), parse_size(size)))
+    return buckets
+
+
+def _paragraph(rng: random.Random, words: List[str]) -> str:
+    return " ".join(rng.choice(words) for _ in range(rng.randint(8, 40)))
+
+
+def make_document(rng: random.Random, target_size: int, gbk: bool = False) -> str:
+    """生成接近目标大小（字节）的 Markdown 文档，包含标题、列表、代码块和表格"""
+    words = _GBK_WORDS if gbk else _WORDS
+    parts = [f"# {_paragraph(rng, words)[:40]}\n"]
+    size = len(parts[0].encode("utf-8"))
+    section = 0
+    while size < target_size:
+        kind = rng.random()
+        if kind < 0.1:
+            section += 1
+            block = f"{'#' * rng.randint(2, 4)} {section} {rng.choice(words)} {rng.choice(words)}\n"
+        elif kind < 0.2:
+            block = "".join(f"- {rng.choice(words)} **{rng.choice(words)}** {rng.choice(words)}\n" for _ in range(rng.randint(2, 6)))
+        elif kind < 0.25:
+            block = "```python\n" + "".join(f"value_{i} = {rng.randint(0, 999)}\n" for i in range(rng.randint(2, 8))) + "```\n"
+        elif kind < 0.3:
+            block = "| a | b |\n|---|---|\n" + "".join(f"| {rng.choice(words)} | {rng.randint(0, 99)} |\n" for _ in range(3))
+        else:
+            block = _paragraph(rng, words) + " `code` [link](other.md)\n"
+        parts.append("\n" + block)
+        size += len(block.encode("utf-8")) + 1
+    return "".join(parts)
+
+
+def _directories(rng: random.Random, depth: int, fanout: int) -> List[str]:
+    """生成目录树（相对路径），根目录为空串"""
+    directories = [""]
+    level = [""]
+    for current_depth in range(depth):
+        next_level = []
+        for parent in level:
+            for index in range(rng.randint(max(1, fanout // 2), fanout)):
+                path = f"{parent}/dir{current_depth}_{index}".lstrip("/")
+                next_level.append(path)
+        directories.extend(next_level)
+        level = next_level
+    return directories
+
+
+def generate_workspace(
+    root: Path,
+    files: int = 1000,
+    depth: int = 3,
+    fanout: int = 4,
+    sizes: str = DEFAULT_SIZES,
+    gbk_share: float = 0.1,
+    seed: int = 42,
+) -> Dict[str, Any]:
+    """
+    在 root 下生成工作区文件
+
+    Returns:
+        清单：参数和每个文件的路径、编码、字节数
+    """
+    rng = random.Random(seed)
+    buckets = parse_size_distribution(sizes)
+    weights = [weight for weight, _ in buckets]
+    directories = _directories(rng, depth, fanout)
+
+    entries = []
+    total_bytes = 0
+    for index in range(files):
+        directory = rng.choice(directories)
+        relative = f"{directory}/note_{index:06d}.md".lstrip("/")
+        target_size = int(rng.choices(buckets, weights)[0][1] * rng.uniform(0.5, 1.5))
+        gbk = rng.random() < gbk_share
+        encoding = "gbk" if gbk else "utf-8"
+        data = make_document(rng, target_size, gbk).encode(encoding)
+
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        entries.append({"path": relative, "encoding": encoding, "bytes": len(data)})
+        total_bytes += len(data)
+
+    return {
+        "files": files,
+        "depth": depth,
+        "fanout": fanout,
+        "sizes": sizes,
+        "gbk_share": gbk_share,
+        "seed": seed,
+        "directories": len(directories),
+        "total_bytes": total_bytes,
+        "entries": entries,
+    }
+
+
+def edit_document(rng: random.Random, content: str, edits: int = 3) -> str:
+    """模拟一次编辑：随机插入、修改或删除若干行"""
+    lines = content.split("\n")
+    for _ in range(edits):
+        position = rng.randrange(len(lines))
+        operation = rng.random()
+        if operation < 0.5:
+            lines.insert(position, _paragraph(rng, _GBK_WORDS))
+        elif operation < 0.8:
+            lines[position] = _paragraph(rng, _GBK_WORDS)
+        elif len(lines) > 1:
+            del lines[position]
+    return "\n".join(lines)
+
+
+async def populate_versions(
+    manifest: Dict[str, Any],
+    root: Path,
+    version_depth: int,
+    versioned_share: float = 0.2,
+    seed: int = 42,
+) -> Dict[str, List[str]]:
+    """
+    为一部分文件创建版本历史（需要先把 MARKDOWN_ROOT_PATH 指向 root 再导入后端模块）
+
+    Returns:
+        文件路径 -> 版本 ID 列表（按创建顺序）
+    """
+    import versions
+
+    rng = random.Random(seed + 1)
+    history = {}
+    if version_depth <= 0:
+        return history
+
+    for entry in manifest["entries"]:
+        if rng.random() >= versioned_share:
+            continue
+        content = (root / entry["path"]).read_bytes().decode(entry["encoding"])
+        ids = []
+        for index in range(version_depth):
+            content = edit_document(rng, content)
+            version = await versions.create_version(entry["path"], content, f"bench {index}")
+            ids.append(version["id"])
+        history[entry["path"]] = ids
+    return history
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="合成工作区生成器")
+    parser.add_argument("--out", required=True, help="输出目录（将作为 MARKDOWN_ROOT_PATH）")
+    parser.add_argument("--files", type=int, default=1000, help="文件数")
+    parser.add_argument("--depth", type=int, default=3, help="目录深度")
+    parser.add_argument("--fanout", type=int, default=4, help="每个目录最多的子目录数")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="文件大小分布，权重:大小，逗号分隔")
+    parser.add_argument("--gbk-share", type=float, default=0.1, help="GBK 编码文件的比例")
+    parser.add_argument("--version-depth", type=int, default=0, help="每个有版本的文件的版本数")
+    parser.add_argument("--versioned-share", type=float, default=0.2, help="有版本历史的文件比例")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    root = Path(args.out).resolve()
+    root.mkdir(parents=True, exist_ok=True)
+
+    manifest = generate_workspace(root, args.files, args.depth, args.fanout, args.sizes, args.gbk_share, args.seed)
+
+    if args.version_depth:
+        # 在导入后端模块之前指向生成的工作区
+        os.environ["MARKDOWN_ROOT_PATH"] = str(root)
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+        history = asyncio.run(populate_versions(manifest, root, args.version_depth, args.versioned_share, args.seed))
+        manifest["versions"] = history
+
+    # 清单放在隐藏文件中，不出现在文件树和搜索结果里
+    with open(root / ".bench-manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    print(f"files: {manifest['files']}, directories: {manifest['directories']}, bytes: {manifest['total_bytes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,71 @@ MARKDOWN_ROOT_PATH = Path(os.getenv("MARKDOWN_ROOT_PATH", "./markdown-files"))
 # 确保目录存在
 MARKDOWN_ROOT_PATH.mkdir(parents=True, exist_ok=True)
 
+# 版本存储目录
+VERSIONS_DIR = MARKDOWN_ROOT_PATH / ".versions"
+
+# 版本内容每隔多少个版本保存一次完整内容（关键帧），其余保存为相对上一版本的增量
+VERSION_KEYFRAME_INTERVAL = max(1, int(os.getenv("VERSION_KEYFRAME_INTERVAL", 20)))
+
+# 版本存储方式: loose（每个版本一个记录文件，blob 为独立文件）/ pack（每个文档的历史追加写入一个 pack 文件）
+VERSION_STORAGE = os.getenv("VERSION_STORAGE", "loose").lower()
+
+# 版本内容压缩方式: auto（安装了 zstandard 时使用 zstd，否则 zlib）/ zstd / zlib / none
+VERSION_COMPRESSION = os.getenv("VERSION_COMPRESSION", "auto").lower()
+
+# 自动保存时的快照策略：距上次快照超过该间隔（秒），或改动字符数达到阈值时，才为保存前的内容创建版本
+VERSION_SNAPSHOT_INTERVAL = int(os.getenv("VERSION_SNAPSHOT_INTERVAL", 300))
+VERSION_SNAPSHOT_MIN_CHANGE = int(os.getenv("VERSION_SNAPSHOT_MIN_CHANGE", 500))
+
+# 版本保留策略：逗号分隔的 "时长:间隔"，依次表示该时长内每个间隔保留一个版本（all 表示全部保留），
+# 超出最后一档时长的版本会被清理，每个文件的最新版本始终保留
+VERSION_RETENTION = os.getenv("VERSION_RETENTION", "1h:all,1d:1h,30d:1d")
+
+# 保留策略只清理这些备注的版本（逗号分隔，默认只清理自动保存的快照），手动保存和恢复前的备份始终保留
+VERSION_RETENTION_NOTES = os.getenv("VERSION_RETENTION_NOTES", "自动保存")
+
+# 后台定期整理版本的间隔（秒），0 表示关闭定期整理
+VERSION_COMPACT_INTERVAL = int(os.getenv("VERSION_COMPACT_INTERVAL", 3600))
+
+# 每轮整理最多删除的版本数（I/O 预算），超出部分留到下一轮
+VERSION_COMPACT_IO_BUDGET = int(os.getenv("VERSION_COMPACT_IO_BUDGET", 500))
+
+# 导出渲染缓存：内存 LRU 和磁盘缓存（.render-cache 目录）的容量上限（字节），磁盘上限为 0 表示只使用内存缓存
+RENDER_CACHE_MEMORY_BYTES = int(os.getenv("RENDER_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+RENDER_CACHE_DISK_BYTES = int(os.getenv("RENDER_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+
+# PDF 导出进程池：工作进程数、排队任务数上限、已结束任务的保留时间（秒）、
+# 内存中保留的已完成任务结果总大小上限（字节，超出时先删除最早完成的任务）
+PDF_WORKERS = max(1, int(os.getenv("PDF_WORKERS", 2)))
+PDF_QUEUE_LIMIT = int(os.getenv("PDF_QUEUE_LIMIT", 16))
+PDF_JOB_TTL = int(os.getenv("PDF_JOB_TTL", 600))
+PDF_JOB_MAX_BYTES = int(os.getenv("PDF_JOB_MAX_BYTES", 256 * 1024 * 1024))
+
+# 静态站点导出时渲染页面的工作进程数
+SITE_EXPORT_WORKERS = max(1, int(os.getenv("SITE_EXPORT_WORKERS", os.cpu_count() or 2)))
+
+# 日志队列：缓冲的日志条数上限（写满后丢弃新日志并计数）、后台线程每批最多写入的条数
+LOG_QUEUE_SIZE = max(1, int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+LOG_BATCH_SIZE = max(1, int(os.getenv("LOG_BATCH_SIZE", 256)))
+
+# 日志文件：格式（json 每行一个 JSON 对象 / text）、单个文件的大小上限（字节，每天也会轮转一次）、
+# 每种日志保留的已压缩轮转文件数
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = max(0, int(os.getenv("LOG_BACKUP_COUNT", 14)))
+
+# 按类别采样成功日志：逗号分隔的 "类别:比例"，request 为 API 请求日志，file 为文件操作日志；
+# 警告和错误总是记录
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "request:0.1")
+
+# 请求阶段计时：是否返回 Server-Timing 响应头，以及把阶段明细写入日志的请求比例（0~1，0 表示关闭）
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = min(1.0, max(0.0, float(os.getenv("TRACE_SAMPLE_RATE", 0))))
+
+# 按需性能分析：请求带上该令牌时在 cProfile 下执行并保存结果，为空表示关闭；profiles 目录保留的结果数
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_KEEP = max(1, int(os.getenv("PROFILE_KEEP", 20)))
+
 # 服务端口
 PORT = int(os.getenv("PORT", 8001))
 
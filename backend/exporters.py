@@ -1,7 +1,14 @@
 """导出功能模块"""
-import re
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List
 from datetime import datetime
+from functools import lru_cache
+from markdown_render import markdown_to_html, iter_html as iter_markdown_html, escape_html as _escape_html, slugify as _slugify
+from asset_cache import asset_signatures, iter_inline_images
+import render_cache
+from tracing import span
+
+# 流式导出时每段的目标字符数
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 def export_to_html(
@@ -19,10 +26,33 @@ def export_to_html(
             - standalone: 是否生成独立的 HTML 文件（包含 CSS）
             - include_toc: 是否包含目录
             - theme: 主题 (light/dark)
+            - inline_images: 是否把引用的工作区图片内联为 data URI（生成可离线查看的单文件）
+            - path: 文档在工作区中的路径，用于解析图片的相对路径
 
     Returns:
         HTML 字符串
     """
+    return "".join(iter_html(content, title, options))
+
+
+def iter_html(
+    content: str,
+    title: str = "Markdown Document",
+    options: Dict[str, Any] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    逐段生成导出的 HTML（文档头和样式、逐块渲染的正文、页脚），用于流式响应
+
+    Args:
+        content: Markdown 内容
+        title: 文档标题
+        options: 导出选项，同 export_to_html
+        chunk_size: 每段的目标字符数
+
+    Returns:
+        HTML 片段的迭代器，依次拼接即为 export_to_html 的结果
+    """
     if options is None:
         options = {}
 
@@ -30,13 +60,89 @@ def export_to_html(
     include_toc = options.get("include_toc", False)
     theme = options.get("theme", "light")
 
-    # 转换 Markdown 为 HTML（基础实现）
-    html_content = _markdown_to_html(content, include_toc)
+    chunks = _iter_cached(content, title, standalone, include_toc, theme, chunk_size)
+    if options.get("inline_images"):
+        # 缓存中保存的是未内联的结果，内联在输出时进行，图片更新后不会用到旧的图片
+        chunks = iter_inline_images(chunks, options.get("path"))
+    yield from chunks
 
     if standalone:
-        # 生成完整的 HTML 文档
-        css_styles = _get_html_css(theme)
-        html = f"""<!DOCTYPE html>
+        yield f"""    <footer class="document-footer">
+        <p>导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+    </footer>
+</body>
+</html>"""
+
+
+def _iter_cached(
+    content: str,
+    title: str,
+    standalone: bool,
+    include_toc: bool,
+    theme: str,
+    chunk_size: int
+) -> Iterator[str]:
+    """逐段输出渲染结果（不含页脚），优先使用渲染缓存"""
+    # 相同内容和选项的渲染结果直接取缓存；导出时间在页脚中，每次单独生成
+    cache_key = render_cache.make_key(
+        content,
+        title=title if standalone else None,
+        standalone=standalone,
+        include_toc=include_toc,
+        theme=theme,
+    )
+    with span("render_cache"):
+        cached = render_cache.get("html", cache_key)
+    if cached is not None:
+        html = cached.decode('utf-8')
+        for start in range(0, len(html), chunk_size):
+            yield html[start:start + chunk_size]
+        return
+
+    # 边渲染边输出，同时逐段写入缓存，不在内存中拼接完整结果
+    writer = render_cache.CacheWriter("html", cache_key)
+    chunks = _batch(_iter_document(content, title, standalone, include_toc, theme), chunk_size)
+    try:
+        while True:
+            # 只计入渲染本身，不含调用方处理每段输出的时间
+            with span("render_html"):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                writer.write(chunk.encode('utf-8'))
+            yield chunk
+    except BaseException:
+        # 渲染出错或客户端断开，不留下不完整的缓存
+        writer.discard()
+        raise
+    writer.commit()
+
+
+def _batch(fragments: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """把小片段合并为约 chunk_size 个字符的段，减少响应的写入次数"""
+    buffer: List[str] = []
+    size = 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        size += len(fragment)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def _iter_document(content: str, title: str, standalone: bool, include_toc: bool, theme: str) -> Iterator[str]:
+    """逐段渲染 HTML（独立文件不含页脚，页脚由 iter_html 追加）"""
+    if not standalone:
+        # 仅返回内容部分
+        yield from iter_markdown_html(content, include_toc)
+        return
+
+    # 生成完整的 HTML 文档
+    css_styles = _get_html_css(theme)
+    yield f"""<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
@@ -49,18 +155,11 @@ def export_to_html(
 <body class="theme-{theme}">
     <div class="container">
         <h1 class="document-title">{_escape_html(title)}</h1>
-{html_content}
+"""
+    yield from iter_markdown_html(content, include_toc)
+    yield """
     </div>
-    <footer class="document-footer">
-        <p>导出时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-    </footer>
-</body>
-</html>"""
-    else:
-        # 仅返回内容部分
-        html = html_content
-
-    return html
+"""
 
 
 def export_to_pdf(
@@ -81,12 +180,60 @@ def export_to_pdf(
             - page_size: 页面大小 (A4/Letter)
             - margin: 页边距
             - include_toc: 是否包含目录
+            - path: 文档在工作区中的路径，用于解析图片的相对路径（图片总是内联）
+
+    Returns:
+        PDF 二进制数据
+    """
+    cache_key = pdf_cache_key(content, title, options)
+    cached = render_cache.get("pdf", cache_key)
+    if cached is not None:
+        return cached
+
+    pdf_bytes = render_pdf(content, title, options)
+    render_cache.put("pdf", cache_key, pdf_bytes)
+    return pdf_bytes
+
+
+def pdf_cache_key(content: str, title: str, options: Dict[str, Any] = None) -> str:
+    """
+    PDF 的渲染缓存键（相同内容和选项的 PDF 直接取缓存，页脚中的导出时间为首次生成的时间）
+
+    PDF 总是内联图片，键中包含引用的图片的修改时间和大小，替换图片后不会取到旧的 PDF。
+    """
+    if options is None:
+        options = {}
+
+    return render_cache.make_key(
+        content,
+        title=title,
+        include_toc=options.get("include_toc", False),
+        theme=options.get("theme", "light"),
+        page_size=options.get("page_size", "A4"),
+        margin=options.get("margin", "2cm"),
+        path=options.get("path"),
+        assets=asset_signatures(content, options.get("path")),
+    )
+
+
+def render_pdf(
+    content: str,
+    title: str = "Markdown Document",
+    options: Dict[str, Any] = None
+) -> bytes:
+    """
+    渲染 PDF（不经过渲染缓存，PDF 工作进程直接调用）
+
+    Args:
+        content: Markdown 内容
+        title: 文档标题
+        options: 导出选项，同 export_to_pdf
 
     Returns:
         PDF 二进制数据
     """
     try:
-        from weasyprint import HTML, CSS
+        from weasyprint import HTML
     except ImportError:
         raise ImportError(
             "PDF 导出功能需要安装 weasyprint。"
@@ -104,14 +251,25 @@ def export_to_pdf(
             "standalone": True,
             "include_toc": options.get("include_toc", False),
             "theme": options.get("theme", "light"),
+            # 图片内联后 WeasyPrint 不必再按 URL 获取，编码结果在工作进程内缓存复用
+            "inline_images": True,
+            "path": options.get("path"),
         }
     )
 
-    # PDF 样式
-    page_size = options.get("page_size", "A4")
-    margin = options.get("margin", "2cm")
+    # 生成 PDF
+    return HTML(string=html_content).write_pdf(
+        stylesheets=[_pdf_stylesheet(options.get("page_size", "A4"), options.get("margin", "2cm"))],
+        presentational_hints=True
+    )
 
-    pdf_css = CSS(string=f"""
+
+@lru_cache(maxsize=16)
+def _pdf_stylesheet(page_size: str, margin: str):
+    """PDF 页面样式（解析后的 CSS 对象在进程内复用）"""
+    from weasyprint import CSS
+
+    return CSS(string=f"""
         @page {{
             size: {page_size};
             margin: {margin};
@@ -123,158 +281,18 @@ def export_to_pdf(
         }}
     """)
 
-    # 生成 PDF
-    pdf_bytes = HTML(string=html_content).write_pdf(
-        stylesheets=[pdf_css],
-        presentational_hints=True
-    )
 
-    return pdf_bytes
+def get_html_css(theme: str = "light") -> str:
+    """导出页面的样式表（静态站点导出时写入共享的 CSS 文件）"""
+    return _get_html_css(theme)
 
 
 def _markdown_to_html(content: str, include_toc: bool = False) -> str:
-    """基础 Markdown 转 HTML（简化实现）"""
-
-    # 转义 HTML 特殊字符
-    content = _escape_html(content)
-
-    # 生成目录
-    toc = ""
-    if include_toc:
-        headings = re.findall(r'^(#{1,6})\s+(.+)$', content, re.MULTILINE)
-        if headings:
-            toc_items = []
-            for level, text in headings:
-                indent = (len(level)) * 20
-                slug = _slugify(text)
-                toc_items.append(
-                    f'<li style="margin-left: {indent}px">'
-                    f'<a href="#{slug}">{text}</a></li>'
-                )
-            toc = f'<div class="toc"><h2>目录</h2><ul>{"".join(toc_items)}</ul></div>'
-
-    # 处理标题
-    content = re.sub(
-        r'^(#{1,6})\s+(.+)$',
-        lambda m: f'<h{len(m.group(1))} id="{_slugify(m.group(2))}">{m.group(2)}</h{len(m.group(1))}>',
-        content,
-        flags=re.MULTILINE
-    )
-
-    # 处理代码块
-    content = re.sub(
-        r'```(\w*)\n(.*?)```',
-        lambda m: f'<pre><code class="language-{m.group(1)}">{m.group(2)}</code></pre>',
-        content,
-        flags=re.DOTALL
-    )
-
-    # 处理行内代码
-    content = re.sub(r'`([^`]+)`', r'<code>\1</code>', content)
-
-    # 处理粗体
-    content = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', content)
-    content = re.sub(r'__(.+?)__', r'<strong>\1</strong>', content)
-
-    # 处理斜体
-    content = re.sub(r'\*(.+?)\*', r'<em>\1</em>', content)
-    content = re.sub(r'_(.+?)_', r'<em>\1</em>', content)
-
-    # 处理删除线
-    content = re.sub(r'~~(.+?)~~', r'<del>\1</del>', content)
-
-    # 处理链接
-    content = re.sub(r'\[([^\]]+)\]\(([^\)]+)\)', r'<a href="\2">\1</a>', content)
-
-    # 处理图片
-    content = re.sub(r'!\[([^\]]*)\]\(([^\)]+)\)', r'<img src="\2" alt="\1">', content)
-
-    # 处理无序列表
-    content = re.sub(
-        r'^[\*\-]\s+(.+)$',
-        r'<li>\1</li>',
-        content,
-        flags=re.MULTILINE
-    )
-
-    # 处理有序列表
-    content = re.sub(
-        r'^\d+\.\s+(.+)$',
-        r'<li>\1</li>',
-        content,
-        flags=re.MULTILINE
-    )
-
-    # 包装列表项
-    content = re.sub(r'(<li>.*?</li>\n)+', r'<ul>\1</ul>', content, flags=re.DOTALL)
-
-    # 处理引用
-    content = re.sub(
-        r'^>\s+(.+)$',
-        r'<blockquote>\1</blockquote>',
-        content,
-        flags=re.MULTILINE
-    )
-
-    # 合并连续的 blockquote
-    content = re.sub(
-        r'</blockquote>\n<blockquote>',
-        '\n',
-        content
-    )
-
-    # 处理分隔线
-    content = re.sub(r'^-{3,}$', r'<hr>', content, flags=re.MULTILINE)
-    content = re.sub(r'^\*{3,}$', r'<hr>', content, flags=re.MULTILINE)
-
-    # 处理段落
-    lines = content.split('\n')
-    result = []
-    in_paragraph = False
-
-    for line in lines:
-        if line.strip() == '':
-            if in_paragraph:
-                result.append('</p>')
-                in_paragraph = False
-        elif line.startswith('<h') or line.startswith('<ul') or line.startswith('<ol') or \
-             line.startswith('<blockquote>') or line.startswith('<pre>') or \
-             line.startswith('<hr>') or line.startswith('<li>') or line.startswith('</li>'):
-            if in_paragraph:
-                result.append('</p>')
-                in_paragraph = False
-            result.append(line)
-        else:
-            if not in_paragraph:
-                result.append('<p>')
-                in_paragraph = True
-            result.append(line)
-
-    if in_paragraph:
-        result.append('</p>')
-
-    return toc + '\n'.join(result)
-
-
-def _escape_html(text: str) -> str:
-    """转义 HTML 特殊字符"""
-    return (
-        text.replace('&', '&amp;')
-            .replace('<', '&lt;')
-            .replace('>', '&gt;')
-            .replace('"', '&quot;')
-            .replace("'", '&#39;')
-    )
-
-
-def _slugify(text: str) -> str:
-    """生成 URL 友好的 slug"""
-    text = text.lower()
-    text = re.sub(r'[^\w\u4e00-\u9fff\s-]', '', text)
-    text = re.sub(r'[\s_]+', '-', text)
-    return text.strip('-')
+    """Markdown 转 HTML（单遍解析为语法树后渲染）"""
+    return markdown_to_html(content, include_toc)
 
 
+@lru_cache(maxsize=8)
 def _get_html_css(theme: str = "light") -> str:
     """获取 HTML 样式"""
     base_css = """
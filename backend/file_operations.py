@@ -4,6 +4,8 @@ import re
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 from config import MARKDOWN_ROOT_PATH, ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+import metrics
+from tracing import span
 
 
 def normalize_path(relative_path: str) -> Path:
@@ -98,19 +100,21 @@ async def read_file(relative_path: str) -> str:
     file_size = file_path.stat().st_size
     if file_size > MAX_FILE_SIZE:
         raise ValueError(f"文件过大 ({file_size} bytes)，最大支持 {MAX_FILE_SIZE} bytes")
+    metrics.inc("file_bytes_total", file_size, op="read")
 
     # 读取文件
-    try:
-        # 尝试 UTF-8 编码
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except UnicodeDecodeError:
+    with span("file_read"):
         try:
-            # 尝试其他编码
-            with open(file_path, "r", encoding="gbk") as f:
+            # 尝试 UTF-8 编码
+            with open(file_path, "r", encoding="utf-8") as f:
                 return f.read()
-        except:
-            raise ValueError("无法解码文件内容")
+        except UnicodeDecodeError:
+            try:
+                # 尝试其他编码
+                with open(file_path, "r", encoding="gbk") as f:
+                    return f.read()
+            except:
+                raise ValueError("无法解码文件内容")
 
 
 async def save_file(relative_path: str, content: str) -> bool:
@@ -121,8 +125,9 @@ async def save_file(relative_path: str, content: str) -> bool:
     file_path.parent.mkdir(parents=True, exist_ok=True)
 
     # 写入文件
-    with open(file_path, "w", encoding="utf-8") as f:
+    with span("file_write"), open(file_path, "w", encoding="utf-8") as f:
         f.write(content)
+        metrics.inc("file_bytes_total", f.tell(), op="write")
 
     return True
 
@@ -138,10 +143,13 @@ async def search_files(query: str, relative_path: str = "") -> List[Dict[str, An
         return []
 
     results = []
+    scanned = 0
     pattern = re.compile(re.escape(query), re.IGNORECASE)
 
     def search_in_file(file_path: Path):
         """在单个文件中搜索"""
+        nonlocal scanned
+        scanned += 1
         try:
             with open(file_path, "r", encoding="utf-8") as f:
                 for line_num, line in enumerate(f, 1):
@@ -169,13 +177,16 @@ async def search_files(query: str, relative_path: str = "") -> List[Dict[str, An
                 if result:
                     results.append(result)
 
-    if target_path.is_file():
-        result = search_in_file(target_path)
-        if result:
-            results.append(result)
-    else:
-        scan_directory(target_path)
+    with span("search_scan"):
+        if target_path.is_file():
+            result = search_in_file(target_path)
+            if result:
+                results.append(result)
+        else:
+            scan_directory(target_path)
 
+    metrics.inc("search_requests_total")
+    metrics.inc("search_files_scanned_total", scanned)
     return results[:100]  # 限制返回结果数量
 
 
@@ -205,6 +216,7 @@ async def upload_file(filename: str, content: bytes, relative_path: str = "") ->
     save_path = target_dir / file_path.name
     with open(save_path, "wb") as f:
         f.write(content)
+    metrics.inc("file_bytes_total", len(content), op="write")
 
     rel_path = save_path.relative_to(MARKDOWN_ROOT_PATH)
 
@@ -242,6 +254,7 @@ async def upload_image(filename: str, content: bytes) -> Dict[str, Any]:
     # 保存图片
     with open(save_path, "wb") as f:
         f.write(content)
+    metrics.inc("file_bytes_total", len(content), op="write")
 
     # 返回相对于 markdown-files 的路径
     rel_path = save_path.relative_to(MARKDOWN_ROOT_PATH)
@@ -1,9 +1,35 @@
-"""日志配置模块"""
+"""日志配置模块
+
+记录器只把日志放入有界队列，由后台线程批量写入控制台和文件，每批只刷新一次，
+请求处理协程不再直接进行控制台和磁盘 I/O。队列写满时丢弃新日志并计数，
+后台线程在下一批中报告丢弃的条数。
+
+日志文件默认每行一个 JSON 对象，超过 LOG_MAX_BYTES 或跨天时轮转并压缩，
+每种日志只保留 LOG_BACKUP_COUNT 个轮转文件；请求等高频的成功日志按类别采样，
+日志占用的磁盘空间和写入量都有上限。
+"""
+import atexit
+import copy
+import gzip
+import json
 import logging
+import os
+import queue
+import random
+import shutil
 import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from datetime import datetime
-from config import IS_DEVELOPMENT
+from datetime import datetime, timedelta
+from typing import Dict
+from config import (
+    IS_DEVELOPMENT, LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_SAMPLE_RATES,
+)
+
+# LogRecord 自带的属性，其余属性（通过 extra 传入的字段）作为结构化字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
 
 
 class ColoredFormatter(logging.Formatter):
@@ -20,14 +46,233 @@ class ColoredFormatter(logging.Formatter):
     RESET = '\033[0m'
 
     def format(self, record):
-        # 添加颜色
+        # 添加颜色（在副本上修改，同一条日志还要交给文件处理器）
+        record = copy.copy(record)
         levelcolor = self.COLORS.get(record.levelname, '')
         record.levelname = f"{levelcolor}{record.levelname}{self.RESET}"
         return super().format(record)
 
 
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，extra 传入的字段原样保留"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "func": record.funcName,
+            "line": record.lineno,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredFlushMixin:
+    """写入时不刷新，由后台线程在每批日志写完后统一刷新"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchStreamHandler(_DeferredFlushMixin, logging.StreamHandler):
+    """批量刷新的控制台处理器"""
+
+
+class RotatingBatchFileHandler(_DeferredFlushMixin, logging.FileHandler):
+    """
+    批量刷新、按大小和日期轮转的文件处理器
+
+    轮转时把当前文件压缩为 <文件名>.<时间>.gz，只保留最近 backup_count 个压缩文件。
+    轮转和压缩在后台写日志线程中进行。
+    """
+
+    def __init__(self, filename: Path, max_bytes: int, backup_count: int):
+        super().__init__(filename, encoding='utf-8')
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rollover_at = self._next_midnight()
+
+    @staticmethod
+    def _next_midnight() -> float:
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+    def _should_rollover(self) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return self.max_bytes > 0 and self.stream is not None and self.stream.tell() >= self.max_bytes
+
+    def _rollover(self) -> None:
+        self.stream.flush()
+        self.stream.close()
+        self.stream = None
+
+        source = Path(self.baseFilename)
+        if source.exists() and source.stat().st_size > 0:
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            target = source.with_name(f"{source.name}.{stamp}.gz")
+            sequence = 1
+            while target.exists():
+                target = source.with_name(f"{source.name}.{stamp}-{sequence}.gz")
+                sequence += 1
+            tmp_path = target.with_name(f".{target.name}.tmp")
+            with open(source, 'rb') as f_in, gzip.open(tmp_path, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.replace(tmp_path, target)
+            source.unlink()
+
+        rotated = sorted(source.parent.glob(f"{source.name}.*.gz"), key=lambda path: path.stat().st_mtime)
+        for path in rotated[:max(0, len(rotated) - self.backup_count)]:
+            path.unlink()
+
+        self.stream = self._open()
+        self.rollover_at = self._next_midnight()
+
+    def emit(self, record):
+        try:
+            if self._should_rollover():
+                self._rollover()
+        except Exception:
+            self.handleError(record)
+        super().emit(record)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    解析采样配置，如 "request:0.1,file:0.5"
+
+    Raises:
+        ValueError: 格式错误或比例不在 0~1 之间
+    """
+    rates = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        category, _, rate = item.partition(":")
+        value = float(rate)
+        if not 0 <= value <= 1:
+            raise ValueError(f"采样比例必须在 0~1 之间: {item}")
+        rates[category.strip()] = value
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """按 category 字段对 INFO 及以下级别的日志采样，警告和错误总是保留"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "category", None))
+        if rate is None or rate >= 1 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """有界队列处理器：队列已满时丢弃日志并计数，从不阻塞调用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.enqueued = 0
+        self._count_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 合并消息参数、把异常转为文本，但不把异常拼进消息，结构化格式中异常单独成为字段
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._count_lock:
+                self.dropped += 1
+        else:
+            self.enqueued += 1
+
+
+class BatchQueueListener(QueueListener):
+    """后台写日志线程：一次取出队列中已有的日志（最多 LOG_BATCH_SIZE 条），写完后统一刷新"""
+
+    def __init__(self, log_queue: queue.Queue, queue_handler: DroppingQueueHandler, *handlers: logging.Handler):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.queue_handler = queue_handler
+        self.reported_dropped = 0
+        self.batches = 0
+
+    def enqueue_sentinel(self):
+        # 退出时队列可能已满，结束标记需要等待空位而不是被丢弃
+        self.queue.put(self._sentinel)
+
+    def _report_dropped(self) -> None:
+        dropped = self.queue_handler.dropped
+        if dropped > self.reported_dropped:
+            record = logging.LogRecord(
+                self.queue_handler.name or "markdown-viewer", logging.WARNING, __file__, 0,
+                f"Log queue full, dropped {dropped - self.reported_dropped} records", None, None,
+            )
+            self.reported_dropped = dropped
+            self.handle(record)
+
+    def _monitor(self):
+        log_queue = self.queue
+        has_task_done = hasattr(log_queue, 'task_done')
+        stopping = False
+        while not stopping:
+            batch = [self.dequeue(True)]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+
+            for record in batch:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    self.handle(record)
+            self._report_dropped()
+            for handler in self.handlers:
+                if isinstance(handler, _DeferredFlushMixin):
+                    handler.flush_batch()
+            self.batches += 1
+
+            if has_task_done:
+                for _ in batch:
+                    log_queue.task_done()
+
+
+_listener: BatchQueueListener = None
+
+
 def setup_logger(name: str = "markdown-viewer") -> logging.Logger:
-    """设置并返回配置好的日志记录器"""
+    """设置并返回配置好的日志记录器（记录器只挂队列处理器，实际写入在后台线程中进行）"""
+    global _listener
 
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG if IS_DEVELOPMENT else logging.INFO)
@@ -41,7 +286,7 @@ def setup_logger(name: str = "markdown-viewer") -> logging.Logger:
     log_dir.mkdir(exist_ok=True)
 
     # 控制台处理器
-    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler = BatchStreamHandler(sys.stdout)
     console_handler.setLevel(logging.DEBUG if IS_DEVELOPMENT else logging.INFO)
 
     # 控制台格式（带颜色）
@@ -51,44 +296,78 @@ def setup_logger(name: str = "markdown-viewer") -> logging.Logger:
     )
     console_handler.setFormatter(console_format)
 
+    # 文件格式（JSON 行或文本）
+    if LOG_FORMAT == "text":
+        file_format = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    else:
+        file_format = JsonFormatter()
+
     # 文件处理器（错误日志）
-    error_file_handler = logging.FileHandler(
-        log_dir / f"error_{datetime.now().strftime('%Y%m%d')}.log",
-        encoding='utf-8'
-    )
+    error_file_handler = RotatingBatchFileHandler(log_dir / "error.log", LOG_MAX_BYTES, LOG_BACKUP_COUNT)
     error_file_handler.setLevel(logging.ERROR)
-    file_format = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
     error_file_handler.setFormatter(file_format)
 
     # 文件处理器（所有日志）
-    all_file_handler = logging.FileHandler(
-        log_dir / f"app_{datetime.now().strftime('%Y%m%d')}.log",
-        encoding='utf-8'
-    )
+    all_file_handler = RotatingBatchFileHandler(log_dir / "app.log", LOG_MAX_BYTES, LOG_BACKUP_COUNT)
     all_file_handler.setLevel(logging.DEBUG)
     all_file_handler.setFormatter(file_format)
 
-    # 添加处理器
-    logger.addHandler(console_handler)
-    logger.addHandler(error_file_handler)
-    logger.addHandler(all_file_handler)
+    # 记录器只写入队列，后台线程负责格式化和写入各处理器
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.set_name(name)
+    # 采样在入队之前进行，被丢弃的日志不占用队列，也不产生格式化和写入开销
+    queue_handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    logger.addHandler(queue_handler)
+    # 队列处理器已经接管了日志，不再传给根记录器，避免重复输出
+    logger.propagate = False
+
+    _listener = BatchQueueListener(log_queue, queue_handler, console_handler, error_file_handler, all_file_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
 
     return logger
 
 
+def shutdown_logging() -> None:
+    """写完队列中剩余的日志并停止后台线程（进程退出时自动调用）"""
+    global _listener
+
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def logging_stats() -> Dict[str, int]:
+    """日志队列统计：已入队、采样跳过、已丢弃、当前排队的条数和已写入的批次数"""
+    if _listener is None:
+        return {"enqueued": 0, "sampled_out": 0, "dropped": 0, "queued": 0, "batches": 0}
+    queue_handler = _listener.queue_handler
+    return {
+        "enqueued": queue_handler.enqueued,
+        "sampled_out": sum(getattr(f, "sampled_out", 0) for f in queue_handler.filters),
+        "dropped": queue_handler.dropped,
+        "queued": _listener.queue.qsize(),
+        "batches": _listener.batches,
+    }
+
+
 # 创建全局日志实例
 logger = setup_logger()
 
 
 def log_request(method: str, path: str, status_code: int = None, error: str = None):
-    """记录 API 请求"""
+    """记录 API 请求（成功的请求按 request 类别采样）"""
+    fields = {"category": "request", "method": method, "path": path, "status": status_code}
     if error:
-        logger.error(f"{method} {path} - Error: {error}")
+        logger.error(f"{method} {path} - Error: {error}", extra={**fields, "error": error}, stacklevel=2)
     else:
-        logger.info(f"{method} {path} - Status: {status_code}")
+        logger.info(f"{method} {path} - Status: {status_code}", extra=fields, stacklevel=2)
 
 
 def log_file_operation(operation: str, path: str, success: bool = True, detail: str = None):
@@ -98,7 +377,8 @@ def log_file_operation(operation: str, path: str, success: bool = True, detail:
     if detail:
         msg += f" - {detail}"
 
+    fields = {"category": "file", "operation": operation, "path": path, "success": success}
     if success:
-        logger.info(msg)
+        logger.info(msg, extra=fields, stacklevel=2)
     else:
-        logger.error(msg)
+        logger.error(msg, extra=fields, stacklevel=2)
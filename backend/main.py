@@ -1,19 +1,46 @@
 """FastAPI 主应用"""
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, Response
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import os
+import time
 
 from file_operations import get_directory_tree, read_file, save_file, search_files, upload_file, upload_image, rename_file, delete_file
-from config import PORT, MARKDOWN_ROOT_PATH, CORS_ORIGINS
+from config import PORT, MARKDOWN_ROOT_PATH, CORS_ORIGINS, SERVER_TIMING
 from logger_config import logger, log_request, log_file_operation
-from exporters import export_to_html, export_to_pdf
-from versions import create_version, get_versions, get_version, restore_version, compare_versions, delete_version, cleanup_old_versions
-
-app = FastAPI(title="Markdown Viewer API")
+from exporters import iter_html
+from pdf_jobs import QueueFullError, submit_job, job_status, job_result, export_pdf, shutdown as shutdown_pdf_workers
+from site_export import prepare_site, stream_zip, shutdown as shutdown_site_workers
+from preview import render_incremental
+from versions import create_version, get_versions, get_version, restore_version, compare_versions, delete_version, cleanup_old_versions, get_all_files_with_versions
+from version_retention import compact_file, compact_file_in_background, sweep, run_periodic_sweep
+from version_index import file_cursor, version_cursor
+from snapshot_policy import snapshot_before_save
+from metrics import observe_request, render_metrics
+from tracing import start_trace, end_trace, should_sample, format_trace
+import profiling
+from outline_index import get_outline, search_headings, update_file_in_background, remove_path_in_background, sync_workspace_in_background, run_periodic_sync
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动后台任务，退出时停止"""
+    sweep_task = asyncio.create_task(run_periodic_sweep())
+    outline_task = asyncio.create_task(run_periodic_sync())
+    yield
+    sweep_task.cancel()
+    outline_task.cancel()
+    shutdown_pdf_workers()
+    shutdown_site_workers()
+
+
+app = FastAPI(title="Markdown Viewer API", lifespan=lifespan)
 
 # CORS 配置
 # 根据环境变量设置允许的源，开发环境允许所有源，生产环境建议限制
@@ -24,9 +51,109 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile"],
 )
 
 
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """记录每个请求的状态码和延迟（流式响应记录到开始返回为止）"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # 按路由模板而不是实际路径统计，避免路径参数产生大量标签
+        route = request.scope.get("route")
+        observe_request(
+            request.method,
+            route.path if route is not None else "unmatched",
+            status,
+            time.perf_counter() - start,
+        )
+
+
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    """记录请求各阶段的耗时：返回 Server-Timing 响应头，按采样率把阶段明细写入日志"""
+    sampled = should_sample()
+    if not SERVER_TIMING and not sampled:
+        return await call_next(request)
+
+    trace, token = start_trace()
+    try:
+        response = await call_next(request)
+    finally:
+        end_trace(token)
+
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = trace.server_timing()
+    if sampled:
+        body = response.body_iterator
+
+        async def log_after_body():
+            # 流式响应在输出结束后再记录，阶段明细包含边输出边渲染的部分
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                logger.info(f"Trace: {format_trace(trace, request.method, request.url.path, response.status_code)}")
+
+        response.body_iterator = log_after_body()
+    return response
+
+
+def _profile_token(request: Request) -> Optional[str]:
+    return request.headers.get(profiling.PROFILE_HEADER) or request.query_params.get(profiling.PROFILE_QUERY)
+
+
+# 只在设置了 PROFILE_TOKEN 时注册，关闭时请求不经过该中间件
+if profiling.enabled():
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        """令牌正确的请求在 cProfile 下执行，结果文件名通过 X-Profile 响应头返回"""
+        # 查看分析结果的请求也带着令牌，不分析这些请求
+        if request.url.path.startswith("/api/profiles") or not profiling.is_authorized(_profile_token(request)):
+            return await call_next(request)
+
+        profile = profiling.RequestProfile(request.method, request.url.path)
+        if not profile.start():
+            response = await call_next(request)
+            response.headers["X-Profile"] = "busy"
+            return response
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            profile.stop()
+            raise
+
+        response.headers["X-Profile"] = profile.name
+        body = response.body_iterator
+
+        async def profile_body():
+            # 分析到响应输出结束为止，包含流式响应边输出边渲染的部分
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                profile.stop()
+
+        response.body_iterator = profile_body()
+        # 响应体没有被读取时（客户端提前断开、HEAD 请求）也要结束分析、释放分析锁
+        background = response.background
+
+        async def stop_profile():
+            profile.stop()
+            if background is not None:
+                await background()
+
+        response.background = BackgroundTask(stop_profile)
+        return response
+
+
 class FileSaveRequest(BaseModel):
     path: str
     content: str
@@ -44,6 +171,17 @@ class ExportRequest(BaseModel):
     options: Optional[dict] = None
 
 
+class SiteExportRequest(BaseModel):
+    path: str = ""  # 导出目录，空串表示整个工作区
+    options: Optional[dict] = None
+
+
+class RenderRequest(BaseModel):
+    content: str
+    previous: Optional[List[str]] = None  # 客户端当前显示的块 ID 列表
+    session: Optional[str] = None  # 预览会话标识，用于增量解析
+
+
 class CreateVersionRequest(BaseModel):
     path: str
     content: str
@@ -56,6 +194,12 @@ async def root():
     return {"status": "ok", "message": "Markdown Viewer API is running"}
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus 格式的运行指标"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/api/tree")
 async def get_tree(path: str = Query("")):
     """获取目录结构"""
@@ -90,18 +234,23 @@ async def get_file(path: str = Query(...)):
 
 
 @app.post("/api/save")
-async def save_file_endpoint(request: FileSaveRequest):
+async def save_file_endpoint(request: FileSaveRequest, background_tasks: BackgroundTasks):
     """保存文件"""
     try:
-        # 保存前创建版本快照
+        # 读取保存前的内容，文件不存在或无法解码时不创建版本
         try:
-            await read_file(request.path)
-            await create_version(request.path, request.content, "自动保存")
-        except:
-            pass  # 文件不存在时不创建版本
+            previous_content = await read_file(request.path)
+        except (FileNotFoundError, ValueError):
+            previous_content = None
 
         result = await save_file(request.path, request.content)
         log_file_operation("SAVE", request.path, True)
+
+        # 响应返回后按快照策略为保存前的内容创建版本，再按保留策略整理该文件的版本
+        if previous_content is not None and previous_content != request.content:
+            background_tasks.add_task(snapshot_before_save, request.path, previous_content)
+            background_tasks.add_task(compact_file_in_background, request.path)
+        background_tasks.add_task(update_file_in_background, request.path)
         return {"success": result}
     except PermissionError as e:
         log_file_operation("SAVE", request.path, False, str(e))
@@ -123,6 +272,41 @@ async def search(q: str = Query(..., min_length=1), path: str = Query("")):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/outline")
+async def get_outline_endpoint(path: str = Query(...)):
+    """获取文件的标题大纲（来自索引，不需要读取文件全文）"""
+    try:
+        return await get_outline(path)
+    except FileNotFoundError as e:
+        log_request("GET", f"/api/outline?path={path}", 404, str(e))
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        log_request("GET", f"/api/outline?path={path}", 400, str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError as e:
+        log_request("GET", f"/api/outline?path={path}", 403, str(e))
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        log_request("GET", f"/api/outline?path={path}", 500, str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/outline/search")
+async def search_outline(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(50, ge=1, le=500),
+    level: Optional[int] = Query(None, ge=1, le=6),
+):
+    """在整个工作区中搜索标题"""
+    try:
+        results = await search_headings(q, limit, level)
+        logger.info(f"Heading search: query='{q}', results={len(results)}")
+        return {"results": results}
+    except Exception as e:
+        logger.error(f"Heading search failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/upload")
 async def upload_file_endpoint(
     file: UploadFile = File(...),
@@ -197,11 +381,13 @@ async def get_image(image_path: str):
 
 
 @app.post("/api/rename")
-async def rename_file_endpoint(request: FileRenameRequest):
+async def rename_file_endpoint(request: FileRenameRequest, background_tasks: BackgroundTasks):
     """重命名文件或目录"""
     try:
         result = await rename_file(request.path, request.new_name)
         log_file_operation("RENAME", f"{request.path} -> {result.get('new_name')}", True)
+        # 重命名目录会移动其下所有文件，同步工作区以清理旧路径并为新路径建立索引
+        background_tasks.add_task(sync_workspace_in_background)
         return result
     except FileNotFoundError as e:
         log_file_operation("RENAME", request.path, False, str(e))
@@ -218,11 +404,12 @@ async def rename_file_endpoint(request: FileRenameRequest):
 
 
 @app.delete("/api/file")
-async def delete_file_endpoint(path: str = Query(...)):
+async def delete_file_endpoint(background_tasks: BackgroundTasks, path: str = Query(...)):
     """删除文件或目录"""
     try:
         result = await delete_file(path)
         log_file_operation("DELETE", path, True)
+        background_tasks.add_task(remove_path_in_background, path)
         return result
     except FileNotFoundError as e:
         log_file_operation("DELETE", path, False, str(e))
@@ -242,15 +429,15 @@ async def export_file(request: ExportRequest):
         format_type = request.format.lower()
 
         if format_type == "html":
-            # 导出为 HTML
-            html_content = export_to_html(
+            # 导出为 HTML：逐段渲染并流式返回，大文档不必整体保存在内存中
+            html_chunks = iter_html(
                 request.content,
                 request.title,
                 request.options or {}
             )
             logger.info(f"Exported to HTML: {request.title}")
-            return Response(
-                content=html_content,
+            return StreamingResponse(
+                html_chunks,
                 media_type="text/html",
                 headers={
                     "Content-Disposition": f'attachment; filename="{request.title}.html"'
@@ -259,7 +446,8 @@ async def export_file(request: ExportRequest):
 
         elif format_type == "pdf":
             # 导出为 PDF
-            pdf_bytes = export_to_pdf(
+            # 在进程池中渲染，避免阻塞事件循环
+            pdf_bytes = await export_pdf(
                 request.content,
                 request.title,
                 request.options or {}
@@ -285,11 +473,123 @@ async def export_file(request: ExportRequest):
             status_code=400,
             detail="PDF 导出功能需要安装 weasyprint。请运行: pip install weasyprint"
         )
+    except QueueFullError as e:
+        logger.warning(f"PDF export rejected: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logger.error(f"Export failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/export/site")
+async def export_site(request: SiteExportRequest):
+    """把目录导出为静态站点（zip），只重新渲染发生变化的文件"""
+    try:
+        # 渲染在线程中等待进程池，避免阻塞事件循环
+        site = await asyncio.get_running_loop().run_in_executor(
+            None, prepare_site, request.path, request.options or {}
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        logger.error(f"Site export failed: {request.path} - {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    logger.info(f"Exported site: {request.path or '/'} - {site['pages']} pages, {site['rendered']} rendered")
+    return StreamingResponse(
+        stream_zip(site["entries"], snapshot=site["snapshot"]),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{site["name"]}.zip"',
+            "X-Site-Pages": str(site["pages"]),
+            "X-Site-Rendered": str(site["rendered"]),
+        }
+    )
+
+
+@app.post("/api/export/pdf-jobs")
+async def submit_pdf_job(request: ExportRequest):
+    """提交 PDF 导出任务，立即返回任务 ID"""
+    try:
+        return submit_job(request.content, request.title, request.options or {})
+    except QueueFullError as e:
+        logger.warning(f"PDF job rejected: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error(f"Submit PDF job failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/export/pdf-jobs/{job_id}")
+async def get_pdf_job(job_id: str):
+    """查询 PDF 导出任务状态"""
+    try:
+        return job_status(job_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/api/export/pdf-jobs/{job_id}/download")
+async def download_pdf_job(job_id: str):
+    """下载已完成的 PDF 导出任务"""
+    try:
+        result = job_result(job_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return Response(
+        content=result["content"],
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'attachment; filename="{result["title"]}.pdf"'
+        }
+    )
+
+
+@app.post("/api/render")
+async def render_preview(request: RenderRequest):
+    """实时预览：按块增量渲染，只返回发生变化的块"""
+    try:
+        # 大文档的完整解析可能耗时较长，在线程中执行，不阻塞其他请求
+        return await asyncio.to_thread(render_incremental, request.content, request.previous, request.session)
+    except Exception as e:
+        logger.error(f"Render preview failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==================== 性能分析 API ====================
+
+def _check_profile_access(request: Request) -> None:
+    """性能分析接口与分析请求使用同一个令牌；未开启时表现为接口不存在"""
+    if not profiling.enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling.is_authorized(_profile_token(request)):
+        raise HTTPException(status_code=403, detail="令牌无效")
+
+
+@app.get("/api/profiles")
+async def list_profiles_endpoint(request: Request):
+    """最近的请求性能分析结果"""
+    _check_profile_access(request)
+    return {"profiles": profiling.list_profiles()}
+
+
+@app.get("/api/profiles/{name}")
+async def download_profile(request: Request, name: str, format: str = Query("prof")):
+    """下载性能分析结果（pstats 格式），format=text 时返回按累计耗时排序的文本摘要"""
+    _check_profile_access(request)
+    try:
+        if format == "text":
+            return Response(content=profiling.profile_summary(name), media_type="text/plain; charset=utf-8")
+        return FileResponse(profiling.get_profile_path(name), filename=name, media_type="application/octet-stream")
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 # ==================== 版本管理 API ====================
 
 @app.post("/api/versions")
@@ -305,16 +605,75 @@ async def create_version_endpoint(request: CreateVersionRequest):
 
 
 @app.get("/api/versions")
-async def get_versions_endpoint(path: str = Query(...), limit: int = Query(50)):
-    """获取文件的所有版本"""
+async def get_versions_endpoint(
+    path: str = Query(...),
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = Query(None),
+    note: Optional[str] = Query(None),
+    since: Optional[str] = Query(None),
+    until: Optional[str] = Query(None),
+):
+    """获取文件的版本列表（按时间倒序，before 为上一页返回的 next_cursor）"""
     try:
-        versions = await get_versions(path, limit)
-        return {"versions": versions}
+        # 多取一条用于判断是否还有下一页
+        versions = await get_versions(path, limit + 1, before, note, since, until)
+        next_cursor = version_cursor(versions[limit - 1]) if len(versions) > limit else None
+        return {"versions": versions[:limit], "next_cursor": next_cursor}
     except Exception as e:
         logger.error(f"Get versions failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/versions/compact")
+async def compact_versions_endpoint(path: str = Query("")):
+    """按保留策略整理版本，未指定路径时整理所有文件"""
+    try:
+        result = await compact_file(path) if path else await sweep()
+        logger.info(f"Versions compacted: path='{path}', reclaimed={result['reclaimed_bytes']} bytes")
+        return result
+    except Exception as e:
+        logger.error(f"Compact versions failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# 需在 /api/versions/{version_id} 之前注册，否则 files 会被当作版本 ID
+@app.get("/api/versions/files")
+async def get_version_files_endpoint(
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = Query(None),
+):
+    """获取有版本的文件及其历史统计（按最近修改时间倒序，before 为上一页返回的 next_cursor）"""
+    try:
+        files = await get_all_files_with_versions(limit + 1, before)
+        next_cursor = file_cursor(files[limit - 1]["latest_timestamp"], files[limit - 1]["path"]) if len(files) > limit else None
+        return {"files": files[:limit], "next_cursor": next_cursor}
+    except Exception as e:
+        logger.error(f"Get version files failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# 需在 /api/versions/{version_id} 之前注册，否则 compare 会被当作版本 ID
+@app.get("/api/versions/compare")
+async def compare_versions_endpoint(
+    v1: str = Query(...),
+    v2: str = Query(...),
+    granularity: str = Query("line"),
+    context: int = Query(3, ge=0, le=100),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+):
+    """对比两个版本的差异（按 hunk 分页）"""
+    try:
+        diff = await compare_versions(v1, v2, granularity, context, page, page_size)
+        return diff
+    except ValueError as e:
+        logger.error(f"Compare versions failed: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Compare versions failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/versions/{version_id}")
 async def get_version_endpoint(version_id: str):
     """获取指定版本的详细信息"""
@@ -345,20 +704,6 @@ async def restore_version_endpoint(version_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/versions/compare")
-async def compare_versions_endpoint(v1: str = Query(...), v2: str = Query(...)):
-    """对比两个版本的差异"""
-    try:
-        diff = await compare_versions(v1, v2)
-        return diff
-    except ValueError as e:
-        logger.error(f"Compare versions failed: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Compare versions failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 @app.delete("/api/versions/{version_id}")
 async def delete_version_endpoint(version_id: str):
     """删除指定版本"""
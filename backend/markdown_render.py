@@ -0,0 +1,719 @@
+"""Markdown 渲染模块
+
+单遍扫描的 Markdown 渲染器：块级解析器逐行扫描一次，生成由字典组成的语法树
+（标题、段落、代码块、引用、列表、表格、分隔线），再在一次遍历中输出 HTML。
+行内元素（代码、粗体、斜体、删除线、链接、图片）由按位置推进的扫描器处理，
+代码块和行内代码中的内容只做 HTML 转义，不再被其他规则改写。
+"""
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 语法树节点：{"type": ..., "lines": (起始行, 结束行), ...}，lines 为节点在源文本中的行范围
+Node = Dict[str, Any]
+
+_ATX_HEADING = re.compile(r'(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$')
+_FENCE = re.compile(r' {0,3}(`{3,}|~{3,})[ \t]*([^`\s]*)')
+_THEMATIC_BREAK = re.compile(r' {0,3}(?:(?:\*[ \t]*){3,}|(?:-[ \t]*){3,}|(?:_[ \t]*){3,})$')
+_LIST_ITEM = re.compile(r'( {0,3})([*+-]|\d{1,9}[.)])([ \t]+|$)')
+_BLOCKQUOTE = re.compile(r' {0,3}> ?')
+_TABLE_DELIMITER = re.compile(r' {0,3}\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$')
+
+# 可能开始一个新块的行首字符
+_BLOCK_START_CHARS = set('#`~*-_+>0123456789')
+
+# 行内扫描时需要停下来检查的字符
+_INLINE_SPECIAL = re.compile(r'[\\`*_~!\[]')
+# 块和行内元素的最大嵌套层数，超出部分按普通文本处理
+MAX_NESTING = 32
+
+# 不含嵌套标记的行内代码和强调，由正则一次匹配；内容不含标记字符，匹配失败时最多扫描到下一个标记字符
+_SIMPLE_CODE = re.compile(r'`[^`]+`(?!`)')
+_PLAIN = r'[^\\`*_~!\[\n]'
+_SIMPLE_EMPHASIS = re.compile(
+    rf'\*\*(?=\S)({_PLAIN}+?)(?<!\s)\*\*(?!\*)'
+    rf'|__(?=\S)({_PLAIN}+?)(?<!\s)__(?!\w)'
+    rf'|\*(?=\S)({_PLAIN}+?)(?<!\s)\*(?!\*)'
+    rf'|_(?=\S)({_PLAIN}+?)(?<!\s)_(?!\w)'
+    rf'|~~(?=\S)({_PLAIN}+?)(?<!\s)~~(?!~)'
+)
+# 文本中没有嵌套括号、地址中没有空白和括号的链接
+_SIMPLE_LINK = re.compile(r'\[([^\[\]\\`\n]*)\]\(([^()\s\\<]*)\)')
+_EMPHASIS_TAGS = {1: 'strong', 2: 'strong', 3: 'em', 4: 'em', 5: 'del'}
+_NEEDS_ESCAPE = re.compile(r'[&<>"\']')
+_BACKTICK_RUN = re.compile(r'`+')
+_BRACKET_TOKEN = re.compile(r'\\.|[\[\]()]', re.DOTALL)
+_ESCAPABLE = set('\\`*_{}[]()#+-.!|~>"\'')
+
+
+def escape_html(text: str) -> str:
+    """转义 HTML 特殊字符"""
+    if not _NEEDS_ESCAPE.search(text):
+        return text
+    return (
+        text.replace('&', '&amp;')
+            .replace('<', '&lt;')
+            .replace('>', '&gt;')
+            .replace('"', '&quot;')
+            .replace("'", '&#39;')
+    )
+
+
+def slugify(text: str) -> str:
+    """生成 URL 友好的 slug"""
+    text = text.lower()
+    text = re.sub(r'[^\w\u4e00-\u9fff\s-]', '', text)
+    text = re.sub(r'[\s_]+', '-', text)
+    return text.strip('-')
+
+
+# ==================== 块级解析 ====================
+
+def _split_lines(text: str) -> List[str]:
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    # 行首的制表符按 4 个空格计算缩进
+    return [line.expandtabs(4) if line.startswith('\t') else line for line in lines]
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(' '))
+
+
+def _is_blank(line: str) -> bool:
+    return not line.strip()
+
+
+def _split_table_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+
+    cells = []
+    current = []
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if char == '\\' and i + 1 < len(line) and line[i + 1] == '|':
+            current.append('|')
+            i += 2
+            continue
+        if char == '|':
+            cells.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    cells.append(''.join(current).strip())
+    return cells
+
+
+def _table_alignments(line: str) -> List[Optional[str]]:
+    aligns = []
+    for cell in _split_table_row(line):
+        left, right = cell.startswith(':'), cell.endswith(':')
+        aligns.append("center" if left and right else "right" if right else "left" if left else None)
+    return aligns
+
+
+def _starts_block(lines: List[str], i: int) -> bool:
+    """该行是否会打断段落（开始一个新的块）"""
+    line = lines[i]
+    stripped = line.lstrip(' ')
+    if not stripped or stripped[0] not in _BLOCK_START_CHARS or len(line) - len(stripped) > 3:
+        return False
+    if stripped.startswith('#') and _ATX_HEADING.match(stripped):
+        return True
+    if _FENCE.match(line) or _THEMATIC_BREAK.match(line) or _BLOCKQUOTE.match(line):
+        return True
+    match = _LIST_ITEM.match(line)
+    return bool(match and match.group(3))
+
+
+def parse_blocks(text: str) -> List[Node]:
+    """
+    解析 Markdown 文本的块级结构
+
+    Args:
+        text: Markdown 文本
+
+    Returns:
+        顶层块节点列表，每个节点带有在源文本中的行范围
+    """
+    return _parse_lines(_split_lines(text), 0)
+
+
+def split_source_lines(text: str) -> List[str]:
+    """按解析器的规则把文本拆分为行（统一换行符，展开行首制表符）"""
+    return _split_lines(text)
+
+
+def iter_blocks(lines: List[str], begin: int = 0) -> Iterator[Node]:
+    """
+    从第 begin 行开始逐个解析顶层块
+
+    Args:
+        lines: split_source_lines 拆分的行
+        begin: 开始解析的行号，必须是某个顶层块的结束行（或 0）
+
+    Returns:
+        顶层块节点的迭代器，节点的 lines 为在 lines 中的行范围
+    """
+    return _iter_blocks(lines, 0, 0, begin)
+
+
+def _parse_lines(lines: List[str], offset: int, depth: int = 0) -> List[Node]:
+    """解析行列表，offset 为第一行在源文本中的行号，depth 为嵌套层数"""
+    return list(_iter_blocks(lines, offset, depth))
+
+
+def _iter_blocks(lines: List[str], offset: int, depth: int = 0, begin: int = 0) -> Iterator[Node]:
+    """从第 begin 行开始逐个解析块；块之间没有状态，可以从任意块的结束行继续解析"""
+    if depth > MAX_NESTING:
+        text = "\n".join(line.strip() for line in lines[begin:] if not _is_blank(line))
+        if text:
+            yield {"type": "paragraph", "text": text, "lines": (offset + begin, offset + len(lines))}
+        return
+
+    i = begin
+    n = len(lines)
+
+    while i < n:
+        line = lines[i]
+        if _is_blank(line):
+            i += 1
+            continue
+
+        start = i
+        indent = _indent(line)
+        stripped = line[indent:]
+
+        # 缩进代码块
+        if indent >= 4:
+            code_lines = []
+            while i < n and (_indent(lines[i]) >= 4 or _is_blank(lines[i])):
+                code_lines.append(lines[i][4:])
+                i += 1
+            while code_lines and _is_blank(code_lines[-1]):
+                code_lines.pop()
+                i -= 1
+            yield {"type": "code", "lang": "", "code": "\n".join(code_lines),
+                   "lines": (offset + start, offset + i)}
+            continue
+
+        # 围栏代码块：内容原样保留，直到相同或更长的围栏
+        fence = _FENCE.match(line)
+        if fence:
+            marker = fence.group(1)
+            i += 1
+            code_lines = []
+            while i < n:
+                candidate = lines[i].strip()
+                if candidate.startswith(marker) and candidate.strip(marker[0]) == '':
+                    i += 1
+                    break
+                code_lines.append(lines[i])
+                i += 1
+            yield {"type": "code", "lang": fence.group(2), "code": "\n".join(code_lines),
+                   "lines": (offset + start, offset + i)}
+            continue
+
+        if stripped.startswith('#'):
+            heading = _ATX_HEADING.match(stripped)
+            if heading:
+                i += 1
+                yield {"type": "heading", "level": len(heading.group(1)), "text": heading.group(2),
+                       "lines": (offset + start, offset + i)}
+                continue
+
+        if _THEMATIC_BREAK.match(line):
+            i += 1
+            yield {"type": "hr", "lines": (offset + start, offset + i)}
+            continue
+
+        # 引用：去掉 > 前缀后递归解析，普通文本行视为段落的延续
+        if _BLOCKQUOTE.match(line):
+            quote_lines = []
+            while i < n:
+                marker = _BLOCKQUOTE.match(lines[i])
+                if marker:
+                    quote_lines.append(lines[i][marker.end():])
+                elif quote_lines and not _is_blank(quote_lines[-1]) \
+                        and not _is_blank(lines[i]) and not _starts_block(lines, i):
+                    quote_lines.append(lines[i])
+                else:
+                    break
+                i += 1
+            yield {"type": "blockquote", "children": _parse_lines(quote_lines, offset + start, depth + 1),
+                   "lines": (offset + start, offset + i)}
+            continue
+
+        item = _LIST_ITEM.match(line)
+        if item and item.group(3):
+            node, i = _parse_list(lines, i, offset, depth)
+            yield node
+            continue
+
+        # 表格：表头行 + 对齐行
+        if '|' in line and i + 1 < n and '|' in lines[i + 1] and _TABLE_DELIMITER.match(lines[i + 1]):
+            header = _split_table_row(line)
+            aligns = _table_alignments(lines[i + 1])
+            if len(header) == len(aligns):
+                i += 2
+                rows = []
+                while i < n and '|' in lines[i] and not _is_blank(lines[i]):
+                    row = _split_table_row(lines[i])
+                    rows.append((row + [''] * len(header))[:len(header)])
+                    i += 1
+                yield {"type": "table", "header": header, "aligns": aligns, "rows": rows,
+                       "lines": (offset + start, offset + i)}
+                continue
+
+        # 段落：直到空行或下一个块
+        paragraph = []
+        while True:
+            # 行尾两个以上空格表示硬换行，转换为与之等价的行尾反斜杠
+            paragraph.append(line.strip() + ('\\' if line.endswith('  ') else ''))
+            i += 1
+            if i >= n or _is_blank(lines[i]) or _starts_block(lines, i):
+                break
+            line = lines[i]
+        if lines[i - 1].endswith('  '):
+            # 段落末尾的硬换行没有意义
+            paragraph[-1] = paragraph[-1][:-1]
+        yield {"type": "paragraph", "text": "\n".join(paragraph),
+               "lines": (offset + start, offset + i)}
+
+
+def _parse_list(lines: List[str], i: int, offset: int, depth: int) -> Tuple[Node, int]:
+    """解析从第 i 行开始的列表，返回 (列表节点, 列表之后的行号)"""
+    n = len(lines)
+    start = i
+    first = _LIST_ITEM.match(lines[i])
+    ordered = first.group(2)[-1] in '.)'
+    delimiter = first.group(2)[-1]
+
+    items: List[List[Node]] = []
+    loose = False
+    while i < n:
+        item = _LIST_ITEM.match(lines[i])
+        if not item or not item.group(3) or item.group(2)[-1] != delimiter:
+            break
+        if _THEMATIC_BREAK.match(lines[i]):
+            break
+
+        item_start = i
+        spacing = len(item.group(3)) if 0 < len(item.group(3)) <= 4 else 1
+        content_indent = len(item.group(1)) + len(item.group(2)) + spacing
+        item_lines = [lines[i][item.end():] if len(item.group(3)) <= 4 else lines[i][item.end(2) + 1:]]
+        i += 1
+
+        while i < n:
+            line = lines[i]
+            if _is_blank(line):
+                # 空行之后仍有缩进的内容时属于同一列表项
+                following = i + 1
+                while following < n and _is_blank(lines[following]):
+                    following += 1
+                if following < n and _indent(lines[following]) >= content_indent:
+                    item_lines.extend([''] * (following - i))
+                    i = following
+                    loose = True
+                    continue
+                break
+            if _indent(line) >= content_indent:
+                item_lines.append(line[content_indent:])
+            elif _starts_block(lines, i) or _is_blank(item_lines[-1]):
+                break
+            else:
+                item_lines.append(line.strip())
+            i += 1
+
+        items.append(_parse_lines(item_lines, offset + item_start, depth + 1))
+
+        # 列表项之间的空行使列表变为松散列表
+        if i < n and _is_blank(lines[i]):
+            following = i
+            while following < n and _is_blank(lines[following]):
+                following += 1
+            next_item = _LIST_ITEM.match(lines[following]) if following < n else None
+            if not next_item or (next_item.group(2)[-1] != delimiter):
+                break
+            loose = True
+            i = following
+
+    node = {"type": "list", "ordered": ordered, "loose": loose, "items": items,
+            "lines": (offset + start, offset + i)}
+    if ordered:
+        node["start"] = int(first.group(2)[:-1])
+    return node, i
+
+
+# ==================== 行内解析 ====================
+
+def _find_closer(text: str, marker: str, start: int, failed: Dict[str, int]) -> int:
+    """
+    查找强调类标记的结束位置：结束标记前不能是空白，且内容非空
+
+    failed 记录每种标记查找失败的最早起点：从更靠后的位置查找同一标记必然也失败，
+    直接返回，避免大量未闭合的标记使扫描退化为平方复杂度
+    """
+    if start >= failed.get(marker, len(text) + 1):
+        return -1
+
+    char = marker[0]
+    position = start
+    while True:
+        position = text.find(marker, position)
+        if position < 0:
+            failed[marker] = start
+            return -1
+        run_end = position
+        while run_end < len(text) and text[run_end] == char:
+            run_end += 1
+        # 单个标记不能与更长的标记串匹配（*a **b** c* 中的 ** 不是斜体的结束）
+        if len(marker) == 1 and run_end - position not in (1, 3):
+            position = run_end
+            continue
+        if position > start and not text[position - 1].isspace():
+            if char == '_' and run_end < len(text) and text[run_end].isalnum():
+                position = run_end
+                continue
+            return position
+        position = run_end
+
+
+def _backtick_runs(text: str) -> Dict[int, List[int]]:
+    """
+    一次扫描记录所有反引号串，返回 串长度 -> 起始位置列表（升序）
+
+    代码片段的结束标记是长度相同的反引号串，按长度二分查找，
+    不必对每个未闭合的开始标记重新扫描到文本末尾
+    """
+    runs: Dict[int, List[int]] = {}
+    for match in _BACKTICK_RUN.finditer(text):
+        runs.setdefault(match.end() - match.start(), []).append(match.start())
+    return runs
+
+
+def _match_brackets(text: str) -> Dict[int, int]:
+    """一次扫描配对所有方括号和圆括号，返回左括号的位置 -> 对应右括号的位置"""
+    pairs = {}
+    stacks: Dict[str, List[int]] = {'[': [], '(': []}
+    position = 0
+    while True:
+        match = _BRACKET_TOKEN.search(text, position)
+        if match is None:
+            return pairs
+        token = match.group()
+        position = match.end()
+        if token == '[' or token == '(':
+            stacks[token].append(match.start())
+        elif token == ']' or token == ')':
+            stack = stacks['[' if token == ']' else '(']
+            if stack:
+                pairs[stack.pop()] = match.start()
+
+
+def _parse_link_target(text: str, start: int, pairs: Dict[int, int]) -> Optional[Tuple[str, str, int]]:
+    """解析 (url "title")，返回 (url, title, 结束位置)"""
+    if start >= len(text) or text[start] != '(':
+        return None
+    end = pairs.get(start)
+    # 链接地址不能跨行
+    if end is None or text.find('\n', start, end) >= 0:
+        return None
+
+    target = text[start + 1:end].strip()
+    title = ''
+    for quote in ('"', "'"):
+        if target.endswith(quote):
+            title_start = target.rfind(' ' + quote)
+            if title_start > 0:
+                title = target[title_start + 2:-1]
+                target = target[:title_start].rstrip()
+            break
+    if target.startswith('<') and target.endswith('>'):
+        target = target[1:-1]
+    return target, title, end + 1
+
+
+def render_inline(text: str) -> str:
+    """渲染行内元素"""
+    out: List[str] = []
+    _render_inline(text, out)
+    return ''.join(out)
+
+
+def _render_inline_span(text: str, start: int, end: int, out: List[str], depth: int) -> None:
+    """渲染 text[start:end]，不含行内标记时直接转义输出"""
+    if _INLINE_SPECIAL.search(text, start, end) is None:
+        out.append(escape_html(text[start:end]))
+    else:
+        _render_inline(text[start:end], out, depth)
+
+
+def _render_inline(text: str, out: List[str], depth: int = 0) -> None:
+    if depth > MAX_NESTING:
+        out.append(escape_html(text))
+        return
+
+    # 整段文本不含需要转义的字符时，其中的片段也都不需要转义
+    escape = escape_html if _NEEDS_ESCAPE.search(text) else str
+
+    failed: Optional[Dict[str, int]] = None
+    brackets: Optional[Dict[int, int]] = None
+    backtick_runs: Optional[Dict[int, List[int]]] = None
+    # 尚未输出的普通文本从 literal 开始，遇到需要输出标签的元素时才一并转义输出
+    literal = 0
+    i = 0
+    n = len(text)
+    while i < n:
+        match = _INLINE_SPECIAL.search(text, i)
+        if match is None:
+            break
+
+        j = match.start()
+        char = text[j]
+        i = j + 1
+
+        if char == '\\':
+            if i < n and (text[i] in _ESCAPABLE or text[i] == '\n'):
+                if j > literal:
+                    out.append(escape(text[literal:j]))
+                out.append('<br>\n' if text[i] == '\n' else escape(text[i]))
+                i += 1
+                literal = i
+            continue
+
+        if char == '`':
+            simple = _SIMPLE_CODE.match(text, j)
+            if simple:
+                run_end, close, fence = j + 1, simple.end() - 1, '`'
+            else:
+                run_end = j
+                while run_end < n and text[run_end] == '`':
+                    run_end += 1
+                fence = text[j:run_end]
+                # 结束标记必须是长度相同的反引号串
+                if backtick_runs is None:
+                    backtick_runs = _backtick_runs(text)
+                candidates = backtick_runs.get(len(fence), [])
+                index = bisect_left(candidates, run_end)
+                close = candidates[index] if index < len(candidates) else -1
+            if close < 0:
+                i = run_end
+                continue
+            code = text[run_end:close].replace('\n', ' ')
+            if len(code) > 2 and code[0] == ' ' and code[-1] == ' ' and code.strip():
+                code = code[1:-1]
+            if j > literal:
+                out.append(escape(text[literal:j]))
+            out.append(f'<code>{escape(code)}</code>')
+            i = literal = close + len(fence)
+            continue
+
+        if char == '!' or char == '[':
+            bracket = j + 1 if char == '!' else j
+            if bracket >= n or text[bracket] != '[':
+                continue
+            simple = _SIMPLE_LINK.match(text, bracket)
+            if simple:
+                label_end = simple.start(2) - 2
+                url, title, end = simple.group(2), '', simple.end()
+            else:
+                if brackets is None:
+                    brackets = _match_brackets(text)
+                label_end = brackets.get(bracket, -1)
+                target = _parse_link_target(text, label_end + 1, brackets) if label_end > 0 else None
+                if target is None:
+                    i = bracket + 1
+                    continue
+                url, title, end = target
+            label = text[bracket + 1:label_end]
+            title_attr = f' title="{escape(title)}"' if title else ''
+            if j > literal:
+                out.append(escape(text[literal:j]))
+            if char == '!':
+                out.append(f'<img src="{escape(url)}" alt="{escape(label)}"{title_attr}>')
+            else:
+                out.append(f'<a href="{escape(url)}"{title_attr}>')
+                _render_inline_span(text, bracket + 1, label_end, out, depth + 1)
+                out.append('</a>')
+            i = literal = end
+            continue
+
+        # 强调：** / __ 粗体，* / _ 斜体，~~ 删除线
+        if char == '_' and j > 0 and text[j - 1].isalnum():
+            # 单词内部的下划线（如 snake_case）不是强调
+            continue
+
+        simple = _SIMPLE_EMPHASIS.match(text, j)
+        if simple:
+            # 内容中没有其他行内标记的常见情况，直接输出
+            if j > literal:
+                out.append(escape(text[literal:j]))
+            tag = _EMPHASIS_TAGS[simple.lastindex]
+            out.append(f'<{tag}>{escape(simple.group(simple.lastindex))}</{tag}>')
+            i = literal = simple.end()
+            continue
+
+        run_end = j
+        while run_end < n and text[run_end] == char:
+            run_end += 1
+        run = run_end - j
+        opens = run_end < n and not text[run_end].isspace()
+        if not opens or (char == '~' and run != 2):
+            i = run_end
+            continue
+
+        if failed is None:
+            failed = {}
+        tag, width = ('del', 2) if char == '~' else ('strong', 2) if run >= 2 else ('em', 1)
+        close = _find_closer(text, char * width, j + width, failed)
+        if close < 0 and tag == 'strong':
+            tag, width = 'em', 1
+            close = _find_closer(text, char, j + 1, failed)
+        if close < 0:
+            i = run_end
+            continue
+
+        if j > literal:
+            out.append(escape(text[literal:j]))
+        out.append(f'<{tag}>')
+        _render_inline_span(text, j + width, close, out, depth + 1)
+        out.append(f'</{tag}>')
+        i = literal = close + width
+
+    if literal < n:
+        out.append(escape(text[literal:]))
+
+
+# ==================== HTML 输出 ====================
+
+def render_blocks(nodes: List[Node]) -> str:
+    """把块节点渲染为 HTML"""
+    out: List[str] = []
+    _render_nodes(nodes, out, tight=False)
+    return ''.join(out)
+
+
+def render_node(node: Node) -> str:
+    """渲染单个块节点"""
+    out: List[str] = []
+    _render_nodes([node], out, tight=False)
+    return ''.join(out)
+
+
+def _render_nodes(nodes: List[Node], out: List[str], tight: bool) -> None:
+    for node in nodes:
+        kind = node["type"]
+
+        if kind == "paragraph":
+            if tight:
+                _render_inline(node["text"], out)
+                out.append('\n')
+            else:
+                out.append('<p>')
+                _render_inline(node["text"], out)
+                out.append('</p>\n')
+
+        elif kind == "heading":
+            level = node["level"]
+            out.append(f'<h{level} id="{escape_html(slugify(node["text"]))}">')
+            _render_inline(node["text"], out)
+            out.append(f'</h{level}>\n')
+
+        elif kind == "code":
+            lang = escape_html(node["lang"])
+            code = escape_html(node["code"])
+            if code:
+                code += '\n'
+            out.append(f'<pre><code class="language-{lang}">{code}</code></pre>\n')
+
+        elif kind == "hr":
+            out.append('<hr>\n')
+
+        elif kind == "blockquote":
+            out.append('<blockquote>\n')
+            _render_nodes(node["children"], out, tight=False)
+            out.append('</blockquote>\n')
+
+        elif kind == "list":
+            if node["ordered"]:
+                start = node.get("start", 1)
+                out.append('<ol>\n' if start == 1 else f'<ol start="{start}">\n')
+            else:
+                out.append('<ul>\n')
+            for item in node["items"]:
+                out.append('<li>')
+                _render_nodes(item, out, tight=not node["loose"])
+                if out[-1].endswith('\n'):
+                    out[-1] = out[-1][:-1]
+                out.append('</li>\n')
+            out.append('</ol>\n' if node["ordered"] else '</ul>\n')
+
+        elif kind == "table":
+            aligns = node["aligns"]
+            out.append('<table>\n<thead>\n<tr>')
+            for cell, align in zip(node["header"], aligns):
+                out.append(f'<th style="text-align: {align}">' if align else '<th>')
+                _render_inline(cell, out)
+                out.append('</th>')
+            out.append('</tr>\n</thead>\n<tbody>\n')
+            for row in node["rows"]:
+                out.append('<tr>')
+                for cell, align in zip(row, aligns):
+                    out.append(f'<td style="text-align: {align}">' if align else '<td>')
+                    _render_inline(cell, out)
+                    out.append('</td>')
+                out.append('</tr>\n')
+            out.append('</tbody>\n</table>\n')
+
+
+def render_toc(nodes: List[Node]) -> str:
+    """根据顶层标题生成目录"""
+    items = []
+    for node in nodes:
+        if node["type"] == "heading":
+            items.append(
+                f'<li style="margin-left: {node["level"] * 20}px">'
+                f'<a href="#{escape_html(slugify(node["text"]))}">{render_inline(node["text"])}</a></li>'
+            )
+    if not items:
+        return ''
+    return f'<div class="toc"><h2>目录</h2><ul>{"".join(items)}</ul></div>\n'
+
+
+def markdown_to_html(content: str, include_toc: bool = False) -> str:
+    """
+    把 Markdown 渲染为 HTML 片段
+
+    Args:
+        content: Markdown 内容
+        include_toc: 是否在开头生成目录
+
+    Returns:
+        HTML 字符串
+    """
+    nodes = parse_blocks(content)
+    html = render_blocks(nodes)
+    if include_toc:
+        html = render_toc(nodes) + html
+    return html
+
+
+def iter_html(content: str, include_toc: bool = False) -> Iterator[str]:
+    """
+    逐块渲染 HTML，依次拼接的结果与 markdown_to_html 相同
+
+    不需要目录时边解析边渲染，不保留整棵语法树。
+    """
+    if include_toc:
+        nodes = parse_blocks(content)
+        yield render_toc(nodes)
+    else:
+        nodes = iter_blocks(split_source_lines(content))
+    for node in nodes:
+        yield render_node(node)
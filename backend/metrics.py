@@ -0,0 +1,211 @@
+"""运行指标模块
+
+记录请求数、状态码、各路由的延迟分布、文件和版本 I/O 字节数以及各缓存的命中情况，
+以 Prometheus 文本格式在 /metrics 输出。
+
+计数在热路径上不加锁：每个线程写自己的分片（线程第一次计数时登记），
+只有本线程会修改自己的分片；输出时再把所有分片累加。
+缓存容量、日志队列等状态量在输出时从各模块的统计函数读取。
+"""
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+PREFIX = "markdown_viewer"
+
+# 请求延迟直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 计数器说明，输出时作为 HELP 行
+COUNTERS = {
+    "http_requests_total": "HTTP requests by method, route and status",
+    "file_bytes_total": "Bytes read from and written to workspace files",
+    "search_requests_total": "Content searches",
+    "search_files_scanned_total": "Files scanned by content searches",
+    "version_bytes_total": "Bytes of version blobs read from and written to disk",
+    "cache_requests_total": "Cache lookups by cache and result",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_shards_lock = threading.Lock()
+_shards: List[Tuple[Dict[Tuple[str, Labels], float], Dict[Labels, List[float]]]] = []
+_local = threading.local()
+
+
+def _shard() -> Tuple[Dict[Tuple[str, Labels], float], Dict[Labels, List[float]]]:
+    """当前线程的计数分片"""
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = ({}, {})
+        _local.shard = shard
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def inc(name: str, amount: float = 1, **labels: str) -> None:
+    """
+    增加计数器
+
+    Args:
+        name: 计数器名称（不含前缀），需在 COUNTERS 中登记
+        amount: 增加量
+        labels: 标签
+    """
+    counters = _shard()[0]
+    key = (name, tuple(sorted(labels.items())))
+    counters[key] = counters.get(key, 0) + amount
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    """记录一次缓存查询"""
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    """记录一次 HTTP 请求的状态码和延迟"""
+    counters, histograms = _shard()
+    key = ("http_requests_total", (("method", method), ("route", route), ("status", str(status))))
+    counters[key] = counters.get(key, 0) + 1
+
+    labels = (("method", method), ("route", route))
+    histogram = histograms.get(labels)
+    if histogram is None:
+        # 各桶的计数（不累计）、超出最后一个桶的计数、总耗时、总次数
+        histogram = [0] * (len(LATENCY_BUCKETS) + 3)
+        histograms[labels] = histogram
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            break
+    else:
+        index = len(LATENCY_BUCKETS)
+    histogram[index] += 1
+    histogram[-2] += seconds
+    histogram[-1] += 1
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def _merge_shards() -> Tuple[Dict[Tuple[str, Labels], float], Dict[Labels, List[float]]]:
+    with _shards_lock:
+        shards = list(_shards)
+
+    counters: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Labels, List[float]] = {}
+    for shard_counters, shard_histograms in shards:
+        # 复制字典是单个原子操作，其他线程同时写入也不会影响
+        for key, value in dict(shard_counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for labels, values in dict(shard_histograms).items():
+            merged = histograms.setdefault(labels, [0] * len(values))
+            for index, value in enumerate(list(values)):
+                merged[index] += value
+    return counters, histograms
+
+
+def _module_cache_totals() -> Dict[str, Tuple[int, int]]:
+    """各模块自己统计的缓存命中数和未命中数"""
+    # 这些模块本身会调用 inc 计数，在输出时才导入以避免循环导入
+    import asset_cache
+    import render_cache
+    import version_store
+
+    render_stats = render_cache.stats()
+    asset_stats = asset_cache.stats()
+    blob_info = version_store.get_blob.cache_info()
+    return {
+        "render": (render_stats["memory_hits"] + render_stats["disk_hits"], render_stats["misses"]),
+        "asset": (asset_stats["hits"], asset_stats["misses"]),
+        "version_blob": (blob_info.hits, blob_info.misses),
+    }
+
+
+def _gauges() -> List[Tuple[str, str, Labels, float]]:
+    """各模块的缓存容量和日志队列状态：(名称, 说明, 标签, 值)"""
+    import asset_cache
+    import render_cache
+    from logger_config import logging_stats
+
+    render_stats = render_cache.stats()
+    gauges = [
+        ("cache_bytes", "Bytes held by in-memory caches", (("cache", "render"),), render_stats["memory_bytes"]),
+        ("cache_bytes", "Bytes held by in-memory caches", (("cache", "asset"),), asset_cache.stats()["bytes"]),
+    ]
+    if render_stats["disk_bytes"] >= 0:
+        gauges.append(("render_cache_disk_bytes", "Bytes held by the on-disk render cache", (), render_stats["disk_bytes"]))
+    log_stats = logging_stats()
+    gauges.append(("log_batches", "Batches written by the log writer thread", (), log_stats.pop("batches")))
+    for key, value in log_stats.items():
+        gauges.append(("log_records", "Log queue records by state", (("state", key),), value))
+    return gauges
+
+
+def render_metrics() -> str:
+    """以 Prometheus 文本格式输出全部指标"""
+    counters, histograms = _merge_shards()
+    for cache, (hits, misses) in _module_cache_totals().items():
+        for result, value in (("hit", hits), ("miss", misses)):
+            key = ("cache_requests_total", (("cache", cache), ("result", result)))
+            counters[key] = counters.get(key, 0) + value
+
+    by_name: Dict[str, List[Tuple[Labels, float]]] = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        full_name = f"{PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {COUNTERS.get(name, name)}")
+        lines.append(f"# TYPE {full_name} counter")
+        for labels, value in sorted(by_name[name]):
+            lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+
+    if histograms:
+        full_name = f"{PREFIX}_http_request_duration_seconds"
+        lines.append(f"# HELP {full_name} HTTP request latency until the response starts")
+        lines.append(f"# TYPE {full_name} histogram")
+        for labels, values in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, values):
+                cumulative += count
+                lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {int(values[-1])}")
+            lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+            lines.append(f"{full_name}_count{_format_labels(labels)} {int(values[-1])}")
+
+    gauges = _gauges()
+    hit_totals: Dict[str, List[float]] = {}
+    for labels, value in by_name.get("cache_requests_total", []):
+        label_map = dict(labels)
+        totals = hit_totals.setdefault(label_map["cache"], [0, 0])
+        totals[0 if label_map["result"] == "hit" else 1] += value
+    gauges.extend(
+        ("cache_hit_ratio", "Cache hit ratio since start", (("cache", cache),), hits / (hits + misses))
+        for cache, (hits, misses) in hit_totals.items()
+        if hits + misses
+    )
+
+    # 同名指标的样本需要连续输出
+    described = set()
+    for name, help_text, labels, value in sorted(gauges, key=lambda gauge: (gauge[0], gauge[2])):
+        full_name = f"{PREFIX}_{name}"
+        if full_name not in described:
+            described.add(full_name)
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} gauge")
+        lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,351 @@
+"""标题大纲索引模块
+
+使用 SQLite 为工作区中的每个 Markdown 文件维护标题大纲（级别、纯文本、锚点、行号和字符偏移），
+保存文件时更新；查询单个文件时按修改时间和大小判断是否过期，过期则重新解析。
+后台任务每 SYNC_INTERVAL 秒同步一次整个工作区，标题搜索直接读当前的索引。
+大文档的目录导航和全工作区的标题搜索都不必传输或解析文件全文；
+读文件、解析和数据库操作都在线程中执行，不占用事件循环。
+"""
+import asyncio
+import html
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from config import MARKDOWN_ROOT_PATH, MAX_FILE_SIZE
+from file_operations import normalize_path
+from logger_config import logger
+from markdown_render import split_source_lines, iter_blocks, render_inline, slugify
+
+# 索引数据库文件（以 . 开头的目录，不会出现在文件树中）
+OUTLINE_DIR = MARKDOWN_ROOT_PATH / ".outline"
+INDEX_PATH = OUTLINE_DIR / "index.sqlite3"
+
+MARKDOWN_SUFFIXES = {".md", ".markdown"}
+
+# 后台同步工作区（发现被外部修改的文件）的间隔秒数
+SYNC_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outline_files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS headings (
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    PRIMARY KEY (path, position)
+);
+"""
+
+_LINE_BREAK = re.compile(r'\r\n|\r|\n')
+_TAG = re.compile(r'<[^>]+>')
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _file_key(file_path: str) -> str:
+    return file_path.lstrip("/")
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(INDEX_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_index() -> None:
+    global _initialized
+    if _initialized and INDEX_PATH.exists():
+        return
+
+    with _init_lock:
+        if _initialized and INDEX_PATH.exists():
+            return
+        OUTLINE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = _connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+        _initialized = True
+
+
+@contextmanager
+def _db() -> Iterator[sqlite3.Connection]:
+    _ensure_index()
+    conn = _connect()
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def extract_outline(content: str) -> List[Dict[str, Any]]:
+    """
+    解析文档的标题大纲
+
+    Args:
+        content: Markdown 内容
+
+    Returns:
+        标题列表：级别、纯文本、锚点（与导出 HTML 中标题的 id 一致）、行号（从 1 开始）、
+        该行在内容中的字符偏移
+    """
+    lines = split_source_lines(content)
+    headings = [node for node in iter_blocks(lines) if node["type"] == "heading"]
+    if not headings:
+        return []
+
+    # 各行起始位置在原始内容中的字符偏移（解析器统一了换行符，行号与原始内容一致）
+    line_starts = [0]
+    line_starts.extend(match.end() for match in _LINE_BREAK.finditer(content))
+
+    return [
+        {
+            "level": node["level"],
+            "text": html.unescape(_TAG.sub("", render_inline(node["text"]))).strip(),
+            "slug": slugify(node["text"]),
+            "line": node["lines"][0] + 1,
+            "offset": line_starts[node["lines"][0]],
+        }
+        for node in headings
+    ]
+
+
+def _store(conn: sqlite3.Connection, key: str, stat, headings: List[Dict[str, Any]]) -> None:
+    conn.execute("DELETE FROM headings WHERE path = ?", (key,))
+    conn.executemany(
+        "INSERT INTO headings (path, position, level, text, slug, line, offset) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (key, position, heading["level"], heading["text"], heading["slug"], heading["line"], heading["offset"])
+            for position, heading in enumerate(headings)
+        ],
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO outline_files (path, mtime_ns, size, updated_at) VALUES (?, ?, ?, ?)",
+        (key, stat.st_mtime_ns, stat.st_size, datetime.now().isoformat()),
+    )
+
+
+def _is_markdown(path: Path) -> bool:
+    return path.suffix.lower() in MARKDOWN_SUFFIXES
+
+
+def _read_with_stat(full_path: Path):
+    """
+    读取文件内容和与之对应的 stat
+
+    先对打开的文件取 stat 再读取：读取期间文件被修改时，记录的修改时间早于内容，
+    下次查询会重新解析，而不会把旧的修改时间和新的内容错配后一直沿用。
+
+    Returns:
+        (stat, 内容)；文件过大或无法解码时内容为空串（按无标题处理，避免每次都重新读取）
+    """
+    with open(full_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size > MAX_FILE_SIZE:
+            return stat, ""
+        raw = f.read()
+    for encoding in ("utf-8", "gbk"):
+        try:
+            return stat, raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return stat, ""
+
+
+def update_file(file_path: str) -> int:
+    """
+    保存文件后更新该文件的大纲（从磁盘读取，修改时间和内容来自同一次读取）
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        标题数量
+    """
+    full_path = normalize_path(file_path)
+    if not _is_markdown(full_path):
+        return 0
+    stat, content = _read_with_stat(full_path)
+    headings = extract_outline(content)
+    with _db() as conn:
+        _store(conn, _file_key(file_path), stat, headings)
+    return len(headings)
+
+
+async def update_file_in_background(file_path: str) -> None:
+    """保存文件后更新大纲（后台任务，失败只记录日志）"""
+    try:
+        await asyncio.to_thread(update_file, file_path)
+    except Exception as e:
+        logger.error(f"Outline update failed: {file_path} - {str(e)}")
+
+
+def remove_path(file_path: str) -> None:
+    """删除文件或目录（含其下所有文件）的大纲"""
+    key = _file_key(file_path).rstrip("/")
+    prefix = key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "/%"
+    with _db() as conn:
+        for table in ("headings", "outline_files"):
+            conn.execute(f"DELETE FROM {table} WHERE path = ? OR path LIKE ? ESCAPE '\\'", (key, prefix))
+
+
+async def remove_path_in_background(file_path: str) -> None:
+    """删除文件或目录后清理其大纲（后台任务，失败只记录日志）"""
+    try:
+        await asyncio.to_thread(remove_path, file_path)
+    except Exception as e:
+        logger.error(f"Outline cleanup failed: {file_path} - {str(e)}")
+
+
+def _refresh(key: str, full_path: Path, conn: sqlite3.Connection) -> bool:
+    """文件的修改时间或大小与索引不一致时重新解析，返回是否更新了索引"""
+    stat = full_path.stat()
+    row = conn.execute("SELECT mtime_ns, size FROM outline_files WHERE path = ?", (key,)).fetchone()
+    if row and row["mtime_ns"] == stat.st_mtime_ns and row["size"] == stat.st_size:
+        return False
+    stat, content = _read_with_stat(full_path)
+    _store(conn, key, stat, extract_outline(content))
+    return True
+
+
+def _load_outline(file_path: str) -> Dict[str, Any]:
+    full_path = normalize_path(file_path)
+    if not full_path.is_file():
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+    if not _is_markdown(full_path):
+        raise ValueError(f"不是 Markdown 文件: {file_path}")
+
+    key = _file_key(file_path)
+    with _db() as conn:
+        _refresh(key, full_path, conn)
+        rows = conn.execute(
+            "SELECT level, text, slug, line, offset FROM headings WHERE path = ? ORDER BY position", (key,)
+        ).fetchall()
+        updated_at = conn.execute("SELECT updated_at FROM outline_files WHERE path = ?", (key,)).fetchone()[0]
+
+    return {"path": key, "headings": [dict(row) for row in rows], "updated_at": updated_at}
+
+
+async def get_outline(file_path: str) -> Dict[str, Any]:
+    """
+    获取文件的标题大纲（索引过期时先更新）
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        ValueError: 不是 Markdown 文件
+        PermissionError: 路径越界
+    """
+    return await asyncio.to_thread(_load_outline, file_path)
+
+
+def sync_workspace() -> Dict[str, int]:
+    """
+    同步整个工作区：重新解析新增或被外部修改的文件，删除已不存在的文件的大纲
+
+    Returns:
+        扫描的文件数、更新的文件数、删除的文件数
+    """
+    root = MARKDOWN_ROOT_PATH.resolve()
+    seen = set()
+    updated = 0
+    with _db() as conn:
+        for full_path in root.rglob("*"):
+            relative = full_path.relative_to(root)
+            if any(part.startswith(".") for part in relative.parts):
+                continue
+            if not _is_markdown(full_path) or not full_path.is_file():
+                continue
+            key = relative.as_posix()
+            seen.add(key)
+            try:
+                if _refresh(key, full_path, conn):
+                    updated += 1
+            except OSError as e:
+                logger.warning(f"Outline sync skipped: {key} - {str(e)}")
+
+        indexed = [row["path"] for row in conn.execute("SELECT path FROM outline_files")]
+        removed = [key for key in indexed if key not in seen]
+        for key in removed:
+            conn.execute("DELETE FROM headings WHERE path = ?", (key,))
+            conn.execute("DELETE FROM outline_files WHERE path = ?", (key,))
+
+    return {"files": len(seen), "updated": updated, "removed": len(removed)}
+
+
+async def sync_workspace_in_background() -> None:
+    """同步工作区（重命名后的后台任务，失败只记录日志）"""
+    try:
+        summary = await asyncio.to_thread(sync_workspace)
+        logger.info(
+            f"Outline index synced: {summary['files']} files, "
+            f"updated {summary['updated']}, removed {summary['removed']}"
+        )
+    except Exception as e:
+        logger.error(f"Outline sync failed: {str(e)}")
+
+
+async def run_periodic_sync() -> None:
+    """启动时同步一次工作区，之后每 SYNC_INTERVAL 秒同步被外部修改的文件"""
+    await sync_workspace_in_background()
+    while True:
+        await asyncio.sleep(SYNC_INTERVAL)
+        try:
+            summary = await asyncio.to_thread(sync_workspace)
+            if summary["updated"] or summary["removed"]:
+                logger.info(
+                    f"Outline index synced: {summary['files']} files, "
+                    f"updated {summary['updated']}, removed {summary['removed']}"
+                )
+        except Exception as e:
+            logger.error(f"Outline sync failed: {str(e)}")
+
+
+def _search(sql: str, params: List[Any]) -> List[Dict[str, Any]]:
+    with _db() as conn:
+        return [dict(row) for row in conn.execute(sql, params)]
+
+
+async def search_headings(query: str, limit: int = 50, level: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    在整个工作区中搜索标题（读当前的索引，被外部修改的文件在下次后台同步后才能搜到）
+
+    Args:
+        query: 关键字（不区分大小写）
+        limit: 最多返回的条数
+        level: 只搜索该级别的标题
+
+    Returns:
+        匹配的标题，包含所在文件、级别、文本、锚点和行号
+    """
+    if not query:
+        return []
+
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    sql = "SELECT path, level, text, slug, line FROM headings WHERE text LIKE ? ESCAPE '\\'"
+    params: List[Any] = [pattern]
+    if level is not None:
+        sql += " AND level = ?"
+        params.append(level)
+    sql += " ORDER BY path, position LIMIT ?"
+    params.append(limit)
+
+    return await asyncio.to_thread(_search, sql, params)
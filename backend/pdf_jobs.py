@@ -0,0 +1,259 @@
+"""PDF 导出任务模块
+
+WeasyPrint 渲染是 CPU 密集的同步操作，放在请求处理协程中执行会阻塞整个服务。
+PDF 渲染交给固定大小的进程池：提交任务后立即返回任务 ID，通过状态和下载接口获取结果。
+工作进程启动时预先渲染一次空文档，字体配置和样式表在进程的整个生命周期内复用。
+"""
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, Optional
+from config import PDF_WORKERS, PDF_QUEUE_LIMIT, PDF_JOB_TTL, PDF_JOB_MAX_BYTES
+from logger_config import logger
+import exporters
+import render_cache
+from tracing import span
+
+_lock = threading.RLock()
+_executor: Optional[ProcessPoolExecutor] = None
+_jobs: Dict[str, Dict[str, Any]] = {}
+
+
+class QueueFullError(Exception):
+    """排队中的 PDF 导出任务数达到 PDF_QUEUE_LIMIT"""
+
+
+def _warm_worker() -> None:
+    """工作进程初始化：加载 WeasyPrint 并渲染一次空文档，让字体配置常驻进程"""
+    try:
+        from weasyprint import HTML
+        HTML(string="<p></p>").write_pdf()
+    except Exception:
+        # 未安装 weasyprint 时由任务本身报告错误
+        pass
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=_warm_worker)
+    return _executor
+
+
+def _expire_jobs(now: float) -> None:
+    """
+    清理已结束任务（调用方持有锁）
+
+    超过 PDF_JOB_TTL 的任务直接删除；其余已结束任务的结果总大小超过 PDF_JOB_MAX_BYTES 时，
+    从最早结束的任务开始删除
+    """
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job["finished"] is not None and now - job["finished"] > PDF_JOB_TTL
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+
+    finished = sorted(
+        (job for job in _jobs.values() if job["result"] is not None),
+        key=lambda job: job["finished"],
+    )
+    total = sum(len(job["result"]) for job in finished)
+    for job in finished:
+        if total <= PDF_JOB_MAX_BYTES:
+            break
+        total -= len(job["result"])
+        del _jobs[job["id"]]
+
+
+def _pending_count() -> int:
+    return sum(1 for job in _jobs.values() if job["finished"] is None)
+
+
+def _on_done(job_id: str, cache_key: str, future: Future) -> None:
+    """任务结束回调（在进程池的管理线程中执行）"""
+    global _executor
+
+    error = future.exception()
+    result = None if error else future.result()
+    if result is not None:
+        render_cache.put("pdf", cache_key, result)
+
+    with _lock:
+        if isinstance(error, BrokenProcessPool):
+            # 工作进程异常退出后进程池不可再用，下次提交时重新创建
+            _executor = None
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["finished"] = time.time()
+        job["finished_at"] = datetime.now().isoformat()
+        if error:
+            job["status"] = "failed"
+            job["error"] = str(error)
+        else:
+            job["status"] = "done"
+            job["result"] = result
+            _expire_jobs(job["finished"])
+
+    if error:
+        logger.error(f"PDF job failed: {job_id} - {str(error)}")
+    else:
+        logger.info(f"PDF job done: {job_id} - {len(result)} bytes")
+
+
+def _submit(content: str, title: str, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    登记并提交任务，返回任务记录本身（任务之后被清理时调用方仍持有结果）
+
+    Raises:
+        QueueFullError: 排队中的任务数达到 PDF_QUEUE_LIMIT
+    """
+    now = time.time()
+    job_id = uuid.uuid4().hex
+    job = {
+        "id": job_id,
+        "title": title,
+        "status": "queued",
+        "created_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "finished": None,
+        "error": None,
+        "result": None,
+        "future": None,
+    }
+
+    cache_key = exporters.pdf_cache_key(content, title, options)
+    cached = render_cache.get("pdf", cache_key)
+
+    with _lock:
+        _expire_jobs(now)
+        if cached is not None:
+            job.update(status="done", result=cached, finished=now, finished_at=job["created_at"])
+            _jobs[job_id] = job
+            return job
+
+        if _pending_count() >= PDF_QUEUE_LIMIT:
+            raise QueueFullError(f"PDF 导出队列已满（{PDF_QUEUE_LIMIT} 个任务），请稍后重试")
+
+        _jobs[job_id] = job
+        future = _get_executor().submit(exporters.render_pdf, content, title, options)
+        job["future"] = future
+
+    logger.info(f"PDF job queued: {job_id} - {title}")
+    future.add_done_callback(lambda done: _on_done(job_id, cache_key, done))
+    return job
+
+
+def _status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """任务状态（调用方持有锁）"""
+    status = job["status"]
+    if status == "queued" and job["future"] is not None and job["future"].running():
+        status = "running"
+
+    return {
+        "id": job["id"],
+        "title": job["title"],
+        "status": status,
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"],
+        "size": len(job["result"]) if job["result"] is not None else None,
+    }
+
+
+def submit_job(content: str, title: str = "Markdown Document", options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    提交 PDF 导出任务
+
+    Args:
+        content: Markdown 内容
+        title: 文档标题
+        options: 导出选项，同 exporters.export_to_pdf
+
+    Returns:
+        任务状态；缓存中已有相同内容和选项的 PDF 时任务直接完成
+
+    Raises:
+        QueueFullError: 排队中的任务数达到 PDF_QUEUE_LIMIT
+    """
+    job = _submit(content, title, options)
+    with _lock:
+        return _status(job)
+
+
+def job_status(job_id: str) -> Dict[str, Any]:
+    """
+    查询任务状态
+
+    Raises:
+        FileNotFoundError: 任务不存在或已过期
+    """
+    with _lock:
+        _expire_jobs(time.time())
+        job = _jobs.get(job_id)
+        if job is None:
+            raise FileNotFoundError(f"PDF 导出任务不存在: {job_id}")
+        return _status(job)
+
+
+def job_result(job_id: str) -> Dict[str, Any]:
+    """
+    获取已完成任务的 PDF
+
+    Returns:
+        {"title": 文档标题, "content": PDF 二进制数据}
+
+    Raises:
+        FileNotFoundError: 任务不存在或已过期
+        ValueError: 任务尚未完成或失败
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            raise FileNotFoundError(f"PDF 导出任务不存在: {job_id}")
+        if job["status"] == "failed":
+            raise ValueError(f"PDF 导出失败: {job['error']}")
+        if job["status"] != "done":
+            raise ValueError("PDF 导出任务尚未完成")
+        return {"title": job["title"], "content": job["result"]}
+
+
+async def export_pdf(content: str, title: str = "Markdown Document", options: Dict[str, Any] = None) -> bytes:
+    """
+    在进程池中导出 PDF 并等待结果（不阻塞事件循环）
+
+    Raises:
+        QueueFullError: 导出队列已满
+        ImportError: 未安装 weasyprint
+    """
+    job = _submit(content, title, options)
+    future = job["future"]
+
+    if future is not None:
+        try:
+            with span("pdf_render"):
+                await asyncio.wrap_future(future)
+        finally:
+            # 同步导出的结果已经直接返回，不再保留任务
+            with _lock:
+                _jobs.pop(job["id"], None)
+        return future.result()
+
+    with _lock:
+        _jobs.pop(job["id"], None)
+    return job["result"]
+
+
+def shutdown() -> None:
+    """关闭进程池（应用退出时调用）"""
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,161 @@
+"""实时预览增量渲染模块
+
+把文档拆分为顶层块，按块的源文本哈希缓存渲染好的 HTML，只把发生变化的块作为补丁返回。
+带 session 的请求会保留上一次的行和块：新内容只从改动处之前的块边界开始重新解析，
+解析到改动之后、与旧块边界重新对齐时即停止，其余块直接复用。
+这样编辑时的解析和渲染量取决于改动的大小，而不是文档的大小。
+渲染在线程中执行，块缓存和会话表的读写由锁保护，解析和渲染本身不持有锁。
+"""
+import hashlib
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from markdown_render import Node, split_source_lines, iter_blocks, render_node
+import metrics
+
+# 块 HTML 的 LRU 缓存容量（块数）
+BLOCK_CACHE_SIZE = 16384
+
+# 保留解析状态的预览会话数
+SESSION_LIMIT = 32
+
+# 顶层块：(起始行, 结束行, 块 ID, 节点)，节点中的行号在复用后不再更新
+Block = Tuple[int, int, str, Node]
+
+_lock = threading.Lock()
+_block_cache: "OrderedDict[str, str]" = OrderedDict()
+_sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def block_id(kind: str, source: str) -> str:
+    """块 ID：块类型和源文本的哈希"""
+    return hashlib.sha1(f"{kind}\0{source}".encode('utf-8')).hexdigest()[:16]
+
+
+def _make_block(lines: List[str], node: Node) -> Block:
+    start, end = node["lines"]
+    return start, end, block_id(node["type"], "\n".join(lines[start:end])), node
+
+
+def _reparse(old_lines: List[str], old_blocks: List[Block], lines: List[str]) -> List[Block]:
+    """在上一次的解析结果上增量解析新内容"""
+    limit = min(len(old_lines), len(lines))
+    first = 0
+    while first < limit and old_lines[first] == lines[first]:
+        first += 1
+    if first == len(old_lines) == len(lines):
+        return old_blocks
+
+    same_tail = 0
+    while same_tail < limit - first and old_lines[-1 - same_tail] == lines[-1 - same_tail]:
+        same_tail += 1
+    delta = len(lines) - len(old_lines)
+    # 新内容中从 changed_end 行开始与旧内容相同
+    changed_end = len(lines) - same_tail
+
+    # 代码块和列表在结束前会向后查看空行，改动前的空行可能影响上一个块的范围
+    while first > 0 and not lines[first - 1].strip():
+        first -= 1
+
+    ends = [block[1] for block in old_blocks]
+    index = bisect_left(ends, first)
+    blocks = old_blocks[:index]
+    begin = ends[index - 1] if index else 0
+
+    for node in iter_blocks(lines, begin):
+        blocks.append(_make_block(lines, node))
+        end = node["lines"][1]
+        if end < changed_end:
+            continue
+        # 此后的内容与旧内容相同，块边界对齐后旧的解析结果整体平移即可复用
+        aligned = bisect_left(ends, end - delta)
+        if aligned < len(ends) and ends[aligned] == end - delta:
+            blocks.extend(
+                (start + delta, stop + delta, key, reused)
+                for start, stop, key, reused in old_blocks[aligned + 1:]
+            )
+            break
+
+    return blocks
+
+
+def _render_block(block: Block) -> str:
+    key = block[2]
+    with _lock:
+        html = _block_cache.get(key)
+        if html is not None:
+            _block_cache.move_to_end(key)
+    metrics.cache_lookup("preview_block", html is not None)
+    if html is not None:
+        return html
+
+    html = render_node(block[3])
+    with _lock:
+        _block_cache[key] = html
+        if len(_block_cache) > BLOCK_CACHE_SIZE:
+            _block_cache.popitem(last=False)
+    return html
+
+
+def render_incremental(
+    content: str,
+    previous: Optional[List[str]] = None,
+    session: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    增量渲染文档
+
+    Args:
+        content: Markdown 内容
+        previous: 客户端当前显示的块 ID 列表；为空时使用该会话上一次返回的列表，
+            没有会话时返回全部块
+        session: 预览会话标识（如编辑器实例 ID），用于保留上一次的解析结果
+
+    Returns:
+        当前的块 ID 列表和补丁；补丁表示把旧列表中 [start, start + delete) 范围的块
+        替换为 insert 中的块，只有发生变化的块会被重新渲染并返回 HTML
+    """
+    lines = split_source_lines(content)
+
+    # 会话状态只整体替换、不原地修改，取出后可以在锁外使用
+    with _lock:
+        state = _sessions.get(session) if session else None
+    if state is not None:
+        blocks = _reparse(state["lines"], state["blocks"], lines)
+        if previous is None:
+            previous = [block[2] for block in state["blocks"]]
+    else:
+        blocks = [_make_block(lines, node) for node in iter_blocks(lines)]
+
+    if session:
+        with _lock:
+            _sessions[session] = {"lines": lines, "blocks": blocks}
+            _sessions.move_to_end(session)
+            if len(_sessions) > SESSION_LIMIT:
+                _sessions.popitem(last=False)
+
+    ids = [block[2] for block in blocks]
+    if previous is None:
+        previous = []
+
+    # 编辑通常集中在一处：去掉首尾相同的块，剩下的部分作为一个补丁
+    prefix = 0
+    limit = min(len(ids), len(previous))
+    while prefix < limit and ids[prefix] == previous[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and ids[-1 - suffix] == previous[-1 - suffix]:
+        suffix += 1
+
+    insert = [
+        {"id": block[2], "html": _render_block(block)}
+        for block in blocks[prefix:len(blocks) - suffix]
+    ]
+
+    patches = []
+    deleted = len(previous) - prefix - suffix
+    if insert or deleted:
+        patches.append({"start": prefix, "delete": deleted, "insert": insert})
+
+    return {"ids": ids, "patches": patches}
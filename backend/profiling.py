@@ -0,0 +1,135 @@
+"""按需请求性能分析模块
+
+设置 PROFILE_TOKEN 后，带 X-Profile-Token 请求头（或 __profile 查询参数）且令牌正确的请求
+会在 cProfile 下执行，结果以 pstats 格式保存到 profiles 目录（与 logs 目录并列），
+可以用 snakeviz、flameprof 等工具查看或转换为火焰图。目录中只保留最近 PROFILE_KEEP 个文件。
+
+未设置 PROFILE_TOKEN 时不注册中间件，对请求没有任何额外开销。
+cProfile 记录的是事件循环线程：分析期间同时处理的其他请求也会出现在结果中，
+to_thread 和进程池中执行的代码不会被记录。同一时间只分析一个请求。
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config import PROFILE_TOKEN, PROFILE_KEEP
+from logger_config import logger
+
+# 分析结果目录
+PROFILES_DIR = Path("profiles")
+
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_QUERY = "__profile"
+
+_PROFILE_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+_active_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(PROFILE_TOKEN)
+
+
+def is_authorized(token: Optional[str]) -> bool:
+    """校验令牌（未设置 PROFILE_TOKEN 时总是拒绝）"""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8'))
+
+
+class RequestProfile:
+    """一次请求的性能分析"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.profiler = cProfile.Profile()
+        self.stopped = False
+        started = datetime.now()
+        route = re.sub(r'[^\w]+', '-', path).strip('-')[:60] or "root"
+        # 文件名在开始时确定，流式响应开始返回前就可以在响应头中告知
+        self.name = f"{started.strftime('%Y%m%d-%H%M%S')}_{method}_{route}_{uuid.uuid4().hex[:6]}.prof"
+
+    def start(self) -> bool:
+        """开始分析；已有请求正在分析时返回 False"""
+        if not _active_lock.acquire(blocking=False):
+            return False
+        self.profiler.enable()
+        return True
+
+    def stop(self) -> None:
+        """结束分析并保存结果（失败只记录日志）；可以重复调用，只有第一次生效"""
+        if self.stopped:
+            return
+        self.stopped = True
+        try:
+            self.profiler.disable()
+        finally:
+            _active_lock.release()
+
+        try:
+            PROFILES_DIR.mkdir(exist_ok=True)
+            tmp_path = PROFILES_DIR / f".{self.name}.tmp"
+            self.profiler.dump_stats(tmp_path)
+            os.replace(tmp_path, PROFILES_DIR / self.name)
+            _prune()
+            logger.info(f"Request profiled: {self.method} {self.path} - {self.name}")
+        except OSError as e:
+            logger.error(f"Save profile failed: {self.name} - {str(e)}")
+
+
+def _prune() -> None:
+    """只保留最近的 PROFILE_KEEP 个分析结果"""
+    profiles = sorted(PROFILES_DIR.glob("*.prof"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in profiles[PROFILE_KEEP:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """最近的分析结果，按时间倒序"""
+    if not PROFILES_DIR.exists():
+        return []
+    profiles = []
+    for path in PROFILES_DIR.glob("*.prof"):
+        stat = path.stat()
+        profiles.append({
+            "name": path.name,
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        })
+    profiles.sort(key=lambda profile: profile["created_at"], reverse=True)
+    return profiles
+
+
+def get_profile_path(name: str) -> Path:
+    """
+    获取分析结果文件
+
+    Raises:
+        FileNotFoundError: 文件不存在或名称不合法
+    """
+    if not _PROFILE_NAME.match(name) or name.startswith("."):
+        raise FileNotFoundError(f"分析结果不存在: {name}")
+    path = PROFILES_DIR / name
+    if not path.is_file():
+        raise FileNotFoundError(f"分析结果不存在: {name}")
+    return path
+
+
+def profile_summary(name: str, limit: int = 50) -> str:
+    """按累计耗时排序的文本摘要"""
+    path = get_profile_path(name)
+    output = io.StringIO()
+    stats = pstats.Stats(str(path), stream=output)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
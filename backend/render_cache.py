@@ -0,0 +1,296 @@
+"""导出渲染缓存模块
+
+按内容哈希和导出选项缓存渲染结果（HTML、PDF），分两级：
+进程内按字节数限额的 LRU，以及按总大小限额的磁盘缓存（.render-cache 目录）。
+内存未命中时读取磁盘，磁盘命中的结果会放回内存；磁盘超出限额时按最近访问时间淘汰。
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from config import MARKDOWN_ROOT_PATH, RENDER_CACHE_MEMORY_BYTES, RENDER_CACHE_DISK_BYTES
+from logger_config import logger
+
+# 磁盘缓存目录（以 . 开头，不会出现在文件树中）
+RENDER_CACHE_DIR = MARKDOWN_ROOT_PATH / ".render-cache"
+
+# 缓存格式版本，渲染输出发生变化时递增，使旧的磁盘缓存失效
+CACHE_FORMAT = 1
+
+# 逐段写入的条目不超过该字节数时同时放入内存缓存，更大的条目只写磁盘
+WRITER_MEMORY_LIMIT = 1024 * 1024
+
+# 磁盘超出限额时淘汰到限额的该比例以下，避免每次写入都触发淘汰
+_DISK_LOW_WATERMARK = 0.9
+
+_lock = threading.Lock()
+_memory: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+_memory_bytes = 0
+# 磁盘缓存总字节数，首次写入时扫描目录得到
+_disk_bytes: Optional[int] = None
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def make_key(content: str, **options: Any) -> str:
+    """
+    计算缓存键
+
+    Args:
+        content: Markdown 内容
+        options: 影响输出的选项（主题、目录、页面大小等）
+
+    Returns:
+        缓存键（SHA256 十六进制）
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([CACHE_FORMAT, options], sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _disk_path(kind: str, key: str) -> Path:
+    return RENDER_CACHE_DIR / kind / key[:2] / key
+
+
+def _remember(kind: str, key: str, data: bytes) -> None:
+    """放入内存 LRU（调用方持有锁）"""
+    global _memory_bytes
+
+    if len(data) > RENDER_CACHE_MEMORY_BYTES:
+        return
+    previous = _memory.pop((kind, key), None)
+    if previous is not None:
+        _memory_bytes -= len(previous)
+    _memory[(kind, key)] = data
+    _memory_bytes += len(data)
+    while _memory_bytes > RENDER_CACHE_MEMORY_BYTES:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= len(evicted)
+
+
+def get(kind: str, key: str) -> Optional[bytes]:
+    """
+    读取缓存
+
+    Args:
+        kind: 缓存类别（html / pdf）
+        key: make_key 计算的缓存键
+
+    Returns:
+        缓存的数据，未命中时返回 None
+    """
+    with _lock:
+        data = _memory.get((kind, key))
+        if data is not None:
+            _memory.move_to_end((kind, key))
+            _stats["memory_hits"] += 1
+            return data
+
+    if RENDER_CACHE_DISK_BYTES > 0:
+        path = _disk_path(kind, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新访问时间，淘汰时按访问时间排序
+            os.utime(path)
+        except FileNotFoundError:
+            data = None
+        except OSError as e:
+            logger.warning(f"Render cache read failed: {path} - {str(e)}")
+            data = None
+
+        if data is not None:
+            with _lock:
+                _remember(kind, key, data)
+                _stats["disk_hits"] += 1
+            return data
+
+    with _lock:
+        _stats["misses"] += 1
+    return None
+
+
+def put(kind: str, key: str, data: bytes) -> None:
+    """
+    写入缓存（内存和磁盘），磁盘写入失败只记录日志
+
+    Args:
+        kind: 缓存类别（html / pdf）
+        key: make_key 计算的缓存键
+        data: 渲染结果
+    """
+    with _lock:
+        _remember(kind, key, data)
+
+    if RENDER_CACHE_DISK_BYTES <= 0 or len(data) > RENDER_CACHE_DISK_BYTES:
+        return
+
+    path = _disk_path(kind, key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _tmp_path(path)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        _install(tmp_path, path, len(data))
+    except OSError as e:
+        logger.warning(f"Render cache write failed: {path} - {str(e)}")
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+
+def _install(tmp_path: Path, path: Path, size: int) -> None:
+    """把写好的临时文件替换为缓存条目，并累计磁盘缓存大小"""
+    try:
+        replaced = path.stat().st_size
+    except FileNotFoundError:
+        replaced = 0
+    os.replace(tmp_path, path)
+    _account_disk(size - replaced)
+
+
+class CacheWriter:
+    """
+    逐段写入缓存条目（用于流式导出）
+
+    数据边写边落盘，不在内存中拼接完整结果；不超过 WRITER_MEMORY_LIMIT 的条目同时放入内存 LRU。
+    生成过程中断时调用 discard，不会留下不完整的条目。
+    """
+
+    def __init__(self, kind: str, key: str):
+        self.kind = kind
+        self.key = key
+        self._chunks: Optional[List[bytes]] = []
+        self._size = 0
+        self._path = _disk_path(kind, key)
+        self._tmp_path: Optional[Path] = None
+        self._file = None
+        if RENDER_CACHE_DISK_BYTES > 0:
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                self._tmp_path = _tmp_path(self._path)
+                self._file = open(self._tmp_path, 'wb')
+            except OSError as e:
+                logger.warning(f"Render cache write failed: {self._path} - {str(e)}")
+                self._file = None
+
+    def write(self, data: bytes) -> None:
+        self._size += len(data)
+        if self._chunks is not None:
+            if self._size <= WRITER_MEMORY_LIMIT:
+                self._chunks.append(data)
+            else:
+                self._chunks = None
+        if self._file is not None:
+            try:
+                self._file.write(data)
+            except OSError as e:
+                logger.warning(f"Render cache write failed: {self._path} - {str(e)}")
+                self._close_file()
+
+    def commit(self) -> None:
+        """写入完成，登记缓存条目"""
+        if self._chunks is not None:
+            with _lock:
+                _remember(self.kind, self.key, b"".join(self._chunks))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            if self._size > RENDER_CACHE_DISK_BYTES:
+                self._tmp_path.unlink(missing_ok=True)
+                return
+            try:
+                _install(self._tmp_path, self._path, self._size)
+            except OSError as e:
+                logger.warning(f"Render cache write failed: {self._path} - {str(e)}")
+
+    def discard(self) -> None:
+        """放弃写入"""
+        self._chunks = None
+        self._close_file()
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._tmp_path.unlink(missing_ok=True)
+
+
+def _scan_disk() -> int:
+    total = 0
+    for path in RENDER_CACHE_DIR.glob("*/*/*"):
+        if path.name.startswith("."):
+            # 正在写入的临时文件
+            continue
+        try:
+            total += path.stat().st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def _account_disk(delta: int) -> None:
+    """累计磁盘缓存大小，超出限额时淘汰最久未访问的条目"""
+    global _disk_bytes
+
+    with _lock:
+        if _disk_bytes is None:
+            # 首次写入时扫描目录，已包含刚写入的条目
+            _disk_bytes = _scan_disk()
+        else:
+            _disk_bytes += delta
+        if _disk_bytes <= RENDER_CACHE_DISK_BYTES:
+            return
+
+        entries = []
+        for path in RENDER_CACHE_DIR.glob("*/*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = RENDER_CACHE_DISK_BYTES * _DISK_LOW_WATERMARK
+        evicted = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        _disk_bytes = total
+
+    logger.debug(f"Render cache evicted {evicted} entries, {total} bytes on disk")
+
+
+def clear() -> None:
+    """清空内存缓存（磁盘缓存保留）"""
+    global _memory_bytes
+
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+
+
+def stats() -> Dict[str, int]:
+    """缓存命中统计"""
+    with _lock:
+        return {
+            **_stats,
+            "memory_entries": len(_memory),
+            "memory_bytes": _memory_bytes,
+            "disk_bytes": _disk_bytes if _disk_bytes is not None else -1,
+        }
@@ -0,0 +1,458 @@
+"""静态站点导出模块
+
+把目录下的所有 Markdown 文件导出为静态站点（zip）：
+页面在进程池中并行渲染，所有页面共用一个 style.css；相对链接和图片路径改写为站点内的路径，
+引用的图片一并打包；index.html 按目录结构列出所有页面。
+每个目录的渲染结果保存在 .site-export 下，再次导出时只重新渲染内容发生变化的文件。
+打包的页面在持有导出锁时硬链接到单独的快照目录，同一目录的再次导出不会改动正在下载的文件。
+"""
+import hashlib
+import html
+import io
+import json
+import os
+import posixpath
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+from config import MARKDOWN_ROOT_PATH, SITE_EXPORT_WORKERS
+from exporters import get_html_css
+from file_operations import normalize_path
+from logger_config import logger
+from markdown_render import markdown_to_html, escape_html
+
+# 渲染结果目录（以 . 开头，不会出现在文件树中）
+SITE_EXPORT_DIR = MARKDOWN_ROOT_PATH / ".site-export"
+
+# 下载用的页面快照目录；超过 SNAPSHOT_TTL 秒仍未删除的快照（下载中断）在下次导出时清理
+SNAPSHOTS_DIR = SITE_EXPORT_DIR / "snapshots"
+SNAPSHOT_TTL = 3600
+
+# 页面模板或链接改写规则变化时递增，使保存的渲染结果失效
+SITE_FORMAT = 1
+
+MARKDOWN_SUFFIXES = {".md", ".markdown"}
+
+# 需要改写的文件数不超过该值时在当前进程渲染，省去进程间传输
+_INLINE_RENDER_LIMIT = 4
+
+# 不在导出目录内的资源文件放在站点的该目录下
+_EXTERNAL_ASSETS = "_assets"
+
+_LINK_ATTRIBUTE = re.compile(r'(href|src)="([^"]*)"')
+_URL_SCHEME = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+_IMAGE_API_PREFIX = "/api/images/"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_export_locks: Dict[str, threading.Lock] = {}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=SITE_EXPORT_WORKERS)
+        return _executor
+
+
+def shutdown() -> None:
+    """关闭进程池（应用退出时调用）"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _decode(raw: bytes) -> str:
+    """与 read_file 相同：先尝试 UTF-8，再尝试 GBK"""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        try:
+            return raw.decode("gbk")
+        except UnicodeDecodeError:
+            raise ValueError("无法解码文件内容")
+
+
+def _site_path(workspace_path: str, base: str) -> Optional[str]:
+    """工作区路径在站点中的路径；base 为导出目录（工作区相对路径，根目录为空串）"""
+    if not base:
+        return workspace_path
+    if workspace_path.startswith(base + "/"):
+        return workspace_path[len(base) + 1:]
+    return None
+
+
+def page_output(site_path: str) -> str:
+    """页面在站点中的文件名：扩展名换为 .html，与站点首页同名的页面保留原扩展名"""
+    output = posixpath.splitext(site_path)[0] + ".html"
+    return site_path + ".html" if output == "index.html" else output
+
+
+def _rewrite_links(page_html: str, page_path: str, base: str) -> Tuple[str, List[str]]:
+    """
+    改写页面中的链接和图片路径
+
+    Args:
+        page_html: 页面 HTML
+        page_path: 页面对应的 Markdown 文件在工作区中的路径
+        base: 导出目录在工作区中的路径
+
+    Returns:
+        (改写后的 HTML, 引用的资源文件在工作区中的路径列表)
+    """
+    page_dir = posixpath.dirname(page_path)
+    page_site_dir = posixpath.dirname(_site_path(page_path, base))
+    assets = []
+
+    def replace(match: "re.Match") -> str:
+        attribute, value = match.group(1), html.unescape(match.group(2))
+        if not value or value.startswith(("#", "//")) or _URL_SCHEME.match(value):
+            return match.group(0)
+
+        target, fragment = value, ""
+        for separator in ("#", "?"):
+            if separator in target:
+                target, rest = target.split(separator, 1)
+                fragment = separator + rest + fragment
+
+        if target.startswith(_IMAGE_API_PREFIX):
+            workspace_path = posixpath.normpath(unquote(target[len(_IMAGE_API_PREFIX):]))
+        elif target.startswith("/") or not target:
+            return match.group(0)
+        else:
+            workspace_path = posixpath.normpath(posixpath.join(page_dir, unquote(target)))
+        # 工作区之外和隐藏目录（版本、缓存）中的文件不打包，链接保持原样
+        if any(part == ".." or part.startswith(".") for part in workspace_path.split("/")):
+            return match.group(0)
+
+        site_path = _site_path(workspace_path, base)
+        suffix = posixpath.splitext(workspace_path)[1].lower()
+        if suffix in MARKDOWN_SUFFIXES:
+            if site_path is None:
+                return match.group(0)
+            site_path = page_output(site_path)
+        else:
+            assets.append(workspace_path)
+            if site_path is None:
+                site_path = f"{_EXTERNAL_ASSETS}/{workspace_path}"
+
+        relative = posixpath.relpath(site_path, page_site_dir or ".")
+        return f'{attribute}="{escape_html(relative + fragment)}"'
+
+    return _LINK_ATTRIBUTE.sub(replace, page_html), assets
+
+
+def render_page(content: str, page_path: str, base: str, options: Dict[str, Any]) -> Tuple[str, List[str]]:
+    """
+    渲染站点页面（在进程池中执行）
+
+    Args:
+        content: Markdown 内容
+        page_path: 文件在工作区中的路径
+        base: 导出目录在工作区中的路径
+        options: 导出选项（theme / include_toc）
+
+    Returns:
+        (页面 HTML, 引用的资源文件在工作区中的路径列表)
+    """
+    theme = options.get("theme", "light")
+    title = posixpath.splitext(posixpath.basename(page_path))[0]
+    body, assets = _rewrite_links(
+        markdown_to_html(content, options.get("include_toc", False)), page_path, base
+    )
+    root = "../" * _site_path(page_path, base).count("/")
+
+    page = f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{escape_html(title)}</title>
+    <link rel="stylesheet" href="{root}style.css">
+</head>
+<body class="theme-{escape_html(theme)}">
+    <div class="container">
+        <nav class="site-nav"><a href="{root}index.html">目录</a></nav>
+        <h1 class="document-title">{escape_html(title)}</h1>
+{body}
+    </div>
+</body>
+</html>
+"""
+    return page, assets
+
+
+def _render_index(pages: List[str], title: str, theme: str) -> str:
+    """按目录结构生成站点首页"""
+    tree: Dict[str, Any] = {}
+    for page in pages:
+        node = tree
+        parts = page.split("/")
+        for part in parts[:-1]:
+            node = node.setdefault(part + "/", {})
+        node[parts[-1]] = page
+
+    def render(node: Dict[str, Any]) -> str:
+        items = []
+        # 目录在前，文件在后，各自按名称排序
+        for name in sorted(node, key=lambda key: (not key.endswith("/"), key.lower())):
+            child = node[name]
+            if isinstance(child, dict):
+                items.append(f"<li>{escape_html(name[:-1])}{render(child)}</li>")
+            else:
+                link = page_output(child)
+                label = posixpath.splitext(name)[0]
+                items.append(f'<li><a href="{escape_html(link)}">{escape_html(label)}</a></li>')
+        return f"<ul>{''.join(items)}</ul>"
+
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{escape_html(title)}</title>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body class="theme-{escape_html(theme)}">
+    <div class="container">
+        <h1 class="document-title">{escape_html(title)}</h1>
+        <nav class="site-index">{render(tree)}</nav>
+    </div>
+</body>
+</html>
+"""
+
+
+def _state_dir(base: str) -> Path:
+    """目录的渲染结果目录：相对路径的哈希，不同目录（如 a/b 与 a_b）不会共用"""
+    return SITE_EXPORT_DIR / hashlib.sha256(base.encode("utf-8")).hexdigest()[:32]
+
+
+def _snapshot(files: Dict[str, Path]) -> Tuple[Path, Dict[str, Path]]:
+    """把文件硬链接（不支持时复制）到新的快照目录，返回快照目录和 站点内路径 -> 快照文件"""
+    snapshot_dir = SNAPSHOTS_DIR / uuid.uuid4().hex
+    snapshot_dir.mkdir(parents=True)
+    copies = {}
+    for index, (name, source) in enumerate(files.items()):
+        target = snapshot_dir / str(index)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+        copies[name] = target
+    return snapshot_dir, copies
+
+
+def _prune_snapshots() -> None:
+    """清理下载中断后遗留的快照"""
+    if not SNAPSHOTS_DIR.exists():
+        return
+    expired = time.time() - SNAPSHOT_TTL
+    for path in SNAPSHOTS_DIR.iterdir():
+        try:
+            if path.stat().st_mtime < expired:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _collect(directory: Path) -> List[Path]:
+    """目录下所有 Markdown 文件（跳过以 . 开头的文件和目录）"""
+    files = []
+    for path in directory.rglob("*"):
+        relative = path.relative_to(directory)
+        if any(part.startswith(".") for part in relative.parts):
+            continue
+        if path.suffix.lower() in MARKDOWN_SUFFIXES and path.is_file():
+            files.append(path)
+    return sorted(files)
+
+
+def prepare_site(relative_path: str = "", options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    渲染目录下的所有 Markdown 文件（只重新渲染发生变化的文件）
+
+    Args:
+        relative_path: 导出目录（工作区相对路径，空串表示整个工作区）
+        options: 导出选项
+            - theme: 主题 (light/dark)
+            - include_toc: 是否包含目录
+
+    Returns:
+        站点信息：名称、zip 条目（站点内路径 -> 磁盘文件）、条目所在的快照目录（打包后由 stream_zip 删除）、
+        页面数和本次渲染的页面数
+
+    Raises:
+        FileNotFoundError: 目录不存在
+        PermissionError: 路径越界
+    """
+    if options is None:
+        options = {}
+    options = {"theme": options.get("theme", "light"), "include_toc": bool(options.get("include_toc", False))}
+
+    directory = normalize_path(relative_path) if relative_path else MARKDOWN_ROOT_PATH.resolve()
+    if not directory.is_dir():
+        raise FileNotFoundError(f"目录不存在: {relative_path}")
+    root = MARKDOWN_ROOT_PATH.resolve()
+    base = directory.relative_to(root).as_posix() if directory != root else ""
+
+    _prune_snapshots()
+    state_dir = _state_dir(base)
+    with _export_locks.setdefault(base, threading.Lock()):
+        manifest_path = state_dir / "manifest.json"
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        settings = {"format": SITE_FORMAT, "options": options}
+        previous = manifest.get("pages", {}) if manifest.get("settings") == settings else {}
+
+        pages: Dict[str, Dict[str, Any]] = {}
+        pending: List[Tuple[str, str, str]] = []
+        for path in _collect(directory):
+            page_path = path.relative_to(root).as_posix()
+            site_path = _site_path(page_path, base)
+            raw = path.read_bytes()
+            digest = hashlib.sha256(raw).hexdigest()
+            entry = previous.get(site_path)
+            if entry and entry["hash"] == digest and (state_dir / "pages" / entry["output"]).exists():
+                pages[site_path] = entry
+                continue
+            try:
+                content = _decode(raw)
+            except ValueError:
+                logger.warning(f"Site export skipped undecodable file: {page_path}")
+                continue
+            pages[site_path] = {"hash": digest, "output": page_output(site_path)}
+            pending.append((site_path, page_path, content))
+
+        if len(pending) > _INLINE_RENDER_LIMIT:
+            results = _get_executor().map(
+                render_page,
+                [content for _, _, content in pending],
+                [page_path for _, page_path, _ in pending],
+                [base] * len(pending),
+                [options] * len(pending),
+                chunksize=max(1, len(pending) // (SITE_EXPORT_WORKERS * 4)),
+            )
+        else:
+            results = (render_page(content, page_path, base, options) for _, page_path, content in pending)
+
+        for (site_path, _, _), (page_html, assets) in zip(pending, results):
+            _write_atomic(state_dir / "pages" / pages[site_path]["output"], page_html.encode("utf-8"))
+            pages[site_path]["assets"] = assets
+
+        # 删除已不存在的文件的渲染结果
+        outputs = {entry["output"] for entry in pages.values()}
+        for site_path, entry in previous.items():
+            if entry["output"] not in outputs:
+                (state_dir / "pages" / entry["output"]).unlink(missing_ok=True)
+
+        _write_atomic(
+            manifest_path,
+            json.dumps({"settings": settings, "pages": pages}, ensure_ascii=False).encode("utf-8"),
+        )
+
+        name = directory.name if base else "site"
+        _write_atomic(state_dir / "style.css", get_html_css(options["theme"]).encode("utf-8"))
+        _write_atomic(
+            state_dir / "index.html",
+            _render_index(sorted(pages), name, options["theme"]).encode("utf-8"),
+        )
+
+        # 释放锁之后同一目录的再次导出会替换或删除渲染结果，打包的是此刻的快照
+        rendered = {"index.html": state_dir / "index.html", "style.css": state_dir / "style.css"}
+        for entry in pages.values():
+            rendered[entry["output"]] = state_dir / "pages" / entry["output"]
+        snapshot_dir, entries = _snapshot(rendered)
+
+    for entry in pages.values():
+        for asset in entry.get("assets", []):
+            source = (root / asset).resolve()
+            if source.is_file() and source.is_relative_to(root):
+                site_path = _site_path(asset, base)
+                entries.setdefault(site_path or f"{_EXTERNAL_ASSETS}/{asset}", source)
+
+    logger.info(f"Site prepared: {base or '/'} - {len(pages)} pages, {len(pending)} rendered")
+    return {
+        "name": name,
+        "entries": entries,
+        "snapshot": snapshot_dir,
+        "pages": len(pages),
+        "rendered": len(pending),
+    }
+
+
+class _ZipStream(io.RawIOBase):
+    """只追加的缓冲区，zipfile 写入后由生成器取走数据"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Dict[str, Path], chunk_size: int = 64 * 1024, snapshot: Path = None) -> Iterator[bytes]:
+    """
+    逐块生成 zip 数据，不在内存或磁盘上生成完整的压缩包
+
+    Args:
+        entries: 站点内路径 -> 磁盘文件
+        chunk_size: 每次读取的字节数
+        snapshot: 条目所在的快照目录，输出结束（或中断）后删除
+    """
+    try:
+        buffer = _ZipStream()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name in sorted(entries):
+                with open(entries[name], "rb") as source, archive.open(name, "w") as target:
+                    while True:
+                        chunk = source.read(chunk_size)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        data = buffer.drain()
+                        if data:
+                            yield data
+                data = buffer.drain()
+                if data:
+                    yield data
+        yield buffer.drain()
+    finally:
+        if snapshot is not None:
+            shutil.rmtree(snapshot, ignore_errors=True)
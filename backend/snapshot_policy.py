@@ -0,0 +1,75 @@
+"""自动保存快照策略模块
+
+自动保存时为保存前的内容创建版本，但按策略节流：内容与上一个版本相同时跳过；
+距上一个版本不足 VERSION_SNAPSHOT_INTERVAL 秒且改动字符数未达到
+VERSION_SNAPSHOT_MIN_CHANGE 时也跳过。快照在响应返回后由后台任务在线程中执行，
+索引查询、差异计算和写入都不占用事件循环。
+"""
+import asyncio
+from datetime import datetime
+from config import VERSION_SNAPSHOT_INTERVAL, VERSION_SNAPSHOT_MIN_CHANGE
+from logger_config import logger
+import text_diff
+import version_index
+import version_store
+from versions import write_version
+
+
+def _changed_chars(old: str, new: str) -> int:
+    """估算两段文本之间的编辑量：新增和删除的行的字符数之和"""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+
+    changed = 0
+    for tag, i1, i2, j1, j2 in text_diff.diff_opcodes(old_lines, new_lines):
+        if tag != "equal":
+            changed += sum(len(line) for line in old_lines[i1:i2])
+            changed += sum(len(line) for line in new_lines[j1:j2])
+    return changed
+
+
+def should_snapshot(file_path: str, content: str, now: datetime = None) -> bool:
+    """
+    判断是否需要为内容创建版本
+
+    Args:
+        file_path: 文件路径
+        content: 待快照的内容
+        now: 当前时间
+
+    Returns:
+        是否需要创建版本
+    """
+    latest = version_index.latest_version(file_path)
+    if latest is None:
+        return True
+
+    if latest["hash"] == version_store.hash_content(content):
+        return False
+
+    if now is None:
+        now = datetime.now()
+    elapsed = (now - datetime.fromisoformat(latest["timestamp"])).total_seconds()
+    if elapsed >= VERSION_SNAPSHOT_INTERVAL:
+        return True
+
+    try:
+        latest_content = version_store.get_blob(latest["hash"])
+    except FileNotFoundError:
+        return True
+    return _changed_chars(latest_content, content) >= VERSION_SNAPSHOT_MIN_CHANGE
+
+
+def _snapshot(file_path: str, previous_content: str) -> None:
+    """在线程中执行：判断策略并创建版本"""
+    if should_snapshot(file_path, previous_content):
+        version = write_version(file_path, previous_content, "自动保存")
+        logger.debug(f"Snapshot created: {file_path} - {version['id']}")
+
+
+async def snapshot_before_save(file_path: str, previous_content: str) -> None:
+    """按策略为保存前的内容创建版本（后台任务，失败只记录日志）"""
+    try:
+        await asyncio.to_thread(_snapshot, file_path, previous_content)
+    except Exception as e:
+        logger.error(f"Snapshot failed: {file_path} - {str(e)}")
@@ -0,0 +1,323 @@
+"""文本差异模块
+
+基于 Myers 差异算法（线性空间的分治实现）计算行级差异，
+并可对修改的行做单词级或字符级的细化，输出大小与实际编辑量成正比。
+"""
+import re
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# 单次对比的最长计算时间（秒），超时后剩余区间按整体替换处理
+DIFF_TIMEOUT = 2.0
+
+# 支持的细化粒度
+GRANULARITIES = ("line", "word", "char")
+
+_WORD_PATTERN = re.compile(r'\w+|\s+|[^\w\s]', re.UNICODE)
+
+# (tag, i1, i2, j1, j2)，tag 为 equal / delete / insert / replace，与 difflib 的 opcodes 一致
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _bisect(a: Sequence[Hashable], b: Sequence[Hashable], deadline: float) -> Optional[Tuple[int, int]]:
+    """
+    查找 Myers 算法的中间蛇（middle snake），返回分割点 (x, y)
+
+    同时从两端推进 D 路径，只保存两条对角线数组，空间复杂度 O(N + M)。
+    超时或两序列没有公共元素时返回 None。
+    """
+    n, m = len(a), len(b)
+    max_d = (n + m + 1) // 2
+    v_offset = max_d
+    v_length = 2 * max_d + 2
+    v1 = [-1] * v_length
+    v2 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+    delta = n - m
+    # 差值为奇数时由正向路径检测重叠，否则由反向路径检测
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        if time.monotonic() > deadline:
+            return None
+
+        # 正向推进
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[x1] == b[y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return x1, y1
+
+        # 反向推进
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[n - x2 - 1] == b[m - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = v_offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return x1, y1
+
+    return None
+
+
+def diff_opcodes(a: Sequence[Hashable], b: Sequence[Hashable], timeout: float = DIFF_TIMEOUT) -> List[Opcode]:
+    """
+    计算两个序列的最短编辑脚本
+
+    Args:
+        a: 原序列
+        b: 新序列
+        timeout: 最长计算时间（秒）
+
+    Returns:
+        opcodes 列表，相邻的删除和插入合并为 replace
+    """
+    deadline = time.monotonic() + timeout
+    raw: List[Opcode] = []
+
+    # 用显式栈代替递归：("diff", ...) 为待计算的区间，其余为已确定的操作，按从左到右的顺序出栈
+    stack: List[Opcode] = [("diff", 0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if item[0] != "diff":
+            raw.append(item)
+            continue
+        _, alo, ahi, blo, bhi = item
+
+        # 去掉公共前缀和后缀
+        start_a, start_b = alo, blo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        if alo > start_a:
+            raw.append(("equal", start_a, alo, start_b, blo))
+
+        end_a, end_b = ahi, bhi
+        while ahi > alo and bhi > blo and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        suffix = ("equal", ahi, end_a, bhi, end_b) if ahi < end_a else None
+
+        if alo == ahi or blo == bhi:
+            split = None
+        else:
+            split = _bisect(a[alo:ahi], b[blo:bhi], deadline)
+
+        if split is None:
+            # 一侧为空、两侧没有公共元素或已超时：整体删除 + 插入
+            if suffix:
+                stack.append(suffix)
+            if blo < bhi:
+                stack.append(("insert", ahi, ahi, blo, bhi))
+            if alo < ahi:
+                stack.append(("delete", alo, ahi, blo, blo))
+            continue
+
+        x, y = split
+        if suffix:
+            stack.append(suffix)
+        stack.append(("diff", alo + x, ahi, blo + y, bhi))
+        stack.append(("diff", alo, alo + x, blo, blo + y))
+
+    return _merge_opcodes(raw)
+
+
+def _merge_opcodes(raw: List[Opcode]) -> List[Opcode]:
+    """合并相邻的同类操作，并把相邻的删除和插入合并为 replace"""
+    merged: List[List] = []
+    for tag, i1, i2, j1, j2 in raw:
+        if merged:
+            last = merged[-1]
+            if last[0] == tag or (last[0] != "equal" and tag != "equal"):
+                if last[0] != tag:
+                    last[0] = "replace"
+                last[2] = i2
+                last[4] = j2
+                continue
+        merged.append([tag, i1, i2, j1, j2])
+
+    return [tuple(op) for op in merged]
+
+
+def _tokenize(text: str, granularity: str) -> List[str]:
+    if granularity == "char":
+        return list(text)
+    return _WORD_PATTERN.findall(text)
+
+
+def refine_line(old: str, new: str, granularity: str = "word") -> List[Dict[str, str]]:
+    """
+    对一对修改的行做单词级或字符级对比
+
+    Returns:
+        片段列表，每个片段的 type 为 unchanged / removed / added
+    """
+    a = _tokenize(old, granularity)
+    b = _tokenize(new, granularity)
+
+    segments = []
+    for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+        if tag == "equal":
+            segments.append({"type": "unchanged", "text": "".join(a[i1:i2])})
+            continue
+        if i1 < i2:
+            segments.append({"type": "removed", "text": "".join(a[i1:i2])})
+        if j1 < j2:
+            segments.append({"type": "added", "text": "".join(b[j1:j2])})
+    return segments
+
+
+def diff_lines(old_text: str, new_text: str, granularity: str = "line") -> List[Dict[str, Any]]:
+    """
+    计算两段文本的行级差异
+
+    Args:
+        old_text: 原文本
+        new_text: 新文本
+        granularity: 修改行的细化粒度 line / word / char
+
+    Returns:
+        差异行列表，type 为 unchanged / added / removed / modified；
+        细化粒度不是 line 时，modified 行带有 segments 片段列表
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"不支持的对比粒度: {granularity}。支持的粒度: {', '.join(GRANULARITIES)}")
+
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+
+    # 把行映射为整数，加快比较
+    line_ids: Dict[str, int] = {}
+    a = [line_ids.setdefault(line, len(line_ids)) for line in old_lines]
+    b = [line_ids.setdefault(line, len(line_ids)) for line in new_lines]
+
+    diff = []
+    for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                diff.append({
+                    "line_number": j1 + offset + 1,
+                    "old_line_number": i1 + offset + 1,
+                    "new_line_number": j1 + offset + 1,
+                    "type": "unchanged",
+                    "content": new_lines[j1 + offset],
+                })
+            continue
+
+        # 替换区间中两侧一一对应的行视为修改，多出的行视为删除或新增
+        paired = min(i2 - i1, j2 - j1)
+        for offset in range(paired):
+            entry = {
+                "line_number": j1 + offset + 1,
+                "old_line_number": i1 + offset + 1,
+                "new_line_number": j1 + offset + 1,
+                "type": "modified",
+                "old_content": old_lines[i1 + offset],
+                "new_content": new_lines[j1 + offset],
+            }
+            if granularity != "line":
+                entry["segments"] = refine_line(entry["old_content"], entry["new_content"], granularity)
+            diff.append(entry)
+
+        for i in range(i1 + paired, i2):
+            diff.append({
+                "line_number": i + 1,
+                "old_line_number": i + 1,
+                "type": "removed",
+                "old_content": old_lines[i],
+            })
+
+        for j in range(j1 + paired, j2):
+            diff.append({
+                "line_number": j + 1,
+                "new_line_number": j + 1,
+                "type": "added",
+                "new_content": new_lines[j],
+            })
+
+    return diff
+
+
+def build_hunks(diff: List[Dict[str, Any]], context: int = 3) -> List[Dict[str, Any]]:
+    """
+    把差异行分组为 hunk，只保留修改处前后 context 行未变化的内容
+
+    Args:
+        diff: diff_lines 的返回结果
+        context: 每处修改前后保留的未变化行数
+
+    Returns:
+        hunk 列表，每个 hunk 包含 old_start / old_lines / new_start / new_lines / lines
+    """
+    context = max(0, context)
+    changes = [i for i, line in enumerate(diff) if line["type"] != "unchanged"]
+    if not changes:
+        return []
+
+    # 每个差异行之前已经过的原文本行数和新文本行数，用于计算 hunk 的起始行号
+    old_before = []
+    new_before = []
+    old_pos = new_pos = 0
+    for line in diff:
+        old_before.append(old_pos)
+        new_before.append(new_pos)
+        if "old_line_number" in line:
+            old_pos += 1
+        if "new_line_number" in line:
+            new_pos += 1
+
+    def make_hunk(start: int, end: int) -> Dict[str, Any]:
+        lines = diff[start:end]
+        return {
+            "old_start": old_before[start] + 1,
+            "old_lines": sum(1 for line in lines if "old_line_number" in line),
+            "new_start": new_before[start] + 1,
+            "new_lines": sum(1 for line in lines if "new_line_number" in line),
+            "lines": lines,
+        }
+
+    hunks = []
+    start = max(0, changes[0] - context)
+    end = min(len(diff), changes[0] + context + 1)
+    for index in changes[1:]:
+        if index - context <= end:
+            end = min(len(diff), index + context + 1)
+        else:
+            hunks.append(make_hunk(start, end))
+            start = index - context
+            end = min(len(diff), index + context + 1)
+    hunks.append(make_hunk(start, end))
+
+    return hunks
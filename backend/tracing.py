@@ -0,0 +1,113 @@
+"""请求阶段计时模块
+
+每个请求开始时创建一个 Trace，各模块用 span() 标记读文件、写文件、创建版本、渲染等阶段，
+请求结束时汇总为 Server-Timing 响应头，并按采样率把完整的阶段列表写入日志。
+Trace 保存在 contextvars 中，to_thread 和线程池中执行的代码也会记录到同一个请求；
+没有进行中的 Trace 时（后台任务、脚本调用）span() 不做任何事。
+"""
+import json
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import TRACE_SAMPLE_RATE
+
+# 每个请求最多记录的阶段数，超出的只计入汇总，不保留明细
+MAX_SPANS = 256
+
+
+class Trace:
+    """一个请求的阶段记录"""
+
+    __slots__ = ("start", "spans", "totals")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # [名称, 相对请求开始的时间, 耗时, 次数]，时间单位为秒；连续的同名阶段（如分段渲染）合并为一条
+        self.spans: List[List[Any]] = []
+        # 名称 -> [总耗时, 次数]
+        self.totals: Dict[str, List[float]] = {}
+
+    def add(self, name: str, start: float, duration: float) -> None:
+        if self.spans and self.spans[-1][0] == name:
+            self.spans[-1][2] += duration
+            self.spans[-1][3] += 1
+        elif len(self.spans) < MAX_SPANS:
+            self.spans.append([name, start - self.start, duration, 1])
+        total = self.totals.get(name)
+        if total is None:
+            self.totals[name] = [duration, 1]
+        else:
+            total[0] += duration
+            total[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头：各阶段的总耗时（毫秒），最后是到目前为止的总耗时"""
+        entries = []
+        for name, (duration, count) in self.totals.items():
+            entry = f"{name};dur={duration * 1000:.2f}"
+            if count > 1:
+                entry += f';desc="x{count}"'
+            entries.append(entry)
+        entries.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round(self.elapsed() * 1000, 3),
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 3), "dur_ms": round(duration * 1000, 3), "count": count}
+                for name, start, duration, count in self.spans
+            ],
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def start_trace() -> Tuple[Trace, Token]:
+    """为当前请求开始记录，返回 Trace 和用于 end_trace 的令牌"""
+    trace = Trace()
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Token) -> None:
+    _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    记录一个阶段的耗时
+
+    Args:
+        name: 阶段名称，作为 Server-Timing 中的指标名，只能使用字母、数字、下划线和点
+    """
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter() - start)
+
+
+def should_sample() -> bool:
+    """按 TRACE_SAMPLE_RATE 决定是否把该请求的阶段明细写入日志"""
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+def format_trace(trace: Trace, method: str, path: str, status: int) -> str:
+    """阶段明细的日志内容（一行 JSON）"""
+    record = {"method": method, "path": path, "status": status, **trace.to_dict()}
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
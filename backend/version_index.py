@@ -0,0 +1,491 @@
+"""版本索引模块
+
+使用 SQLite 维护版本清单（版本 ID -> 记录文件路径、时间戳、哈希、大小），
+按 ID 查找、恢复、删除版本时无需再遍历并解析所有版本文件。
+pack 存储方式下，记录路径为 packs/<文档>.pack#<槽位号>，blob 的 location 为 <文档>#<槽位号>。
+"""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+from config import VERSIONS_DIR
+import version_pack
+import version_store
+
+# 索引数据库文件
+INDEX_PATH = VERSIONS_DIR / "index.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    id TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    record_path TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    note TEXT NOT NULL DEFAULT ''
+);
+DROP INDEX IF EXISTS idx_versions_file_time;
+CREATE INDEX IF NOT EXISTS idx_versions_file_time_id ON versions (file_path, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_versions_file_hash ON versions (file_path, hash);
+CREATE INDEX IF NOT EXISTS idx_versions_hash ON versions (hash);
+
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    base TEXT,
+    size INTEGER NOT NULL,
+    location TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_base ON blobs (base);
+
+CREATE TABLE IF NOT EXISTS file_stats (
+    file_path TEXT PRIMARY KEY,
+    version_count INTEGER NOT NULL,
+    latest_timestamp TEXT NOT NULL,
+    latest_size INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL
+);
+DROP INDEX IF EXISTS idx_file_stats_latest;
+CREATE INDEX IF NOT EXISTS idx_file_stats_latest_path ON file_stats (latest_timestamp, file_path);
+"""
+
+# 表结构版本，记录在 PRAGMA user_version 中，用于升级旧的索引文件
+_SCHEMA_VERSION = 3
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _file_key(file_path: str) -> str:
+    """索引中使用的文件路径键（与版本目录的命名规则保持一致）"""
+    return file_path.lstrip("/")
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(INDEX_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_index() -> None:
+    """首次使用时创建表结构；索引文件不存在时从现有版本文件重建"""
+    global _initialized
+    if _initialized and INDEX_PATH.exists():
+        return
+
+    with _init_lock:
+        if _initialized and INDEX_PATH.exists():
+            return
+
+        VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+        needs_rebuild = not INDEX_PATH.exists()
+
+        conn = _connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            blob_columns = {row["name"] for row in conn.execute("PRAGMA table_info(blobs)")}
+            if "location" not in blob_columns:
+                conn.execute("ALTER TABLE blobs ADD COLUMN location TEXT")
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if needs_rebuild:
+                _rebuild(conn)
+            else:
+                if schema_version < 1:
+                    # 旧索引没有 blobs 表的数据，从 blob 存储补全
+                    _rebuild_blobs(conn)
+                if schema_version < 3:
+                    _rebuild_file_stats(conn)
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.commit()
+        finally:
+            conn.close()
+
+        _initialized = True
+
+
+@contextmanager
+def _db() -> Iterator[sqlite3.Connection]:
+    _ensure_index()
+    conn = _connect()
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _rebuild(conn: sqlite3.Connection) -> int:
+    """扫描版本目录，重建索引，返回索引的版本数量"""
+    conn.execute("DELETE FROM versions")
+    count = 0
+    for version_file in VERSIONS_DIR.glob("*/*.json"):
+        try:
+            with open(version_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 旧版本文件内嵌了完整内容，顺带迁移到 blob 存储
+            if "content" in data:
+                version_store.put_blob(data["content"], data["content_hash"])
+            conn.execute(
+                "INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    data["id"],
+                    _file_key(data["file_path"]),
+                    version_file.relative_to(VERSIONS_DIR).as_posix(),
+                    data["timestamp"],
+                    data["content_hash"],
+                    data["size"],
+                    data.get("note", ""),
+                ),
+            )
+            count += 1
+        except Exception:
+            continue
+
+    for name in version_pack.list_packs():
+        for slot, kind, data in version_pack.iter_entries(name):
+            if kind != version_pack.KIND_RECORD:
+                continue
+            try:
+                record = json.loads(data)
+                conn.execute(
+                    "INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        record["id"],
+                        _file_key(record["file_path"]),
+                        version_pack.record_path(name, slot).relative_to(VERSIONS_DIR).as_posix(),
+                        record["timestamp"],
+                        record["content_hash"],
+                        record["size"],
+                        record.get("note", ""),
+                    ),
+                )
+                count += 1
+            except Exception:
+                continue
+
+    _rebuild_blobs(conn)
+    _rebuild_file_stats(conn)
+    return count
+
+
+def _rebuild_blobs(conn: sqlite3.Connection) -> None:
+    """扫描 blob 存储和 pack 文件，重建 blob 之间的增量依赖关系"""
+    conn.execute("DELETE FROM blobs")
+    for content_hash in version_store.iter_blobs():
+        try:
+            info = version_store.blob_info(content_hash)
+        except Exception:
+            continue
+        conn.execute(
+            "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, NULL)",
+            (content_hash, info["base"], info["size"]),
+        )
+
+    for name in version_pack.list_packs():
+        for slot, kind, data in version_pack.iter_entries(name):
+            if kind != version_pack.KIND_OBJECT:
+                continue
+            try:
+                content_hash, raw = version_pack.decode_object(data)
+                base = version_store.header_of(raw)["base"]
+            except Exception:
+                continue
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+                (content_hash, base, len(raw), version_pack.object_location(name, slot)),
+            )
+
+
+def _rebuild_file_stats(conn: sqlite3.Connection) -> None:
+    """从版本表重新汇总每个文件的历史统计"""
+    conn.execute("DELETE FROM file_stats")
+    # SQLite 中与 max() 同时查询的普通列取自 max() 所在的行，即最新版本的大小
+    conn.execute(
+        """
+        INSERT INTO file_stats
+        SELECT file_path, COUNT(*), MAX(timestamp), size, SUM(size)
+        FROM versions GROUP BY file_path
+        """
+    )
+
+
+def rebuild_index() -> int:
+    """强制从版本文件重建索引"""
+    with _db() as conn:
+        return _rebuild(conn)
+
+
+def add_version(entry: Dict[str, Any], record_path: Path) -> None:
+    """登记新版本，并累加文件的历史统计"""
+    file_key = _file_key(entry["file_path"])
+    with _db() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry["id"],
+                file_key,
+                record_path.relative_to(VERSIONS_DIR).as_posix(),
+                entry["timestamp"],
+                entry["hash"],
+                entry["size"],
+                entry.get("note", ""),
+            ),
+        )
+        conn.execute(
+            """
+            INSERT INTO file_stats VALUES (?, 1, ?, ?, ?)
+            ON CONFLICT (file_path) DO UPDATE SET
+                version_count = version_count + 1,
+                total_bytes = total_bytes + excluded.total_bytes,
+                latest_size = CASE WHEN excluded.latest_timestamp >= latest_timestamp
+                                   THEN excluded.latest_size ELSE latest_size END,
+                latest_timestamp = MAX(latest_timestamp, excluded.latest_timestamp)
+            """,
+            (file_key, entry["timestamp"], entry["size"], entry["size"]),
+        )
+
+
+def lookup_version(version_id: str) -> Optional[Dict[str, Any]]:
+    """按 ID 查找版本，返回索引条目（含记录文件的绝对路径）"""
+    with _db() as conn:
+        row = conn.execute("SELECT * FROM versions WHERE id = ?", (version_id,)).fetchone()
+    if row is None:
+        return None
+
+    entry = dict(row)
+    entry["record_path"] = VERSIONS_DIR / entry["record_path"]
+    return entry
+
+
+def find_version_by_hash(file_path: str, content_hash: str) -> Optional[Dict[str, Any]]:
+    """查找文件中内容哈希相同的版本"""
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT * FROM versions WHERE file_path = ? AND hash = ? LIMIT 1",
+            (_file_key(file_path), content_hash),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def latest_version(file_path: str) -> Optional[Dict[str, Any]]:
+    """获取文件最新的版本"""
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT * FROM versions WHERE file_path = ? ORDER BY timestamp DESC LIMIT 1",
+            (_file_key(file_path),),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+# 分页游标中时间戳与版本 ID 的分隔符（ISO 时间戳和 UUID 中都不会出现）
+_CURSOR_SEPARATOR = "|"
+
+
+def version_cursor(version: Dict[str, Any]) -> str:
+    """版本列表的分页游标：(时间戳, 版本 ID)，时间戳相同的版本也能按 ID 接续"""
+    return f"{version['timestamp']}{_CURSOR_SEPARATOR}{version['id']}"
+
+
+def file_cursor(latest_timestamp: str, file_path: str) -> str:
+    """文件列表的分页游标：(最新版本时间, 文件路径)，时间相同的文件也能按路径接续"""
+    return f"{latest_timestamp}{_CURSOR_SEPARATOR}{file_path}"
+
+
+def query_versions(
+    file_path: str,
+    limit: int = 50,
+    before: str = None,
+    note: str = None,
+    since: str = None,
+    until: str = None,
+) -> List[Dict[str, Any]]:
+    """
+    按时间倒序分页查询文件的版本元数据
+
+    Args:
+        file_path: 文件路径
+        limit: 最多返回的版本数量
+        before: 游标（version_cursor 的结果），只返回排在该版本之后的版本；
+            只有时间戳的旧游标返回时间戳早于该值的版本
+        note: 只返回备注包含该文本的版本
+        since: 只返回不早于该时间的版本（ISO 格式）
+        until: 只返回不晚于该时间的版本（ISO 格式）
+    """
+    sql = "SELECT * FROM versions WHERE file_path = ?"
+    params: List[Any] = [_file_key(file_path)]
+    if before:
+        timestamp, _, version_id = before.partition(_CURSOR_SEPARATOR)
+        if version_id:
+            sql += " AND (timestamp, id) < (?, ?)"
+            params.extend([timestamp, version_id])
+        else:
+            sql += " AND timestamp < ?"
+            params.append(timestamp)
+    if since:
+        sql += " AND timestamp >= ?"
+        params.append(since)
+    if until:
+        sql += " AND timestamp <= ?"
+        params.append(until)
+    if note:
+        sql += " AND instr(note, ?) > 0"
+        params.append(note)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit)
+
+    with _db() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def list_file_versions(file_path: str) -> List[Dict[str, Any]]:
+    """按时间倒序列出文件的全部版本索引条目"""
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT * FROM versions WHERE file_path = ? ORDER BY timestamp DESC",
+            (_file_key(file_path),),
+        ).fetchall()
+
+    entries = []
+    for row in rows:
+        entry = dict(row)
+        entry["record_path"] = VERSIONS_DIR / entry["record_path"]
+        entries.append(entry)
+    return entries
+
+
+def get_file_stats(file_path: str) -> Optional[Dict[str, Any]]:
+    """获取文件的历史统计"""
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT * FROM file_stats WHERE file_path = ?", (_file_key(file_path),)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def recent_files(limit: int = 50, before: str = None) -> List[Dict[str, Any]]:
+    """
+    按最新版本时间倒序列出有版本的文件及其历史统计
+
+    Args:
+        limit: 最多返回的文件数量
+        before: 游标（file_cursor 的结果），只返回排在该文件之后的文件；
+            只有时间戳的旧游标返回最新版本时间早于该值的文件
+    """
+    sql = "SELECT * FROM file_stats"
+    params: List[Any] = []
+    if before:
+        # 时间戳中不会出现分隔符，路径中出现的分隔符保留在路径部分
+        timestamp, _, file_path = before.partition(_CURSOR_SEPARATOR)
+        if file_path:
+            sql += " WHERE (latest_timestamp, file_path) < (?, ?)"
+            params.extend([timestamp, file_path])
+        else:
+            sql += " WHERE latest_timestamp < ?"
+            params.append(timestamp)
+    sql += " ORDER BY latest_timestamp DESC, file_path DESC LIMIT ?"
+    params.append(limit)
+
+    with _db() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def list_files() -> List[str]:
+    """列出所有有版本的文件"""
+    with _db() as conn:
+        rows = conn.execute("SELECT DISTINCT file_path FROM versions").fetchall()
+    return [row["file_path"] for row in rows]
+
+
+def remove_version(version_id: str) -> bool:
+    """从索引中移除版本并扣减文件的历史统计，返回是否存在该条目"""
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT file_path, timestamp, size FROM versions WHERE id = ?", (version_id,)
+        ).fetchone()
+        if row is None:
+            return False
+
+        conn.execute("DELETE FROM versions WHERE id = ?", (version_id,))
+        latest = conn.execute(
+            "SELECT timestamp, size FROM versions WHERE file_path = ? ORDER BY timestamp DESC LIMIT 1",
+            (row["file_path"],),
+        ).fetchone()
+        if latest is None:
+            conn.execute("DELETE FROM file_stats WHERE file_path = ?", (row["file_path"],))
+        else:
+            conn.execute(
+                """
+                UPDATE file_stats SET
+                    version_count = version_count - 1,
+                    total_bytes = total_bytes - ?,
+                    latest_timestamp = ?,
+                    latest_size = ?
+                WHERE file_path = ?
+                """,
+                (row["size"], latest["timestamp"], latest["size"], row["file_path"]),
+            )
+        return True
+
+
+def add_blob(content_hash: str, base: Optional[str], size: int, location: str = None) -> None:
+    """登记 blob 及其增量基准；location 为 blob 在 pack 中的位置，loose 文件为空"""
+    with _db() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+            (content_hash, base, size, location),
+        )
+
+
+def get_blob_entry(content_hash: str) -> Optional[Dict[str, Any]]:
+    with _db() as conn:
+        row = conn.execute("SELECT * FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+    return dict(row) if row else None
+
+
+def is_blob_referenced(content_hash: str) -> bool:
+    """blob 是否仍被某个版本引用，或被其他 blob 用作增量基准"""
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM versions WHERE hash = ? UNION ALL SELECT 1 FROM blobs WHERE base = ? LIMIT 1",
+            (content_hash, content_hash),
+        ).fetchone()
+    return row is not None
+
+
+def remove_blob(content_hash: str) -> None:
+    with _db() as conn:
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (content_hash,))
+
+
+def relocate_pack(name: str, mapping: Dict[int, int]) -> None:
+    """repack 之后更新索引中该 pack 内版本记录和 blob 的槽位号"""
+    record_prefix = version_pack.record_path(name, 0).relative_to(VERSIONS_DIR).as_posix()[:-1]
+    object_prefix = version_pack.object_location(name, 0)[:-1]
+
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT id, record_path FROM versions WHERE substr(record_path, 1, ?) = ?",
+            (len(record_prefix), record_prefix),
+        ).fetchall()
+        for row in rows:
+            slot = mapping[int(row["record_path"][len(record_prefix):])]
+            conn.execute(
+                "UPDATE versions SET record_path = ? WHERE id = ?",
+                (record_prefix + str(slot), row["id"]),
+            )
+
+        rows = conn.execute(
+            "SELECT hash, location FROM blobs WHERE substr(location, 1, ?) = ?",
+            (len(object_prefix), object_prefix),
+        ).fetchall()
+        for row in rows:
+            slot = mapping[int(row["location"][len(object_prefix):])]
+            conn.execute(
+                "UPDATE blobs SET location = ? WHERE hash = ?",
+                (object_prefix + str(slot), row["hash"]),
+            )
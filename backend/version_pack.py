@@ -0,0 +1,318 @@
+"""版本 pack 文件模块
+
+VERSION_STORAGE=pack 时，每个文档的版本记录和 blob 追加写入同一个 pack 文件
+（.versions/packs/<路径哈希>.pack），不再为每个版本创建单独的小文件。
+
+pack 旁边的 .idx 是定长条目数组（偏移量、长度、类型、删除标记），通过 mmap 读取，
+按槽位号 O(1) 定位任意条目。删除只写删除标记，空间由 repack 在线回收。
+读取、追加和 repack 都持有该 pack 的锁，repack 关闭和替换映射时不会有读取正在使用旧的映射。
+pack 中每个条目自带长度前缀，.idx 与 pack 不一致时可以从 pack 重建。
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from config import VERSIONS_DIR
+import version_store
+import metrics
+
+# pack 文件目录
+PACKS_DIR = VERSIONS_DIR / "packs"
+
+# 条目类型
+KIND_RECORD = 1
+KIND_OBJECT = 2
+
+# pack 中的条目前缀：数据长度、类型
+_FRAME = struct.Struct("<IB3x")
+# .idx 条目：数据在 pack 中的偏移量、数据长度、类型、删除标记
+_ENTRY = struct.Struct("<QIBB2x")
+_DELETED_OFFSET = 13
+
+# 条目中 blob 数据之前的内容哈希前缀（64 位十六进制 + 换行）
+_HASH_PREFIX_LENGTH = 65
+
+# 已删除条目占 pack 的比例超过该值时重写 pack
+REPACK_DEAD_RATIO = 0.5
+
+_locks: Dict[str, threading.RLock] = {}
+_locks_guard = threading.Lock()
+_idx_maps: Dict[str, mmap.mmap] = {}
+
+
+def pack_name(file_path: str) -> str:
+    """文档对应的 pack 名称：相对路径的哈希，不同路径（如 a/b.md 与 a_b.md）不会共用 pack"""
+    return hashlib.sha256(file_path.lstrip("/").encode('utf-8')).hexdigest()[:32]
+
+
+def _pack_path(name: str) -> Path:
+    return PACKS_DIR / f"{name}.pack"
+
+
+def _idx_path(name: str) -> Path:
+    return PACKS_DIR / f"{name}.idx"
+
+
+def _lock(name: str) -> threading.RLock:
+    with _locks_guard:
+        return _locks.setdefault(name, threading.RLock())
+
+
+def record_path(name: str, slot: int) -> Path:
+    """pack 中版本记录的位置（登记到索引的 record_path）"""
+    return PACKS_DIR / f"{name}.pack#{slot}"
+
+
+def locate_record(path: Path) -> Optional[Tuple[str, int]]:
+    """解析 record_path，不是 pack 中的记录时返回 None"""
+    if path.parent != PACKS_DIR or "#" not in path.name:
+        return None
+    name, _, slot = path.name.rpartition("#")
+    return name[:-len(".pack")], int(slot)
+
+
+def object_location(name: str, slot: int) -> str:
+    """pack 中 blob 的位置（登记到索引的 blobs.location）"""
+    return f"{name}#{slot}"
+
+
+def locate_object(location: str) -> Tuple[str, int]:
+    name, _, slot = location.rpartition("#")
+    return name, int(slot)
+
+
+def _close_map(name: str) -> None:
+    idx_map = _idx_maps.pop(name, None)
+    if idx_map is not None:
+        idx_map.close()
+
+
+def _scan_pack(name: str) -> Iterator[Tuple[int, int, int]]:
+    """顺序扫描 pack，返回每个条目的 (数据偏移量, 长度, 类型)"""
+    with open(_pack_path(name), 'rb') as f:
+        while True:
+            frame = f.read(_FRAME.size)
+            if len(frame) < _FRAME.size:
+                return
+            length, kind = _FRAME.unpack(frame)
+            offset = f.tell()
+            if len(f.read(length)) < length:
+                # 写入中断留下的不完整条目
+                return
+            yield offset, length, kind
+
+
+def _rebuild_idx(name: str) -> None:
+    """从 pack 重建 .idx（删除标记会丢失，未被索引引用的条目在下次 repack 时回收）"""
+    tmp_path = PACKS_DIR / f".{name}.idx.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        for offset, length, kind in _scan_pack(name):
+            f.write(_ENTRY.pack(offset, length, kind, 0))
+    _close_map(name)
+    os.replace(tmp_path, _idx_path(name))
+
+
+def _idx_map(name: str, slot: int) -> mmap.mmap:
+    """获取 .idx 的内存映射，追加过新条目或文件被替换时重新映射（调用方持有 pack 锁）"""
+    idx_map = _idx_maps.get(name)
+    if idx_map is not None and (slot + 1) * _ENTRY.size <= len(idx_map):
+        return idx_map
+
+    _close_map(name)
+    idx_path = _idx_path(name)
+    if not idx_path.exists() or idx_path.stat().st_size % _ENTRY.size:
+        _rebuild_idx(name)
+    elif idx_path.stat().st_size:
+        # 最后一个条目应恰好位于 pack 末尾，否则说明上次写入或 repack 中断
+        with open(idx_path, 'rb') as f:
+            f.seek(-_ENTRY.size, os.SEEK_END)
+            offset, length, _, _ = _ENTRY.unpack(f.read(_ENTRY.size))
+        if offset + length != _pack_path(name).stat().st_size:
+            _rebuild_idx(name)
+
+    if idx_path.stat().st_size == 0:
+        raise FileNotFoundError(f"pack 条目不存在: {name}#{slot}")
+
+    with open(idx_path, 'rb') as f:
+        idx_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _idx_maps[name] = idx_map
+    return idx_map
+
+
+def append(name: str, kind: int, data: bytes) -> int:
+    """
+    向 pack 追加条目
+
+    Returns:
+        条目的槽位号
+    """
+    with _lock(name):
+        PACKS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(_pack_path(name), 'ab') as f:
+            f.write(_FRAME.pack(len(data), kind))
+            offset = f.tell()
+            f.write(data)
+        with open(_idx_path(name), 'ab') as f:
+            position = f.tell()
+            f.write(_ENTRY.pack(offset, len(data), kind, 0))
+        metrics.inc("version_bytes_total", len(data), op="write")
+        return position // _ENTRY.size
+
+
+def read(name: str, slot: int) -> bytes:
+    """
+    按槽位号读取条目数据
+
+    Raises:
+        FileNotFoundError: 条目不存在或已删除
+    """
+    # 查找条目和读取数据都持有锁：repack 不会在两者之间关闭映射或替换 pack
+    with _lock(name):
+        try:
+            idx_map = _idx_map(name, slot)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"pack 条目不存在: {name}#{slot}")
+        if (slot + 1) * _ENTRY.size > len(idx_map):
+            raise FileNotFoundError(f"pack 条目不存在: {name}#{slot}")
+
+        offset, length, _, deleted = _ENTRY.unpack_from(idx_map, slot * _ENTRY.size)
+        if deleted:
+            raise FileNotFoundError(f"pack 条目已删除: {name}#{slot}")
+
+        with open(_pack_path(name), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+    metrics.inc("version_bytes_total", len(data), op="read")
+    return data
+
+
+def mark_deleted(name: str, slot: int) -> None:
+    """标记条目已删除"""
+    with _lock(name):
+        with open(_idx_path(name), 'r+b') as f:
+            f.seek(slot * _ENTRY.size + _DELETED_OFFSET)
+            f.write(b"\x01")
+
+
+def iter_entries(name: str) -> Iterator[Tuple[int, int, bytes]]:
+    """遍历 pack 中未删除的条目，返回 (槽位号, 类型, 数据)"""
+    with open(_idx_path(name), 'rb') as idx, open(_pack_path(name), 'rb') as pack:
+        slot = 0
+        while True:
+            entry = idx.read(_ENTRY.size)
+            if len(entry) < _ENTRY.size:
+                return
+            offset, length, kind, deleted = _ENTRY.unpack(entry)
+            if not deleted:
+                pack.seek(offset)
+                yield slot, kind, pack.read(length)
+            slot += 1
+
+
+def list_packs() -> Iterator[str]:
+    """列出所有 pack 名称"""
+    if not PACKS_DIR.exists():
+        return
+    for path in PACKS_DIR.glob("*.pack"):
+        yield path.stem
+
+
+def encode_object(content_hash: str, raw: bytes) -> bytes:
+    """blob 条目数据：内容哈希前缀 + blob 原始字节"""
+    return content_hash.encode('ascii') + b"\n" + raw
+
+
+def decode_object(data: bytes) -> Tuple[str, bytes]:
+    return data[:_HASH_PREFIX_LENGTH - 1].decode('ascii'), data[_HASH_PREFIX_LENGTH:]
+
+
+def needs_repack(name: str) -> bool:
+    """已删除条目占用的空间是否超过 REPACK_DEAD_RATIO"""
+    if not _pack_path(name).exists():
+        return False
+    dead, total = dead_bytes(name)
+    return total > 0 and dead / total > REPACK_DEAD_RATIO
+
+
+def dead_bytes(name: str) -> Tuple[int, int]:
+    """返回 (已删除条目占用的字节数, pack 总字节数)"""
+    dead = 0
+    with open(_idx_path(name), 'rb') as f:
+        while True:
+            entry = f.read(_ENTRY.size)
+            if len(entry) < _ENTRY.size:
+                break
+            _, length, _, deleted = _ENTRY.unpack(entry)
+            if deleted:
+                dead += _FRAME.size + length
+    return dead, _pack_path(name).stat().st_size
+
+
+def repack(name: str, relocate: Callable[[Dict[int, int]], None] = None) -> Tuple[Dict[int, int], int]:
+    """
+    在线重写 pack，丢弃已删除的条目
+
+    Args:
+        name: pack 名称
+        relocate: 更新索引中槽位号的回调，在替换文件后、释放 pack 锁之前调用
+
+    Returns:
+        (旧槽位号 -> 新槽位号 的映射, 释放的字节数)
+    """
+    with _lock(name):
+        old_size = _pack_path(name).stat().st_size
+        tmp_suffix = uuid.uuid4().hex
+        tmp_pack = PACKS_DIR / f".{name}.pack.{tmp_suffix}.tmp"
+        tmp_idx = PACKS_DIR / f".{name}.idx.{tmp_suffix}.tmp"
+
+        mapping = {}
+        with open(tmp_pack, 'wb') as pack, open(tmp_idx, 'wb') as idx:
+            for slot, kind, data in iter_entries(name):
+                pack.write(_FRAME.pack(len(data), kind))
+                offset = pack.tell()
+                pack.write(data)
+                mapping[slot] = idx.tell() // _ENTRY.size
+                idx.write(_ENTRY.pack(offset, len(data), kind, 0))
+
+        # 先替换 pack 再替换 .idx；两者之间中断时，.idx 与 pack 不一致，下次读取时从 pack 重建
+        _close_map(name)
+        new_size = tmp_pack.stat().st_size
+        os.replace(tmp_pack, _pack_path(name))
+        os.replace(tmp_idx, _idx_path(name))
+        if relocate is not None:
+            relocate(mapping)
+
+    return mapping, old_size - new_size
+
+
+def read_object(content_hash: str) -> Optional[bytes]:
+    """blob 来源：按索引中登记的位置从 pack 读取 blob"""
+    import version_index
+
+    entry = version_index.get_blob_entry(content_hash)
+    if not entry or not entry.get("location"):
+        return None
+
+    name, slot = locate_object(entry["location"])
+    with _lock(name):
+        try:
+            stored_hash, raw = decode_object(read(name, slot))
+        except FileNotFoundError:
+            stored_hash, raw = None, None
+        if stored_hash != content_hash:
+            # 查询位置之后 pack 被重写过，持有 pack 锁重新查询一次
+            entry = version_index.get_blob_entry(content_hash)
+            if not entry or not entry.get("location"):
+                return None
+            try:
+                stored_hash, raw = decode_object(read(*locate_object(entry["location"])))
+            except FileNotFoundError:
+                return None
+    return raw if stored_hash == content_hash else None
+
+
+version_store.register_object_source(read_object)
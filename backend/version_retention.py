@@ -0,0 +1,195 @@
+"""版本保留策略模块
+
+按分档的保留策略稀疏化历史版本（例如最近 1 小时全部保留、1 天内每小时保留一个、
+30 天内每天保留一个），保存文件后按文件整理，并由后台任务定期整理整个工作区。
+"""
+import asyncio
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from config import VERSION_RETENTION, VERSION_RETENTION_NOTES, VERSION_COMPACT_INTERVAL, VERSION_COMPACT_IO_BUDGET
+from logger_config import logger
+import version_index
+import versions
+
+_DURATION_PATTERN = re.compile(r'^(\d+)\s*([smhdw])$')
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# (该档覆盖的最大版本年龄, 每个时间桶的长度)，时间桶为 None 表示全部保留；单位均为秒
+RetentionTier = Tuple[int, Optional[int]]
+
+
+def parse_duration(text: str) -> int:
+    """解析时长，如 30m / 1h / 7d，返回秒数"""
+    match = _DURATION_PATTERN.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"无效的时长: {text}")
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+
+def parse_policy(text: str) -> List[RetentionTier]:
+    """
+    解析保留策略
+
+    Args:
+        text: 逗号分隔的 "时长:间隔"，如 "1h:all,1d:1h,30d:1d"
+
+    Returns:
+        按时长升序排列的保留档位
+    """
+    tiers = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        try:
+            age, interval = part.split(":")
+        except ValueError:
+            raise ValueError(f"无效的保留策略: {part}")
+        bucket = None if interval.strip().lower() == "all" else parse_duration(interval)
+        tiers.append((parse_duration(age), bucket))
+
+    if not tiers:
+        raise ValueError("保留策略不能为空")
+    return sorted(tiers)
+
+
+RETENTION_POLICY = parse_policy(VERSION_RETENTION)
+
+# 参与稀疏化的版本备注；手动保存、恢复前备份等其他版本始终保留
+THINNED_NOTES = frozenset(note.strip() for note in VERSION_RETENTION_NOTES.split(",") if note.strip())
+
+
+def plan_thinning(
+    entries: List[Dict[str, Any]],
+    now: datetime,
+    policy: List[RetentionTier] = None,
+    thinned_notes: frozenset = None,
+) -> List[Dict[str, Any]]:
+    """
+    计算需要删除的版本
+
+    Args:
+        entries: 同一文件的版本索引条目，按时间倒序
+        now: 当前时间
+        policy: 保留档位，默认使用配置的策略
+        thinned_notes: 参与稀疏化的版本备注，默认使用 THINNED_NOTES
+
+    Returns:
+        需要删除的版本条目；每个时间桶保留最新的一个版本，文件的最新版本和
+        备注不在 thinned_notes 中的版本（如手动保存）始终保留
+    """
+    if policy is None:
+        policy = RETENTION_POLICY
+    if thinned_notes is None:
+        thinned_notes = THINNED_NOTES
+
+    doomed = []
+    seen_buckets = set()
+    for index, entry in enumerate(entries):
+        if entry["note"] not in thinned_notes:
+            continue
+        timestamp = datetime.fromisoformat(entry["timestamp"])
+        age = (now - timestamp).total_seconds()
+
+        tier = next((i for i, (max_age, _) in enumerate(policy) if age <= max_age), None)
+        if tier is None:
+            if index > 0:
+                doomed.append(entry)
+            continue
+
+        bucket_seconds = policy[tier][1]
+        if bucket_seconds is None:
+            continue
+
+        bucket = (tier, int(timestamp.timestamp() // bucket_seconds))
+        if bucket in seen_buckets and index > 0:
+            doomed.append(entry)
+        else:
+            seen_buckets.add(bucket)
+
+    return doomed
+
+
+async def compact_file(file_path: str, budget: int = None) -> Dict[str, Any]:
+    """
+    按保留策略整理单个文件的版本
+
+    Args:
+        file_path: 文件路径
+        budget: 最多删除的版本数，默认使用 VERSION_COMPACT_IO_BUDGET
+
+    Returns:
+        整理结果，包括删除的版本数和释放的字节数
+    """
+    if budget is None:
+        budget = VERSION_COMPACT_IO_BUDGET
+
+    entries = await asyncio.to_thread(version_index.list_file_versions, file_path)
+    doomed = plan_thinning(entries, datetime.now())
+
+    report = {"file_path": file_path, "deleted_versions": 0, "reclaimed_bytes": 0}
+    for entry in doomed[:budget]:
+        # 删除和重新打包都是磁盘与索引 I/O，在线程中逐个执行，整理大量版本时不阻塞请求
+        report["reclaimed_bytes"] += await asyncio.to_thread(versions.delete_version_entry, entry)
+        report["deleted_versions"] += 1
+
+    if report["deleted_versions"]:
+        report["reclaimed_bytes"] += await asyncio.to_thread(versions.repack_if_needed, file_path)
+
+    report["pending_versions"] = len(doomed) - report["deleted_versions"]
+    return report
+
+
+async def sweep(budget: int = None) -> Dict[str, Any]:
+    """
+    整理工作区内所有文件的版本
+
+    Args:
+        budget: 本轮最多删除的版本数，默认使用 VERSION_COMPACT_IO_BUDGET
+
+    Returns:
+        整理结果汇总
+    """
+    if budget is None:
+        budget = VERSION_COMPACT_IO_BUDGET
+
+    summary = {"files": 0, "deleted_versions": 0, "reclaimed_bytes": 0, "pending_versions": 0}
+    for file_path in version_index.list_files():
+        remaining = budget - summary["deleted_versions"]
+        report = await compact_file(file_path, max(remaining, 0))
+        summary["files"] += 1
+        summary["deleted_versions"] += report["deleted_versions"]
+        summary["reclaimed_bytes"] += report["reclaimed_bytes"]
+        summary["pending_versions"] += report["pending_versions"]
+
+    return summary
+
+
+async def compact_file_in_background(file_path: str) -> None:
+    """保存文件后整理该文件的版本（后台任务，失败只记录日志）"""
+    try:
+        report = await compact_file(file_path)
+        if report["deleted_versions"]:
+            logger.info(
+                f"Versions compacted: {file_path} - deleted {report['deleted_versions']}, "
+                f"reclaimed {report['reclaimed_bytes']} bytes"
+            )
+    except Exception as e:
+        logger.error(f"Compact versions failed: {file_path} - {str(e)}")
+
+
+async def run_periodic_sweep() -> None:
+    """后台定期整理所有文件的版本"""
+    if VERSION_COMPACT_INTERVAL <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(VERSION_COMPACT_INTERVAL)
+        try:
+            summary = await sweep()
+            logger.info(
+                f"Version sweep: {summary['files']} files, deleted {summary['deleted_versions']}, "
+                f"reclaimed {summary['reclaimed_bytes']} bytes, pending {summary['pending_versions']}"
+            )
+        except Exception as e:
+            logger.error(f"Version sweep failed: {str(e)}")
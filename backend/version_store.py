@@ -0,0 +1,286 @@
+"""版本内容存储模块
+
+版本内容按 SHA256 哈希存放为共享的 blob（.versions/objects/ab/cdef...），
+相同内容在整个工作区只保存一份，版本记录只保存元数据和内容哈希。
+
+blob 以压缩形式保存：每隔 VERSION_KEYFRAME_INTERVAL 个版本保存一次完整内容（关键帧），
+其余版本保存为相对上一版本的行级增量，因此还原任意版本最多只需回放有限条增量。
+"""
+import difflib
+import hashlib
+import json
+import os
+import uuid
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from config import VERSIONS_DIR, VERSION_KEYFRAME_INTERVAL, VERSION_COMPRESSION
+import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# blob 存储目录
+OBJECTS_DIR = VERSIONS_DIR / "objects"
+
+# blob 文件头，没有该文件头的 blob 为未压缩的纯文本
+_MAGIC = b"MVB1\n"
+
+_object_sources: List[Callable[[str], Optional[bytes]]] = []
+
+
+def hash_content(content: str) -> str:
+    """计算内容的 SHA256 哈希值"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def _object_path(content_hash: str) -> Path:
+    return OBJECTS_DIR / content_hash[:2] / content_hash[2:]
+
+
+def _default_codec() -> str:
+    if VERSION_COMPRESSION == "auto":
+        return "zstd" if zstandard is not None else "zlib"
+    if VERSION_COMPRESSION == "zstd" and zstandard is None:
+        raise ImportError("zstd 压缩需要安装 zstandard。请运行: pip install zstandard")
+    return VERSION_COMPRESSION
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    return data
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise ImportError("读取 zstd 压缩的版本需要安装 zstandard。请运行: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def register_object_source(reader: Callable[[str], Optional[bytes]]) -> None:
+    """注册其他 blob 来源（如 pack 文件），loose 文件不存在时依次查询"""
+    _object_sources.append(reader)
+
+
+def _read_raw(content_hash: str) -> bytes:
+    """读取 blob 的原始字节"""
+    try:
+        with open(_object_path(content_hash), 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        for reader in _object_sources:
+            raw = reader(content_hash)
+            if raw is not None:
+                return raw
+        raise
+    metrics.inc("version_bytes_total", len(raw), op="read")
+    return raw
+
+
+def _split_header(raw: bytes) -> Tuple[Dict[str, Any], int]:
+    """解析 blob 文件头，返回文件头和数据的起始位置"""
+    if not raw.startswith(_MAGIC):
+        return {"codec": "none", "base": None, "depth": 0}, 0
+
+    header_end = raw.index(b"\n", len(_MAGIC))
+    return json.loads(raw[len(_MAGIC):header_end]), header_end + 1
+
+
+def header_of(raw: bytes) -> Dict[str, Any]:
+    """从 blob 的原始字节中解析文件头"""
+    return _split_header(raw)[0]
+
+
+def _read_object(content_hash: str) -> Tuple[Dict[str, Any], bytes]:
+    """读取 blob，返回文件头和解压后的数据"""
+    raw = _read_raw(content_hash)
+    header, start = _split_header(raw)
+    return header, _decompress(raw[start:], header["codec"])
+
+
+def _encode_delta(base: str, content: str) -> List[Union[List[int], str]]:
+    """
+    计算行级增量
+
+    增量为操作列表：[start, end] 表示复制基准版本的行区间，字符串表示插入的文本
+    """
+    base_lines = base.splitlines(keepends=True)
+    new_lines = content.splitlines(keepends=True)
+    ops: List[Union[List[int], str]] = []
+
+    matcher = difflib.SequenceMatcher(None, base_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(new_lines[j1:j2]))
+
+    return ops
+
+
+def _apply_delta(base: str, ops: List[Union[List[int], str]]) -> str:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return "".join(parts)
+
+
+def _read_header(content_hash: str) -> Dict[str, Any]:
+    """读取 blob 的文件头（loose 文件只读取文件头部分）"""
+    try:
+        with open(_object_path(content_hash), 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                return {"codec": "none", "base": None, "depth": 0}
+            return json.loads(f.readline())
+    except FileNotFoundError:
+        return header_of(_read_raw(content_hash))
+
+
+def _chain_depth(content_hash: str) -> Optional[int]:
+    """返回 blob 距离最近关键帧的增量层数，blob 不存在时返回 None"""
+    try:
+        return _read_header(content_hash)["depth"]
+    except FileNotFoundError:
+        return None
+
+
+def has_blob(content_hash: str) -> bool:
+    """检查内容是否已存储"""
+    return _object_path(content_hash).exists()
+
+
+def encode_blob(content: str, content_hash: str = None, base_hash: str = None) -> bytes:
+    """
+    把内容编码为 blob（文件头 + 压缩数据）
+
+    Args:
+        content: 文件内容
+        content_hash: 预先计算好的内容哈希（可选）
+        base_hash: 增量的基准版本哈希（通常为同一文件的上一版本），为空时保存关键帧
+
+    Returns:
+        blob 的原始字节
+    """
+    if content_hash is None:
+        content_hash = hash_content(content)
+
+    codec = _default_codec()
+    data = content.encode('utf-8')
+    header = {"codec": codec, "base": None, "depth": 0}
+    payload = _compress(data, codec)
+
+    # 基准版本的增量层数未达到上限时尝试保存为增量，增量更小才采用
+    base_depth = _chain_depth(base_hash) if base_hash and base_hash != content_hash else None
+    if base_depth is not None and base_depth + 1 < VERSION_KEYFRAME_INTERVAL:
+        delta = json.dumps(_encode_delta(get_blob(base_hash), content), ensure_ascii=False, separators=(',', ':'))
+        delta_payload = _compress(delta.encode('utf-8'), codec)
+        if len(delta_payload) < len(payload):
+            header = {"codec": codec, "base": base_hash, "depth": base_depth + 1}
+            payload = delta_payload
+
+    return _MAGIC + json.dumps(header, separators=(',', ':')).encode('utf-8') + b"\n" + payload
+
+
+def put_blob(content: str, content_hash: str = None, base_hash: str = None) -> str:
+    """
+    以 loose 文件存储内容，已存在时直接返回
+
+    Args:
+        content: 文件内容
+        content_hash: 预先计算好的内容哈希（可选）
+        base_hash: 增量的基准版本哈希，为空时保存关键帧
+
+    Returns:
+        内容哈希
+    """
+    if content_hash is None:
+        content_hash = hash_content(content)
+
+    object_path = _object_path(content_hash)
+    if object_path.exists():
+        return content_hash
+
+    raw = encode_blob(content, content_hash, base_hash)
+
+    object_path.parent.mkdir(parents=True, exist_ok=True)
+    # 先写临时文件再原子替换，避免并发写入时读到不完整的内容
+    tmp_path = object_path.with_name(f".{object_path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(raw)
+    os.replace(tmp_path, object_path)
+    metrics.inc("version_bytes_total", len(raw), op="write")
+
+    return content_hash
+
+
+@lru_cache(maxsize=32)
+def get_blob(content_hash: str) -> str:
+    """
+    读取内容（blob 不可变，最近读取的内容会被缓存）
+
+    Raises:
+        FileNotFoundError: 内容不存在
+    """
+    # 沿增量链找到关键帧，再依次回放增量
+    deltas = []
+    header, data = _read_object(content_hash)
+    while header["base"]:
+        deltas.append(json.loads(data))
+        base_hash = header["base"]
+        header, data = _read_object(base_hash)
+
+    content = data.decode('utf-8')
+    for ops in reversed(deltas):
+        content = _apply_delta(content, ops)
+    return content
+
+
+def blob_size(content_hash: str) -> int:
+    """blob 在磁盘上占用的字节数"""
+    return _object_path(content_hash).stat().st_size
+
+
+def blob_info(content_hash: str) -> Dict[str, Any]:
+    """返回 blob 的增量基准哈希（关键帧为 None）和占用字节数"""
+    return {
+        "base": _read_header(content_hash)["base"],
+        "size": blob_size(content_hash),
+    }
+
+
+def iter_blobs() -> Iterator[str]:
+    """遍历已存储的所有 blob 哈希"""
+    if not OBJECTS_DIR.exists():
+        return
+    for object_path in OBJECTS_DIR.glob("??/*"):
+        if not object_path.name.startswith("."):
+            yield object_path.parent.name + object_path.name
+
+
+def delete_blob(content_hash: str) -> int:
+    """
+    删除 blob，返回释放的字节数
+
+    调用方需确认没有版本引用该内容，也没有其他 blob 以它为增量基准
+    """
+    object_path = _object_path(content_hash)
+    try:
+        size = object_path.stat().st_size
+        object_path.unlink()
+    except FileNotFoundError:
+        return 0
+    return size
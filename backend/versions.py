@@ -1,14 +1,23 @@
 """版本管理模块"""
+import asyncio
 import json
-import hashlib
 import uuid
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from config import MARKDOWN_ROOT_PATH
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from config import MARKDOWN_ROOT_PATH, VERSIONS_DIR, VERSION_STORAGE
+import version_index
+import version_pack
+import version_store
+import text_diff
+import metrics
+from tracing import span
 
-# 版本存储目录
-VERSIONS_DIR = MARKDOWN_ROOT_PATH / ".versions"
+# 版本对比结果的 LRU 缓存容量
+COMPARE_CACHE_SIZE = 64
+
+_compare_cache: "OrderedDict[Tuple[str, str, str, int], Dict[str, Any]]" = OrderedDict()
 
 
 def _get_versions_dir(file_path: str) -> Path:
@@ -19,11 +28,6 @@ def _get_versions_dir(file_path: str) -> Path:
     return dir_path
 
 
-def _hash_content(content: str) -> str:
-    """计算内容的 SHA256 哈希值"""
-    return hashlib.sha256(content.encode('utf-8')).hexdigest()
-
-
 async def create_version(file_path: str, content: str, note: str = "") -> Dict[str, Any]:
     """
     创建文件版本快照
@@ -36,48 +40,74 @@ async def create_version(file_path: str, content: str, note: str = "") -> Dict[s
     Returns:
         版本信息
     """
-    versions_dir = _get_versions_dir(file_path)
+    return await asyncio.to_thread(write_version, file_path, content, note)
+
+
+def write_version(file_path: str, content: str, note: str = "") -> Dict[str, Any]:
+    """
+    创建文件版本快照（同步执行，create_version 和自动保存快照通过 asyncio.to_thread 调用）
+
+    Args:
+        file_path: 文件路径
+        content: 文件内容
+        note: 版本备注
 
+    Returns:
+        版本信息
+    """
     # 计算内容哈希
-    content_hash = _hash_content(content)
+    content_hash = version_store.hash_content(content)
 
     # 检查是否有相同内容的版本
-    for version_file in versions_dir.glob("*.json"):
-        try:
-            with open(version_file, 'r', encoding='utf-8') as f:
-                version_data = json.load(f)
-                if version_data.get("content_hash") == content_hash:
-                    return {
-                        "id": version_data["id"],
-                        "file_path": file_path,
-                        "note": version_data.get("note", ""),
-                        "timestamp": version_data["timestamp"],
-                        "size": len(content),
-                        "hash": content_hash,
-                        "is_duplicate": True,
-                    }
-        except:
-            continue
-
-    # 创建新版本
+    with span("version_lookup"):
+        existing = version_index.find_version_by_hash(file_path, content_hash)
+    if existing:
+        return {
+            "id": existing["id"],
+            "file_path": file_path,
+            "note": existing["note"],
+            "timestamp": existing["timestamp"],
+            "size": len(content),
+            "hash": content_hash,
+            "is_duplicate": True,
+        }
+
+    # 内容按哈希存储，相同内容只保存一份；以文件的上一版本为基准保存增量
+    with span("version_lookup"):
+        latest = version_index.latest_version(file_path)
+        base_hash = latest["hash"] if latest else None
+        blob_entry = version_index.get_blob_entry(content_hash)
+    pack = version_pack.pack_name(file_path) if VERSION_STORAGE == "pack" else None
+    if blob_entry is None:
+        with span("version_blob"):
+            if pack:
+                raw = version_store.encode_blob(content, content_hash, base_hash)
+                slot = version_pack.append(pack, version_pack.KIND_OBJECT, version_pack.encode_object(content_hash, raw))
+                version_index.add_blob(
+                    content_hash,
+                    version_store.header_of(raw)["base"],
+                    len(raw),
+                    version_pack.object_location(pack, slot),
+                )
+            else:
+                version_store.put_blob(content, content_hash, base_hash=base_hash)
+                blob = version_store.blob_info(content_hash)
+                version_index.add_blob(content_hash, blob["base"], blob["size"])
+
+    # 创建新版本（记录中只保存元数据）
     version_id = str(uuid.uuid4())
     timestamp = datetime.now().isoformat()
-    version_file = versions_dir / f"{timestamp.replace(':', '-')}.json"
 
     version_data = {
         "id": version_id,
         "file_path": file_path,
-        "content": content,
         "content_hash": content_hash,
         "timestamp": timestamp,
         "size": len(content),
         "note": note,
     }
 
-    with open(version_file, 'w', encoding='utf-8') as f:
-        json.dump(version_data, f, ensure_ascii=False, indent=2)
-
-    return {
+    version_info = {
         "id": version_id,
         "file_path": file_path,
         "note": note,
@@ -87,40 +117,56 @@ async def create_version(file_path: str, content: str, note: str = "") -> Dict[s
         "is_duplicate": False,
     }
 
-
-async def get_versions(file_path: str, limit: int = 50) -> List[Dict[str, Any]]:
+    with span("version_record"):
+        if pack:
+            # 记录追加到文档的 pack 文件，不再为每个版本创建单独的文件
+            record = json.dumps(version_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            slot = version_pack.append(pack, version_pack.KIND_RECORD, record)
+            version_file = version_pack.record_path(pack, slot)
+        else:
+            version_file = _get_versions_dir(file_path) / f"{timestamp.replace(':', '-')}.json"
+            with open(version_file, 'w', encoding='utf-8') as f:
+                json.dump(version_data, f, ensure_ascii=False, separators=(',', ':'))
+        version_index.add_version(version_info, version_file)
+
+    return version_info
+
+
+async def get_versions(
+    file_path: str,
+    limit: int = 50,
+    before: str = None,
+    note: str = None,
+    since: str = None,
+    until: str = None,
+) -> List[Dict[str, Any]]:
     """
-    获取文件的所有版本
+    获取文件的版本列表（只读取索引中的元数据，不读取版本内容）
 
     Args:
         file_path: 文件路径
         limit: 最多返回的版本数量
+        before: 分页游标（上一页最后一个版本的 version_index.version_cursor）
+        note: 按备注过滤（包含匹配）
+        since: 起始时间（ISO 格式，包含）
+        until: 结束时间（ISO 格式，包含）
 
     Returns:
         版本列表（按时间倒序）
     """
-    versions_dir = _get_versions_dir(file_path)
-
-    if not versions_dir.exists():
-        return []
-
-    versions = []
-    for version_file in sorted(versions_dir.glob("*.json"), reverse=True)[:limit]:
-        try:
-            with open(version_file, 'r', encoding='utf-8') as f:
-                version_data = json.load(f)
-                versions.append({
-                    "id": version_data["id"],
-                    "file_path": file_path,
-                    "note": version_data.get("note", ""),
-                    "timestamp": version_data["timestamp"],
-                    "size": version_data["size"],
-                    "hash": version_data["content_hash"],
-                })
-        except:
-            continue
+    entries = version_index.query_versions(file_path, limit, before, note, since, until)
 
-    return versions
+    return [
+        {
+            "id": entry["id"],
+            "file_path": file_path,
+            "note": entry["note"],
+            "timestamp": entry["timestamp"],
+            "size": entry["size"],
+            "hash": entry["hash"],
+        }
+        for entry in entries
+    ]
 
 
 async def get_version(version_id: str) -> Optional[Dict[str, Any]]:
@@ -133,27 +179,45 @@ async def get_version(version_id: str) -> Optional[Dict[str, Any]]:
     Returns:
         版本信息，如果不存在返回 None
     """
-    # 搜索版本文件
-    for versions_dir in VERSIONS_DIR.rglob("*"):
-        if versions_dir.is_dir():
-            for version_file in versions_dir.glob("*.json"):
-                try:
-                    with open(version_file, 'r', encoding='utf-8') as f:
-                        version_data = json.load(f)
-                        if version_data.get("id") == version_id:
-                            return {
-                                "id": version_data["id"],
-                                "file_path": version_data["file_path"],
-                                "content": version_data["content"],
-                                "note": version_data.get("note", ""),
-                                "timestamp": version_data["timestamp"],
-                                "size": version_data["size"],
-                                "hash": version_data["content_hash"],
-                            }
-                except:
-                    continue
-
-    return None
+    return await asyncio.to_thread(_read_version, version_id)
+
+
+def _read_version(version_id: str) -> Optional[Dict[str, Any]]:
+    """读取版本元数据和内容（同步执行）"""
+    entry = version_index.lookup_version(version_id)
+    if not entry:
+        return None
+
+    try:
+        content = _read_version_content(entry)
+    except FileNotFoundError:
+        # 版本文件已被外部删除，同步清理索引
+        version_index.remove_version(version_id)
+        return None
+
+    return {
+        "id": entry["id"],
+        "file_path": entry["file_path"],
+        "content": content,
+        "note": entry["note"],
+        "timestamp": entry["timestamp"],
+        "size": entry["size"],
+        "hash": entry["hash"],
+    }
+
+
+def _read_version_content(entry: Dict[str, Any]) -> str:
+    """读取版本内容，兼容内容内嵌在记录中的旧版本文件"""
+    try:
+        return version_store.get_blob(entry["hash"])
+    except FileNotFoundError:
+        if version_pack.locate_record(entry["record_path"]):
+            raise
+        with open(entry["record_path"], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if "content" not in data:
+            raise FileNotFoundError(f"版本内容不存在: {entry['hash']}")
+        return data["content"]
 
 
 async def restore_version(version_id: str) -> Dict[str, Any]:
@@ -165,8 +229,16 @@ async def restore_version(version_id: str) -> Dict[str, Any]:
 
     Returns:
         恢复结果
+
+    Raises:
+        ValueError: 版本不存在
     """
-    version = await get_version(version_id)
+    return await asyncio.to_thread(_restore_version, version_id)
+
+
+def _restore_version(version_id: str) -> Dict[str, Any]:
+    """备份当前内容并写入版本内容（同步执行）"""
+    version = _read_version(version_id)
     if not version:
         raise ValueError(f"版本不存在: {version_id}")
 
@@ -174,7 +246,7 @@ async def restore_version(version_id: str) -> Dict[str, Any]:
 
     # 备份当前内容
     if file_path.exists():
-        await create_version(
+        write_version(
             version["file_path"],
             file_path.read_text(encoding='utf-8'),
             note="恢复前自动备份"
@@ -202,116 +274,174 @@ async def delete_version(version_id: str) -> Dict[str, Any]:
 
     Returns:
         删除结果
+
+    Raises:
+        ValueError: 版本不存在
     """
-    for versions_dir in VERSIONS_DIR.rglob("*"):
-        if versions_dir.is_dir():
-            for version_file in versions_dir.glob("*.json"):
-                try:
-                    with open(version_file, 'r', encoding='utf-8') as f:
-                        version_data = json.load(f)
-                        if version_data.get("id") == version_id:
-                            version_file.unlink()
-                            return {
-                                "success": True,
-                                "deleted_version_id": version_id,
-                            }
-                except:
-                    continue
-
-    raise ValueError(f"版本不存在: {version_id}")
-
-
-async def compare_versions(version_id1: str, version_id2: str) -> Dict[str, Any]:
+    return await asyncio.to_thread(_delete_version, version_id)
+
+
+def _delete_version(version_id: str) -> Dict[str, Any]:
+    """删除版本并在需要时重写 pack（同步执行）"""
+    entry = version_index.lookup_version(version_id)
+    if not entry:
+        raise ValueError(f"版本不存在: {version_id}")
+
+    reclaimed_bytes = delete_version_entry(entry)
+    reclaimed_bytes += repack_if_needed(entry["file_path"])
+
+    return {
+        "success": True,
+        "deleted_version_id": version_id,
+        "reclaimed_bytes": reclaimed_bytes,
+    }
+
+
+def delete_version_entry(entry: Dict[str, Any]) -> int:
+    """
+    删除版本记录，并回收不再被引用的 blob
+
+    Args:
+        entry: 版本索引条目
+
+    Returns:
+        释放的字节数（pack 中的条目只标记删除，空间在 repack 时释放）
+    """
+    reclaimed_bytes = 0
+    packed_record = version_pack.locate_record(entry["record_path"])
+    if packed_record:
+        version_pack.mark_deleted(*packed_record)
+    else:
+        try:
+            reclaimed_bytes += entry["record_path"].stat().st_size
+            entry["record_path"].unlink()
+        except FileNotFoundError:
+            pass
+    version_index.remove_version(entry["id"])
+
+    # 沿增量链向上回收：blob 没有版本引用、也不是其他 blob 的增量基准时才删除
+    content_hash = entry["hash"]
+    while content_hash and not version_index.is_blob_referenced(content_hash):
+        blob = version_index.get_blob_entry(content_hash)
+        if blob is None:
+            try:
+                blob = version_store.blob_info(content_hash)
+            except FileNotFoundError:
+                break
+        if blob.get("location"):
+            version_pack.mark_deleted(*version_pack.locate_object(blob["location"]))
+        else:
+            reclaimed_bytes += version_store.delete_blob(content_hash)
+        version_index.remove_blob(content_hash)
+        content_hash = blob["base"]
+
+    return reclaimed_bytes
+
+
+def repack_if_needed(file_path: str) -> int:
+    """
+    已删除条目占 pack 的比例过高时重写文档的 pack 文件
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        释放的字节数
+    """
+    pack = version_pack.pack_name(file_path)
+    if not version_pack.needs_repack(pack):
+        return 0
+
+    _, reclaimed_bytes = version_pack.repack(
+        pack, lambda mapping: version_index.relocate_pack(pack, mapping)
+    )
+    return reclaimed_bytes
+
+
+async def compare_versions(
+    version_id1: str,
+    version_id2: str,
+    granularity: str = "line",
+    context: int = 3,
+    page: int = 1,
+    page_size: int = 50,
+) -> Dict[str, Any]:
     """
     对比两个版本的差异
 
     Args:
         version_id1: 版本1 ID
         version_id2: 版本2 ID
+        granularity: 修改行的细化粒度 line / word / char
+        context: 每处修改前后保留的未变化行数
+        page: hunk 页码（从 1 开始）
+        page_size: 每页 hunk 数量
 
     Returns:
         对比结果
     """
-    version1 = await get_version(version_id1)
-    version2 = await get_version(version_id2)
+    entry1 = version_index.lookup_version(version_id1)
+    entry2 = version_index.lookup_version(version_id2)
 
-    if not version1 or not version2:
+    if not entry1 or not entry2:
         raise ValueError("版本不存在")
 
-    # 简单的行级差异对比
-    lines1 = version1["content"].splitlines(keepends=True)
-    lines2 = version2["content"].splitlines(keepends=True)
-
-    diff = _compute_line_diff(lines1, lines2)
+    # 版本内容不可变，对比结果按有序的内容哈希对缓存
+    cache_key = (entry1["hash"], entry2["hash"], granularity, context)
+    result = _compare_cache.get(cache_key)
+    metrics.cache_lookup("version_compare", result is not None)
+    if result is None:
+        version1 = await get_version(version_id1)
+        version2 = await get_version(version_id2)
+        if not version1 or not version2:
+            raise ValueError("版本不存在")
+
+        diff = text_diff.diff_lines(version1["content"], version2["content"], granularity)
+
+        stats = {"added": 0, "removed": 0, "modified": 0, "unchanged": 0}
+        for line in diff:
+            stats[line["type"]] += 1
+
+        result = {
+            "hunks": text_diff.build_hunks(diff, context),
+            "stats": {
+                "lines_added": stats["added"],
+                "lines_removed": stats["removed"],
+                "lines_modified": stats["modified"],
+                "lines_unchanged": stats["unchanged"],
+            },
+        }
+        _compare_cache[cache_key] = result
+        if len(_compare_cache) > COMPARE_CACHE_SIZE:
+            _compare_cache.popitem(last=False)
+    else:
+        _compare_cache.move_to_end(cache_key)
+
+    hunks = result["hunks"]
+    start = (page - 1) * page_size
 
     return {
         "version1": {
-            "id": version1["id"],
-            "timestamp": version1["timestamp"],
-            "note": version1.get("note", ""),
+            "id": entry1["id"],
+            "timestamp": entry1["timestamp"],
+            "note": entry1["note"],
         },
         "version2": {
-            "id": version2["id"],
-            "timestamp": version2["timestamp"],
-            "note": version2.get("note", ""),
-        },
-        "diff": diff,
-        "stats": {
-            "lines_added": len([d for d in diff if d["type"] == "added"]),
-            "lines_removed": len([d for d in diff if d["type"] == "removed"]),
-            "lines_modified": len([d for d in diff if d["type"] == "modified"]),
-            "lines_unchanged": len([d for d in diff if d["type"] == "unchanged"]),
+            "id": entry2["id"],
+            "timestamp": entry2["timestamp"],
+            "note": entry2["note"],
         },
+        "granularity": granularity,
+        "context": context,
+        "hunks": hunks[start:start + page_size],
+        "page": page,
+        "page_size": page_size,
+        "total_hunks": len(hunks),
+        "total_pages": max(1, -(-len(hunks) // page_size)),
+        "stats": result["stats"],
     }
 
 
-def _compute_line_diff(lines1: List[str], lines2: List[str]) -> List[Dict[str, Any]]:
-    """
-    计算行级差异（简化实现）
-
-    Args:
-        lines1: 原始行列表
-        lines2: 新行列表
-
-    Returns:
-        差异列表
-    """
-    diff = []
-    max_lines = max(len(lines1), len(lines2))
-
-    for i in range(max_lines):
-        line1 = lines1[i] if i < len(lines1) else None
-        line2 = lines2[i] if i < len(lines2) else None
-
-        if line1 is None:
-            diff.append({
-                "line_number": i + 1,
-                "type": "added",
-                "content": line2.rstrip('\n'),
-            })
-        elif line2 is None:
-            diff.append({
-                "line_number": i + 1,
-                "type": "removed",
-                "content": line1.rstrip('\n'),
-            })
-        elif line1 != line2:
-            diff.append({
-                "line_number": i + 1,
-                "type": "modified",
-                "old_content": line1.rstrip('\n'),
-                "new_content": line2.rstrip('\n'),
-            })
-        else:
-            diff.append({
-                "line_number": i + 1,
-                "type": "unchanged",
-                "content": line1.rstrip('\n'),
-            })
-
-    return diff
-
-
 async def cleanup_old_versions(file_path: str, keep_count: int = 20) -> Dict[str, Any]:
     """
     清理旧版本，只保留最新的几个版本
@@ -330,58 +460,41 @@ async def cleanup_old_versions(file_path: str, keep_count: int = 20) -> Dict[str
 
     versions_to_delete = versions[keep_count:]
     deleted_count = 0
+    reclaimed_bytes = 0
 
     for version in versions_to_delete:
         try:
-            version_file = VERSIONS_DIR / version["file_path"].lstrip("/").replace("/", "_") / f"{version['timestamp'].replace(':', '-')}.json"
-            if version_file.exists():
-                version_file.unlink()
-                deleted_count += 1
-        except:
+            result = await delete_version(version["id"])
+            deleted_count += 1
+            reclaimed_bytes += result["reclaimed_bytes"]
+        except ValueError:
             continue
 
     return {
         "deleted_count": deleted_count,
         "remaining_count": len(versions) - deleted_count,
+        "reclaimed_bytes": reclaimed_bytes,
     }
 
 
-async def get_all_files_with_versions() -> List[Dict[str, Any]]:
+async def get_all_files_with_versions(limit: int = 50, before: str = None) -> List[Dict[str, Any]]:
     """
-    获取所有有版本的文件列表
+    获取所有有版本的文件列表（读取索引中增量维护的历史统计）
+
+    Args:
+        limit: 最多返回的文件数量
+        before: 分页游标（上一页最后一个文件的 version_index.file_cursor）
 
     Returns:
-        文件列表
+        文件列表（按最新版本时间倒序）
     """
-    if not VERSIONS_DIR.exists():
-        return []
-
-    files = []
-    for file_dir in VERSIONS_DIR.iterdir():
-        if file_dir.is_dir():
-            version_files = list(file_dir.glob("*.json"))
-            if version_files:
-                # 获取最新版本信息
-                latest_version = None
-                latest_time = ""
-                for vf in version_files:
-                    try:
-                        with open(vf, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            if data["timestamp"] > latest_time:
-                                latest_time = data["timestamp"]
-                                latest_version = data
-                    except:
-                        continue
-
-                if latest_version:
-                    # 还原原始文件路径
-                    original_path = file_dir.relative_to(VERSIONS_DIR).replace("_", "/")
-                    files.append({
-                        "path": original_path,
-                        "version_count": len(version_files),
-                        "latest_timestamp": latest_version["timestamp"],
-                        "latest_size": latest_version["size"],
-                    })
-
-    return sorted(files, key=lambda x: x["latest_timestamp"], reverse=True)
+    return [
+        {
+            "path": stats["file_path"],
+            "version_count": stats["version_count"],
+            "latest_timestamp": stats["latest_timestamp"],
+            "latest_size": stats["latest_size"],
+            "total_bytes": stats["total_bytes"],
+        }
+        for stats in version_index.recent_files(limit, before)
+    ]
@@ -1,13 +1,33 @@
 /** 版本对比组件 */
-import { useState, useEffect } from "react";
+import { useState, useEffect, Fragment } from "react";
 import { X, ArrowRight, Minus, Plus } from "lucide-react";
 
+export interface DiffSegment {
+  type: "added" | "removed" | "unchanged";
+  text: string;
+}
+
 export interface DiffLine {
   line_number: number;
+  old_line_number?: number;
+  new_line_number?: number;
   type: "added" | "removed" | "modified" | "unchanged";
   content?: string;
   old_content?: string;
   new_content?: string;
+  /** 单词级/字符级细化结果（仅 modified 行） */
+  segments?: DiffSegment[];
+}
+
+/** 行内差异的细化粒度：line 不细化，word/char 为 modified 行返回 segments */
+export type DiffGranularity = "line" | "word" | "char";
+
+export interface DiffHunk {
+  old_start: number;
+  old_lines: number;
+  new_start: number;
+  new_lines: number;
+  lines: DiffLine[];
 }
 
 export interface VersionDiffProps {
@@ -34,7 +54,11 @@ interface CompareResult {
     timestamp: string;
     note: string;
   };
-  diff: DiffLine[];
+  hunks: DiffHunk[];
+  page: number;
+  page_size: number;
+  total_hunks: number;
+  total_pages: number;
   stats: {
     lines_added: number;
     lines_removed: number;
@@ -52,34 +76,44 @@ export function VersionDiff({
 }: VersionDiffProps) {
   const [diff, setDiff] = useState<CompareResult | null>(null);
   const [isLoading, setIsLoading] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const [viewMode, setViewMode] = useState<"side-by-side" | "unified">("side-by-side");
+  const [granularity, setGranularity] = useState<DiffGranularity>("word");
 
   // 加载对比数据
   useEffect(() => {
     if (isOpen && version1Id && version2Id) {
       loadDiff();
     }
-  }, [isOpen, version1Id, version2Id]);
+  }, [isOpen, version1Id, version2Id, granularity]);
 
-  const loadDiff = async () => {
+  const loadDiff = async (page: number = 1) => {
     if (!version1Id || !version2Id) return;
 
-    setIsLoading(true);
+    const setLoading = page === 1 ? setIsLoading : setIsLoadingMore;
+    setLoading(true);
     try {
       const response = await fetch(
-        `${apiBaseUrl}/api/versions/compare?v1=${version1Id}&v2=${version2Id}`
+        `${apiBaseUrl}/api/versions/compare?v1=${version1Id}&v2=${version2Id}&granularity=${granularity}&page=${page}`
       );
       if (response.ok) {
-        const data = await response.json();
-        setDiff(data);
+        const data: CompareResult = await response.json();
+        // 后续页追加到已加载的 hunk 之后
+        setDiff((prev) =>
+          page === 1 || !prev ? data : { ...data, hunks: [...prev.hunks, ...data.hunks] }
+        );
       }
     } catch (err) {
       console.error("加载版本对比失败:", err);
     } finally {
-      setIsLoading(false);
+      setLoading(false);
     }
   };
 
+  // hunk 标题，格式同 unified diff
+  const formatHunkHeader = (hunk: DiffHunk) =>
+    `@@ -${hunk.old_start},${hunk.old_lines} +${hunk.new_start},${hunk.new_lines} @@`;
+
   // 格式化时间
   const formatTime = (timestamp: string) => {
     const date = new Date(timestamp);
@@ -91,6 +125,26 @@ export function VersionDiff({
     });
   };
 
+  // 渲染 modified 行的一侧：old 侧显示未变和删除的片段，new 侧显示未变和新增的片段，改动部分高亮
+  const renderLineSide = (line: DiffLine, side: "old" | "new") => {
+    const text = side === "old" ? line.old_content : line.new_content;
+    if (!line.segments) return text;
+    const changed = side === "old" ? "removed" : "added";
+    const highlight =
+      side === "old"
+        ? "bg-red-200 dark:bg-red-800/60 text-red-800 dark:text-red-200 rounded-sm"
+        : "bg-green-200 dark:bg-green-800/60 text-green-800 dark:text-green-200 rounded-sm";
+    return line.segments.map((segment, idx) =>
+      segment.type === "unchanged" ? (
+        <span key={idx}>{segment.text}</span>
+      ) : segment.type === changed ? (
+        <span key={idx} className={highlight}>
+          {segment.text}
+        </span>
+      ) : null
+    );
+  };
+
   // 获取差异行的样式
   const getDiffRowClass = (line: DiffLine) => {
     switch (line.type) {
@@ -149,28 +203,53 @@ export function VersionDiff({
                   </div>
                 </div>
 
-                {/* 视图切换 */}
-                <div className="flex bg-slate-200 dark:bg-slate-700 rounded-lg p-1">
-                  <button
-                    onClick={() => setViewMode("side-by-side")}
-                    className={`px-3 py-1 text-xs font-medium rounded transition-colors ${
-                      viewMode === "side-by-side"
-                        ? "bg-white dark:bg-slate-600 text-slate-900 dark:text-slate-100 shadow"
-                        : "text-slate-600 dark:text-slate-400 hover:text-slate-900 dark:hover:text-slate-200"
-                    }`}
-                  >
-                    并排
-                  </button>
-                  <button
-                    onClick={() => setViewMode("unified")}
-                    className={`px-3 py-1 text-xs font-medium rounded transition-colors ${
-                      viewMode === "unified"
-                        ? "bg-white dark:bg-slate-600 text-slate-900 dark:text-slate-100 shadow"
-                        : "text-slate-600 dark:text-slate-400 hover:text-slate-900 dark:hover:text-slate-200"
-                    }`}
-                  >
-                    统一
-                  </button>
+                <div className="flex items-center gap-2">
+                  {/* 行内差异粒度 */}
+                  <div className="flex bg-slate-200 dark:bg-slate-700 rounded-lg p-1">
+                    {(
+                      [
+                        ["line", "整行"],
+                        ["word", "按词"],
+                        ["char", "按字符"],
+                      ] as [DiffGranularity, string][]
+                    ).map(([value, label]) => (
+                      <button
+                        key={value}
+                        onClick={() => setGranularity(value)}
+                        className={`px-3 py-1 text-xs font-medium rounded transition-colors ${
+                          granularity === value
+                            ? "bg-white dark:bg-slate-600 text-slate-900 dark:text-slate-100 shadow"
+                            : "text-slate-600 dark:text-slate-400 hover:text-slate-900 dark:hover:text-slate-200"
+                        }`}
+                      >
+                        {label}
+                      </button>
+                    ))}
+                  </div>
+
+                  {/* 视图切换 */}
+                  <div className="flex bg-slate-200 dark:bg-slate-700 rounded-lg p-1">
+                    <button
+                      onClick={() => setViewMode("side-by-side")}
+                      className={`px-3 py-1 text-xs font-medium rounded transition-colors ${
+                        viewMode === "side-by-side"
+                          ? "bg-white dark:bg-slate-600 text-slate-900 dark:text-slate-100 shadow"
+                          : "text-slate-600 dark:text-slate-400 hover:text-slate-900 dark:hover:text-slate-200"
+                      }`}
+                    >
+                      并排
+                    </button>
+                    <button
+                      onClick={() => setViewMode("unified")}
+                      className={`px-3 py-1 text-xs font-medium rounded transition-colors ${
+                        viewMode === "unified"
+                          ? "bg-white dark:bg-slate-600 text-slate-900 dark:text-slate-100 shadow"
+                          : "text-slate-600 dark:text-slate-400 hover:text-slate-900 dark:hover:text-slate-200"
+                      }`}
+                    >
+                      统一
+                    </button>
+                  </div>
                 </div>
               </div>
 
@@ -205,19 +284,26 @@ export function VersionDiff({
                       <div className="sticky top-0 px-4 py-2 bg-slate-100 dark:bg-slate-800 border-b border-slate-200 dark:border-slate-700 text-xs text-slate-500">
                         {diff.version1.note || formatTime(diff.version1.timestamp)}
                       </div>
-                      {diff.diff.map((line, idx) => (
-                        <div
-                          key={idx}
-                          className={`px-4 py-0.5 border-b border-slate-100 dark:border-slate-800 ${getDiffRowClass(line)}`}
-                        >
-                          {(line.type === "removed" || line.type === "modified") && line.old_content ? (
-                            <span>{line.old_content}</span>
-                          ) : line.type === "unchanged" ? (
-                            <span className="text-slate-400">{line.content}</span>
-                          ) : (
-                            <span className="text-slate-300">&nbsp;</span>
-                          )}
-                        </div>
+                      {diff.hunks.map((hunk, hunkIdx) => (
+                        <Fragment key={hunkIdx}>
+                          <div className="px-4 py-1 bg-blue-50 dark:bg-blue-900/20 text-xs text-blue-500 select-none">
+                            {formatHunkHeader(hunk)}
+                          </div>
+                          {hunk.lines.map((line, idx) => (
+                            <div
+                              key={idx}
+                              className={`px-4 py-0.5 border-b border-slate-100 dark:border-slate-800 ${getDiffRowClass(line)}`}
+                            >
+                              {(line.type === "removed" || line.type === "modified") && line.old_content ? (
+                                <span>{renderLineSide(line, "old")}</span>
+                              ) : line.type === "unchanged" ? (
+                                <span className="text-slate-400">{line.content}</span>
+                              ) : (
+                                <span className="text-slate-300">&nbsp;</span>
+                              )}
+                            </div>
+                          ))}
+                        </Fragment>
                       ))}
                     </div>
 
@@ -226,54 +312,95 @@ export function VersionDiff({
                       <div className="sticky top-0 px-4 py-2 bg-slate-100 dark:bg-slate-800 border-b border-slate-200 dark:border-slate-700 text-xs text-slate-500">
                         {diff.version2.note || formatTime(diff.version2.timestamp)}
                       </div>
-                      {diff.diff.map((line, idx) => (
-                        <div
-                          key={idx}
-                          className={`px-4 py-0.5 border-b border-slate-100 dark:border-slate-800 ${getDiffRowClass(line)}`}
-                        >
-                          {(line.type === "added" || line.type === "modified") && line.new_content ? (
-                            <span>{line.new_content}</span>
-                          ) : line.type === "unchanged" ? (
-                            <span className="text-slate-400">{line.content}</span>
-                          ) : (
-                            <span className="text-slate-300">&nbsp;</span>
-                          )}
-                        </div>
+                      {diff.hunks.map((hunk, hunkIdx) => (
+                        <Fragment key={hunkIdx}>
+                          <div className="px-4 py-1 bg-blue-50 dark:bg-blue-900/20 text-xs text-blue-500 select-none">
+                            {formatHunkHeader(hunk)}
+                          </div>
+                          {hunk.lines.map((line, idx) => (
+                            <div
+                              key={idx}
+                              className={`px-4 py-0.5 border-b border-slate-100 dark:border-slate-800 ${getDiffRowClass(line)}`}
+                            >
+                              {(line.type === "added" || line.type === "modified") && line.new_content ? (
+                                <span>{renderLineSide(line, "new")}</span>
+                              ) : line.type === "unchanged" ? (
+                                <span className="text-slate-400">{line.content}</span>
+                              ) : (
+                                <span className="text-slate-300">&nbsp;</span>
+                              )}
+                            </div>
+                          ))}
+                        </Fragment>
                       ))}
                     </div>
                   </div>
                 ) : (
                   /* 统一视图 */
                   <div>
-                    {diff.diff.map((line, idx) => (
-                      <div
-                        key={idx}
-                        className={`flex px-4 py-0.5 border-b border-slate-100 dark:border-slate-800 ${getDiffRowClass(line)}`}
-                      >
-                        <span className="w-12 text-xs text-slate-400 select-none">
-                          {line.line_number}
-                        </span>
-                        <span className="flex-1">
-                          {line.type === "unchanged" && (
-                            <span className="text-slate-600 dark:text-slate-400">{line.content}</span>
-                          )}
-                          {line.type === "removed" && (
-                            <span className="text-red-600 dark:text-red-400 line-through">{line.old_content}</span>
-                          )}
-                          {line.type === "added" && (
-                            <span className="text-green-600 dark:text-green-400">{line.new_content}</span>
-                          )}
-                          {line.type === "modified" && (
-                            <>
-                              <span className="text-red-600 dark:text-red-400 line-through mr-2">{line.old_content}</span>
-                              <span className="text-green-600 dark:text-green-400">{line.new_content}</span>
-                            </>
-                          )}
-                        </span>
-                      </div>
+                    {diff.hunks.map((hunk, hunkIdx) => (
+                      <Fragment key={hunkIdx}>
+                        <div className="px-4 py-1 bg-blue-50 dark:bg-blue-900/20 text-xs text-blue-500 select-none">
+                          {formatHunkHeader(hunk)}
+                        </div>
+                        {hunk.lines.map((line, idx) => (
+                          <div
+                            key={idx}
+                            className={`flex px-4 py-0.5 border-b border-slate-100 dark:border-slate-800 ${getDiffRowClass(line)}`}
+                          >
+                            <span className="w-12 text-xs text-slate-400 select-none">
+                              {line.line_number}
+                            </span>
+                            <span className="flex-1">
+                              {line.type === "unchanged" && (
+                                <span className="text-slate-600 dark:text-slate-400">{line.content}</span>
+                              )}
+                              {line.type === "removed" && (
+                                <span className="text-red-600 dark:text-red-400 line-through">{line.old_content}</span>
+                              )}
+                              {line.type === "added" && (
+                                <span className="text-green-600 dark:text-green-400">{line.new_content}</span>
+                              )}
+                              {line.type === "modified" &&
+                                (line.segments ? (
+                                  <>
+                                    <span className="text-red-600 dark:text-red-400 mr-2">{renderLineSide(line, "old")}</span>
+                                    <span className="text-green-600 dark:text-green-400">{renderLineSide(line, "new")}</span>
+                                  </>
+                                ) : (
+                                  <>
+                                    <span className="text-red-600 dark:text-red-400 line-through mr-2">{line.old_content}</span>
+                                    <span className="text-green-600 dark:text-green-400">{line.new_content}</span>
+                                  </>
+                                ))}
+                            </span>
+                          </div>
+                        ))}
+                      </Fragment>
                     ))}
                   </div>
                 )}
+
+                {diff.total_hunks === 0 && (
+                  <div className="flex items-center justify-center py-12 text-slate-400">
+                    两个版本内容相同
+                  </div>
+                )}
+
+                {/* 加载更多 hunk */}
+                {diff.hunks.length < diff.total_hunks && (
+                  <div className="flex justify-center py-3">
+                    <button
+                      onClick={() => loadDiff(Math.floor(diff.hunks.length / diff.page_size) + 1)}
+                      disabled={isLoadingMore}
+                      className="px-3 py-1 text-xs font-medium rounded bg-slate-100 dark:bg-slate-700 text-slate-600 dark:text-slate-300 hover:bg-slate-200 dark:hover:bg-slate-600 disabled:opacity-50 transition-colors"
+                    >
+                      {isLoadingMore
+                        ? "加载中..."
+                        : `加载更多（${diff.hunks.length}/${diff.total_hunks}）`}
+                    </button>
+                  </div>
+                )}
               </div>
             </>
           ) : (
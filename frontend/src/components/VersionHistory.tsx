@@ -36,6 +36,7 @@ export function VersionHistory({
 }: VersionHistoryProps) {
   const [versions, setVersions] = useState<FileVersion[]>([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [selectedVersions, setSelectedVersions] = useState<Set<string>>(new Set());
 
   // 加载版本列表
@@ -45,17 +46,20 @@ export function VersionHistory({
     }
   }, [isOpen, filePath]);
 
-  const loadVersions = async () => {
+  const loadVersions = async (before: string | null = null) => {
     if (!filePath) return;
 
-    setIsLoading(true);
+    setIsLoading(!before);
     try {
+      const cursor = before ? `&before=${encodeURIComponent(before)}` : "";
       const response = await fetch(
-        `${apiBaseUrl}/api/versions?path=${encodeURIComponent(filePath)}`
+        `${apiBaseUrl}/api/versions?path=${encodeURIComponent(filePath)}${cursor}`
       );
       if (response.ok) {
         const data = await response.json();
-        setVersions(data.versions || []);
+        // 带游标时追加下一页
+        setVersions((prev) => (before ? [...prev, ...(data.versions || [])] : data.versions || []));
+        setNextCursor(data.next_cursor ?? null);
       }
     } catch (err) {
       console.error("加载版本失败:", err);
@@ -236,6 +240,16 @@ export function VersionHistory({
                 </div>
               </div>
             ))}
+
+            {/* 加载更早的版本 */}
+            {nextCursor && (
+              <button
+                onClick={() => loadVersions(nextCursor)}
+                className="w-full px-3 py-2 text-xs text-slate-500 hover:text-blue-500 transition-colors"
+              >
+                加载更早的版本
+              </button>
+            )}
           </div>
         )}
       </div>